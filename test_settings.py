@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 SECRET_KEY = 'test-secret-key'
 DEBUG = True
@@ -7,6 +8,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': ':memory:',
+        # A file so the concurrency tests can open several connections to it,
+        # named per process so concurrent runs (e.g. parallel tox envs) don't share it
+        'TEST': {'NAME': os.path.join(tempfile.gettempdir(), f'wagtail_subscriptions_test_{os.getpid()}.sqlite3')},
     }
 }
 
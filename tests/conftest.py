@@ -1,5 +1,7 @@
 import pytest
+from datetime import timedelta
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from wagtail_subscriptions.models import SubscriptionPlan, Module, Feature, Subscription, Customer
 
 User = get_user_model()
@@ -57,4 +59,16 @@ def subscription(user, plan):
         status='active',
         current_period_start='2024-01-01T00:00:00Z',
         current_period_end='2024-02-01T00:00:00Z'
-    )
\ No newline at end of file
+    )
+
+
+@pytest.fixture
+def active_subscription(user, plan):
+    now = timezone.now()
+    return Subscription.objects.create(
+        user=user,
+        plan=plan,
+        status='active',
+        current_period_start=now,
+        current_period_end=now + timedelta(days=30)
+    )
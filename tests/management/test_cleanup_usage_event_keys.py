@@ -0,0 +1,30 @@
+import pytest
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.utils import timezone
+from wagtail_subscriptions.models import UsageEventKey
+
+
+@pytest.mark.django_db
+class TestCleanupUsageEventKeys:
+    def test_deletes_expired_keys(self, active_subscription, feature):
+        now = timezone.now()
+        for index, age in enumerate([1, 8, 30]):
+            UsageEventKey.objects.create(
+                key=f'key-{index}',
+                subscription=active_subscription,
+                feature=feature,
+                created_at=now - timedelta(days=age)
+            )
+
+        out = StringIO()
+        call_command('cleanup_usage_event_keys', '--dry-run', stdout=out)
+        assert 'Would delete 2' in out.getvalue()
+        assert UsageEventKey.objects.count() == 3
+
+        call_command('cleanup_usage_event_keys', '--batch-size', '1', stdout=StringIO())
+        assert list(UsageEventKey.objects.values_list('key', flat=True)) == ['key-0']
+
+        call_command('cleanup_usage_event_keys', '--days', '0', stdout=StringIO())
+        assert not UsageEventKey.objects.exists()
@@ -0,0 +1,79 @@
+import pytest
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.utils import timezone
+from wagtail_subscriptions import utils
+from wagtail_subscriptions.models import PlanFeature, UsageBucket, UsageEvent, UsageRecord, UsageRollup
+from wagtail_subscriptions.utils import (
+    track_feature_usage, check_feature_quota, get_rollup_buckets, get_rolling_usage, get_usage_bucket
+)
+
+
+@pytest.fixture(autouse=True)
+def event_log_settings(settings):
+    settings.WAGTAIL_SUBSCRIPTIONS = {'USAGE_EVENT_LOG': True, 'USAGE_ROLLUPS': True}
+
+
+@pytest.mark.django_db
+class TestCompactUsageEvents:
+    @pytest.fixture(autouse=True)
+    def quota_feature(self, active_subscription, feature):
+        feature.feature_type = 'quota'
+        feature.default_quota = 10
+        feature.save()
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+        self.subscription = active_subscription
+        self.feature = feature
+
+    def test_usage_is_appended_then_compacted(self):
+        for _ in range(4):
+            track_feature_usage(self.subscription, 'test-feature', count=2)
+        assert UsageEvent.objects.count() == 4
+        assert not UsageRecord.objects.exists()
+
+        # Quota checks include events that are not compacted yet
+        assert check_feature_quota(self.subscription, 'test-feature')
+        track_feature_usage(self.subscription, 'test-feature', count=2)
+        assert not check_feature_quota(self.subscription, 'test-feature')
+
+        out = StringIO()
+        call_command('compact_usage_events', '--chunk-size', '2', stdout=out)
+        assert 'Compacted 5' in out.getvalue()
+        assert not UsageEvent.objects.exists()
+        assert UsageRecord.objects.get(feature=self.feature).usage_count == 10
+        assert not check_feature_quota(self.subscription, 'test-feature')
+
+    def test_archive_and_rollups_use_event_time(self):
+        earlier = timezone.now() - timedelta(hours=3)
+        track_feature_usage(self.subscription, 'test-feature', count=3)
+        UsageEvent.objects.update(created_at=earlier)
+        track_feature_usage(self.subscription, 'test-feature', count=1)
+
+        call_command('compact_usage_events', '--archive', stdout=StringIO())
+        assert UsageEvent.objects.filter(compacted_at__isnull=False).count() == 2
+        assert UsageRecord.objects.get(feature=self.feature).usage_count == 4
+
+        hourly = UsageRollup.objects.filter(granularity='hour').order_by('bucket_start')
+        assert [(rollup.bucket_start, rollup.usage_count) for rollup in hourly] == [
+            (get_rollup_buckets(earlier)['hour'], 3),
+            (get_rollup_buckets(timezone.now())['hour'], 1),
+        ]
+
+        # Archived events are not compacted twice
+        call_command('compact_usage_events', stdout=StringIO())
+        assert UsageRecord.objects.get(feature=self.feature).usage_count == 4
+
+    def test_buckets_use_event_time(self, monkeypatch):
+        monkeypatch.setattr(utils, '_bucket_pruning', {'bucket_start': None, 'feature_ids': set()})
+        self.feature.quota_window = 3 * 3600
+        self.feature.save()
+        earlier = timezone.now() - timedelta(hours=10)
+        track_feature_usage(self.subscription, 'test-feature', count=3)
+        UsageEvent.objects.update(created_at=earlier)
+        track_feature_usage(self.subscription, 'test-feature', count=1)
+
+        call_command('compact_usage_events', '--archive', stdout=StringIO())
+        # The old event's bucket is outside the window (and pruned), only the new one counts
+        assert not UsageBucket.objects.filter(bucket_start__lte=get_usage_bucket(earlier)).exists()
+        assert get_rolling_usage(self.subscription, self.feature.pk, self.feature.quota_window) == 1
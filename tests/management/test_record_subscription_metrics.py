@@ -0,0 +1,42 @@
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+from wagtail_subscriptions.analytics import SubscriptionAnalytics
+from wagtail_subscriptions.models import Subscription, SubscriptionMetricsSnapshot
+
+
+@pytest.mark.django_db
+class TestRecordSubscriptionMetrics:
+    def test_records_yesterday_once(self, active_subscription, user, plan):
+        now = timezone.now()
+        Subscription.objects.create(
+            user=user, plan=plan, status='past_due', current_period_start=now, current_period_end=now
+        )
+
+        call_command('record_subscription_metrics', stdout=StringIO())
+        call_command('record_subscription_metrics', stdout=StringIO())
+
+        snapshot = SubscriptionMetricsSnapshot.objects.get()
+        assert snapshot.date == SubscriptionAnalytics.today() - timedelta(days=1)
+        assert (snapshot.active_subscriptions, snapshot.past_due_subscriptions) == (1, 1)
+        assert snapshot.mrr == Decimal('29.99')
+        # Both subscriptions were created today, not on the recorded day
+        assert snapshot.new_subscriptions == 0
+
+    def test_backfill(self, active_subscription):
+        out = StringIO()
+        call_command('record_subscription_metrics', '--date', '2026-01-10', '--days', '3', stdout=out)
+        assert [str(day) for day in SubscriptionMetricsSnapshot.objects.values_list('date', flat=True)] == [
+            '2026-01-08', '2026-01-09', '2026-01-10'
+        ]
+        assert 'Recorded metrics for 2026-01-10' in out.getvalue()
+        # Current status counts and MRR are not written into past days
+        assert not SubscriptionMetricsSnapshot.objects.filter(active_subscriptions__isnull=False).exists()
+        assert not SubscriptionMetricsSnapshot.objects.filter(mrr__isnull=False).exists()
+
+        with pytest.raises(CommandError):
+            call_command('record_subscription_metrics', '--date', 'yesterday', stdout=StringIO())
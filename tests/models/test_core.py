@@ -1,6 +1,9 @@
 import pytest
+from datetime import timedelta
 from django.core.exceptions import ValidationError
-from wagtail_subscriptions.models import SubscriptionPlan, Subscription
+from django.utils import timezone
+from wagtail_subscriptions.models import SubscriptionPlan, Subscription, Feature, PlanFeature
+from wagtail_subscriptions.utils import get_subscriptions_with_feature
 
 
 @pytest.mark.django_db
@@ -34,4 +37,72 @@ class TestSubscription:
     def test_feature_access(self, subscription, feature):
         subscription.plan.plan_features.create(feature=feature, is_included=True)
         assert subscription.has_feature_access('test-feature')
-        assert not subscription.has_feature_access('nonexistent-feature')
\ No newline at end of file
+        assert not subscription.has_feature_access('nonexistent-feature')
+
+@pytest.mark.django_db
+class TestFeatureMask:
+    def test_bit_index_assigned(self, module):
+        first = Feature.objects.create(module=module, name='First', slug='first')
+        second = Feature.objects.create(module=module, name='Second', slug='second')
+        assert second.bit_index == first.bit_index + 1
+
+    def test_bit_index_retried_after_race(self, module, monkeypatch):
+        Feature.objects.create(module=module, name='First', slug='first')
+        Feature.objects.create(module=module, name='Second', slug='second')
+        aggregate = Feature.objects.aggregate
+        results = iter([{'bit_index__max': 0}])
+        # The first lookup misses the concurrently created 'second'
+        monkeypatch.setattr(Feature.objects, 'aggregate', lambda *args: next(results, None) or aggregate(*args))
+
+        third = Feature.objects.create(module=module, name='Third', slug='third')
+        assert third.bit_index == 2
+
+    def test_bulk_created_feature_gets_bit(self, plan, module):
+        Feature.objects.bulk_create([Feature(module=module, name='Bulk', slug='bulk')])
+        assert Feature.objects.get(slug='bulk').bit_index is None
+
+        PlanFeature.objects.create(plan=plan, feature=Feature.objects.get(slug='bulk'))
+        plan.refresh_from_db()
+        assert Feature.objects.get(slug='bulk').bit_index is not None
+        assert plan.has_feature('bulk')
+
+    def test_mask_follows_plan_features(self, plan, feature, module):
+        other = Feature.objects.create(module=module, name='Other', slug='other')
+        plan_feature = PlanFeature.objects.create(plan=plan, feature=feature)
+        plan.refresh_from_db()
+        assert plan.has_feature('test-feature')
+        assert not plan.has_feature('other')
+        assert not plan.has_feature('nonexistent-feature')
+
+        PlanFeature.objects.create(plan=plan, feature=other)
+        plan.refresh_from_db()
+        assert plan.has_all_features(['test-feature', 'other'])
+
+        plan_feature.delete()
+        plan.refresh_from_db()
+        assert not plan.has_all_features(['test-feature', 'other'])
+        assert plan.has_any_feature(['test-feature', 'other'])
+
+    def test_inactive_feature_clears_bit(self, plan, feature):
+        PlanFeature.objects.create(plan=plan, feature=feature)
+        feature.is_active = False
+        feature.save()
+        plan.refresh_from_db()
+        assert not plan.has_feature('test-feature')
+
+    def test_stale_plan_save_keeps_mask(self, plan, feature):
+        PlanFeature.objects.create(plan=plan, feature=feature)
+        plan.name = 'Renamed'
+        plan.save()
+        plan.refresh_from_db()
+        assert plan.has_feature('test-feature')
+
+    def test_subscriptions_with_feature(self, user, plan, feature):
+        now = timezone.now()
+        PlanFeature.objects.create(plan=plan, feature=feature)
+        subscription = Subscription.objects.create(
+            user=user, plan=plan, status='active',
+            current_period_start=now, current_period_end=now + timedelta(days=30)
+        )
+        assert list(get_subscriptions_with_feature('test-feature')) == [subscription]
+        assert not get_subscriptions_with_feature('nonexistent-feature').exists()
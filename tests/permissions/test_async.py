@@ -0,0 +1,70 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.views import View
+from wagtail_subscriptions.models import PlanFeature
+from wagtail_subscriptions.permissions.decorators import subscription_required, feature_required
+from wagtail_subscriptions.permissions.middleware import SubscriptionMiddleware
+from wagtail_subscriptions.permissions.mixins import SubscriptionRequiredMixin, FeatureRequiredMixin
+
+
+class AsyncGatedView(SubscriptionRequiredMixin, FeatureRequiredMixin, View):
+    required_feature = 'test-feature'
+
+    async def get(self, request, *args, **kwargs):
+        return HttpResponse(self.subscription.plan.slug)
+
+
+@pytest.mark.django_db
+class TestAsyncGating:
+    def setup_method(self):
+        self.factory = RequestFactory()
+
+    def make_request(self, user):
+        request = self.factory.get('/')
+        request.user = user
+        request._messages = CookieStorage(request)
+        return request
+
+    def test_middleware_with_async_view(self, active_subscription):
+        @subscription_required
+        async def view(request):
+            return HttpResponse(request.subscription.plan.slug)
+
+        response = async_to_sync(SubscriptionMiddleware(view))(self.make_request(active_subscription.user))
+        assert response.content == b'test-plan'
+
+    def test_async_subscription_required(self, active_subscription, user):
+        @subscription_required
+        async def view(request):
+            return HttpResponse(request.subscription_plan.slug)
+
+        response = async_to_sync(view)(self.make_request(active_subscription.user))
+        assert response.status_code == 200
+        assert response.content == b'test-plan'
+
+        active_subscription.delete()
+        response = async_to_sync(view)(self.make_request(user))
+        assert response.status_code == 302
+
+    def test_async_feature_required(self, active_subscription, feature):
+        @feature_required('test-feature')
+        async def view(request):
+            return HttpResponse('ok')
+
+        request = self.make_request(active_subscription.user)
+        assert async_to_sync(view)(request).status_code == 302
+
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+        request = self.make_request(active_subscription.user)
+        assert async_to_sync(view)(request).status_code == 200
+
+    def test_async_mixins(self, active_subscription, feature):
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+        view = AsyncGatedView.as_view()
+
+        response = async_to_sync(view)(self.make_request(active_subscription.user))
+        assert response.status_code == 200
+        assert response.content == b'test-plan'
@@ -0,0 +1,58 @@
+import pytest
+from django.contrib.auth.models import Permission
+from wagtail_subscriptions.cache import clear_local_caches
+from wagtail_subscriptions.models import PlanFeature, SubscriptionPermission, SubscriptionGroup
+
+BACKENDS = [
+    'django.contrib.auth.backends.ModelBackend',
+    'wagtail_subscriptions.permissions.backends.SubscriptionPermissionBackend',
+]
+
+
+@pytest.fixture(autouse=True)
+def backend_settings(settings):
+    settings.AUTHENTICATION_BACKENDS = BACKENDS
+    clear_local_caches()
+
+
+@pytest.fixture
+def view_user_permission():
+    return Permission.objects.get(content_type__app_label='auth', codename='view_user')
+
+
+@pytest.mark.django_db
+class TestSubscriptionPermissionBackend:
+    def fresh_user(self, subscription, django_user_model):
+        return django_user_model.objects.get(pk=subscription.user_id)
+
+    def test_feature_permissions(self, active_subscription, feature, view_user_permission,
+                                 django_user_model, django_assert_num_queries):
+        SubscriptionPermission.objects.create(feature=feature, permission=view_user_permission)
+        user = self.fresh_user(active_subscription, django_user_model)
+        assert not user.has_perm('auth.view_user')
+
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+        user = self.fresh_user(active_subscription, django_user_model)
+        assert user.has_perm('auth.view_user')
+        assert user.has_module_perms('auth')
+
+        with django_assert_num_queries(0):
+            assert user.has_perm('auth.view_user')
+            assert not user.has_perm('auth.delete_user')
+
+    def test_group_permissions(self, active_subscription, view_user_permission, django_user_model):
+        group = SubscriptionGroup.objects.create(plan=active_subscription.plan, name='Editors')
+        assert not self.fresh_user(active_subscription, django_user_model).has_perm('auth.view_user')
+
+        group.permissions.add(view_user_permission)
+        assert self.fresh_user(active_subscription, django_user_model).has_perm('auth.view_user')
+
+        group.permissions.clear()
+        assert not self.fresh_user(active_subscription, django_user_model).has_perm('auth.view_user')
+
+    def test_inactive_subscription(self, active_subscription, feature, view_user_permission, django_user_model):
+        SubscriptionPermission.objects.create(feature=feature, permission=view_user_permission)
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+        active_subscription.status = 'canceled'
+        active_subscription.save()
+        assert not self.fresh_user(active_subscription, django_user_model).has_perm('auth.view_user')
@@ -0,0 +1,98 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import RequestFactory
+from wagtail_subscriptions.models import PlanFeature
+from wagtail_subscriptions.permissions.decorators import feature_required
+from wagtail_subscriptions.permissions.entitlements import SESSION_KEY, get_user_version
+from wagtail_subscriptions.permissions.middleware import SubscriptionMiddleware
+from wagtail_subscriptions.permissions.tenant_manager import TenantSubscriptionManager
+
+
+@pytest.fixture(autouse=True)
+def token_settings(settings):
+    settings.WAGTAIL_SUBSCRIPTIONS = {'ENTITLEMENT_TOKEN_ENABLED': True}
+
+
+@pytest.mark.django_db
+class TestEntitlementToken:
+    def setup_method(self):
+        self.factory = RequestFactory()
+        self.session = {}
+
+    def make_request(self, user):
+        request = self.factory.get('/')
+        request.user = user
+        request.session = self.session
+        return request
+
+    def test_token_skips_queries(self, active_subscription, feature, django_assert_num_queries):
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=feature, quota_override=5)
+        user = active_subscription.user
+
+        assert TenantSubscriptionManager.has_feature_access(self.make_request(user), 'test-feature')
+        assert SESSION_KEY in self.session
+
+        with django_assert_num_queries(0):
+            request = self.make_request(user)
+            assert TenantSubscriptionManager.has_feature_access(request, 'test-feature')
+            assert not TenantSubscriptionManager.has_feature_access(request, 'other-feature')
+            assert TenantSubscriptionManager.get_feature_quota(request, 'test-feature') == 5
+
+    def test_middleware_makes_no_queries_with_token(self, active_subscription, feature, django_assert_num_queries):
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+        user = active_subscription.user
+
+        @feature_required('test-feature')
+        def view(request):
+            return HttpResponse('ok')
+
+        middleware = SubscriptionMiddleware(view)
+        assert middleware(self.make_request(user)).status_code == 200
+
+        with django_assert_num_queries(0):
+            assert middleware(self.make_request(user)).status_code == 200
+
+    def test_async_checks_use_token(self, active_subscription, feature, django_assert_num_queries):
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=feature, quota_override=5)
+        user = active_subscription.user
+
+        assert async_to_sync(TenantSubscriptionManager.ahas_feature_access)(self.make_request(user), 'test-feature')
+        assert SESSION_KEY in self.session
+
+        with django_assert_num_queries(0):
+            request = self.make_request(user)
+            assert async_to_sync(TenantSubscriptionManager.ahas_feature_access)(request, 'test-feature')
+            assert async_to_sync(TenantSubscriptionManager.aget_feature_quota)(request, 'test-feature') == 5
+
+    def test_subscription_change_invalidates_token(self, active_subscription, feature):
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+        user = active_subscription.user
+        assert TenantSubscriptionManager.has_feature_access(self.make_request(user), 'test-feature')
+
+        active_subscription.status = 'canceled'
+        active_subscription.save()
+        assert not TenantSubscriptionManager.has_feature_access(self.make_request(user), 'test-feature')
+
+    def test_subscription_change_invalidated_again_on_commit(self, active_subscription, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            with transaction.atomic():
+                active_subscription.save()
+                version = get_user_version(active_subscription.user_id)
+        assert get_user_version(active_subscription.user_id) != version
+
+    def test_catalog_change_invalidates_token(self, active_subscription, feature):
+        plan_feature = PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+        user = active_subscription.user
+        assert TenantSubscriptionManager.has_feature_access(self.make_request(user), 'test-feature')
+
+        plan_feature.delete()
+        assert not TenantSubscriptionManager.has_feature_access(self.make_request(user), 'test-feature')
+
+    def test_token_bound_to_user(self, active_subscription, feature, django_user_model):
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+        assert TenantSubscriptionManager.has_feature_access(self.make_request(active_subscription.user), 'test-feature')
+
+        other = django_user_model.objects.create_user(username='other', password='x')
+        assert not TenantSubscriptionManager.has_feature_access(self.make_request(other), 'test-feature')
@@ -0,0 +1,117 @@
+import pytest
+from datetime import timedelta
+from asgiref.sync import async_to_sync
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.utils import timezone
+from django.views import View
+from wagtail_subscriptions import utils
+from wagtail_subscriptions.models import Feature, PlanFeature, UsageBucket, UsageRecord
+from wagtail_subscriptions.permissions.decorators import quota_required
+from wagtail_subscriptions.permissions.mixins import QuotaRequiredMixin
+from wagtail_subscriptions.utils import get_usage_bucket
+
+
+class ExportView(QuotaRequiredMixin, View):
+    quota_feature = 'exports'
+    quota_cost = 2
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse('ok')
+
+
+@pytest.mark.django_db
+class TestQuotaRequired:
+    @pytest.fixture(autouse=True)
+    def quota_feature(self, active_subscription, module):
+        self.subscription = active_subscription
+        self.feature = Feature.objects.create(
+            module=module, name='Exports', slug='exports', feature_type='quota', default_quota=3
+        )
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=self.feature)
+        self.factory = RequestFactory()
+
+    def make_request(self, user=None):
+        request = self.factory.get('/')
+        request.user = user or self.subscription.user
+        return request
+
+    def usage(self):
+        return UsageRecord.objects.get(feature=self.feature).usage_count
+
+    def test_consumes_and_rejects(self):
+        @quota_required('exports')
+        def view(request):
+            return HttpResponse('ok')
+
+        reset = str(int(self.subscription.current_period_end.timestamp()))
+        for remaining in (2, 1, 0):
+            response = view(self.make_request())
+            assert response.status_code == 200
+            assert response['X-Quota-Limit'] == '3'
+            assert response['X-Quota-Remaining'] == str(remaining)
+            assert response['X-Quota-Reset'] == reset
+
+        response = view(self.make_request())
+        assert response.status_code == 429
+        assert response['X-Quota-Remaining'] == '0'
+        assert int(response['Retry-After']) > 0
+        assert self.usage() == 3
+
+    def test_rolling_window_reset(self, monkeypatch):
+        monkeypatch.setattr(utils, '_bucket_pruning', {'bucket_start': None, 'feature_ids': set()})
+        self.feature.quota_window = 24 * 3600
+        self.feature.save()
+        oldest = get_usage_bucket(timezone.now() - timedelta(hours=5))
+        UsageBucket.objects.create(subscription=self.subscription, feature=self.feature, bucket_start=oldest, usage_count=2)
+
+        @quota_required('exports')
+        def view(request):
+            return HttpResponse('ok')
+
+        reset = oldest + timedelta(days=1)
+        response = view(self.make_request())
+        assert response.status_code == 200
+        assert response['X-Quota-Reset'] == str(int(reset.timestamp()))
+
+        response = view(self.make_request())
+        assert response.status_code == 429
+        assert response['X-Quota-Reset'] == str(int(reset.timestamp()))
+        assert 0 < int(response['Retry-After']) <= 19 * 3600
+
+    def test_releases_on_exception(self):
+        @quota_required('exports')
+        def view(request):
+            raise ValueError('boom')
+
+        with pytest.raises(ValueError):
+            view(self.make_request())
+        assert self.usage() == 0
+
+    def test_without_subscription_or_feature(self, django_user_model):
+        @quota_required('exports')
+        def view(request):
+            return HttpResponse('ok')
+
+        @quota_required('missing')
+        def missing_view(request):
+            return HttpResponse('ok')
+
+        other = django_user_model.objects.create_user(username='other', password='x')
+        assert view(self.make_request(other)).status_code == 403
+        assert missing_view(self.make_request()).status_code == 403
+
+    def test_async_view(self):
+        @quota_required('exports', count=3)
+        async def view(request):
+            return HttpResponse('ok')
+
+        assert async_to_sync(view)(self.make_request()).status_code == 200
+        assert async_to_sync(view)(self.make_request()).status_code == 429
+
+    def test_mixin(self):
+        view = ExportView.as_view()
+        response = view(self.make_request())
+        assert response.status_code == 200
+        assert response['X-Quota-Remaining'] == '1'
+        assert view(self.make_request()).status_code == 429
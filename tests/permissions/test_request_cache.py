@@ -0,0 +1,55 @@
+import pytest
+from django.test import RequestFactory
+from django.http import HttpResponse
+from django.template import Context, Template
+from wagtail_subscriptions.cache import clear_local_caches
+from wagtail_subscriptions.context_processors import subscription_context
+from wagtail_subscriptions.models import PlanFeature
+from wagtail_subscriptions.permissions.decorators import subscription_required, feature_required
+from wagtail_subscriptions.permissions.middleware import SubscriptionMiddleware
+from wagtail_subscriptions.permissions.tenant_manager import TenantSubscriptionManager
+
+
+@pytest.mark.django_db
+class TestRequestMemoization:
+    def setup_method(self):
+        self.factory = RequestFactory()
+        clear_local_caches()
+
+    def test_active_subscription_is_memoized(self, active_subscription, django_assert_num_queries):
+        request = self.factory.get('/')
+        request.user = active_subscription.user
+
+        with django_assert_num_queries(1):
+            assert TenantSubscriptionManager.get_active_subscription(request) == active_subscription
+            assert TenantSubscriptionManager.get_active_plan(request) == active_subscription.plan
+            assert TenantSubscriptionManager.get_subscriber_info(request)['plan'] == 'Test Plan'
+
+    def test_gated_page_query_count(self, active_subscription, feature, django_assert_num_queries):
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+        template = Template(
+            '{% load subscription_tags %}'
+            '{% if request|has_feature:"test-feature" %}a{% endif %}'
+            '{% if request|has_feature:"test-feature" %}b{% endif %}'
+            '{% if request|has_feature:"other-feature" %}c{% endif %}'
+            '{{ current_plan.name }}'
+        )
+
+        @subscription_required
+        @feature_required('test-feature')
+        def gated_view(request):
+            context = Context({'request': request})
+            context.update(subscription_context(request))
+            return HttpResponse(template.render(context))
+
+        request = self.factory.get('/')
+        request.user = active_subscription.user
+        middleware = SubscriptionMiddleware(gated_view)
+
+        # One query for the subscription and plan, one to load the feature bits
+        with django_assert_num_queries(2):
+            response = middleware(request)
+
+        assert response.status_code == 200
+        assert response.content == b'abTest Plan'
+        assert request.subscription == active_subscription
@@ -0,0 +1,75 @@
+import pytest
+from django.test import RequestFactory
+from django.template import Context, Template
+from wagtail_subscriptions import metering
+from wagtail_subscriptions.cache import get_plan_snapshot
+from wagtail_subscriptions.models import Feature, PlanFeature, UsageRecord
+from wagtail_subscriptions.permissions.tenant_manager import TenantSubscriptionManager, FeatureAccess
+from wagtail_subscriptions.utils import track_feature_usage
+
+
+@pytest.mark.django_db
+class TestHasFeatures:
+    def setup_method(self):
+        self.factory = RequestFactory()
+
+    def test_batch_check(self, active_subscription, feature, module, django_assert_num_queries):
+        plan = active_subscription.plan
+        exports = Feature.objects.create(
+            module=module, name='Exports', slug='exports', feature_type='quota', default_quota=10
+        )
+        PlanFeature.objects.create(plan=plan, feature=feature)
+        PlanFeature.objects.create(plan=plan, feature=exports)
+        UsageRecord.objects.create(
+            subscription=active_subscription,
+            feature=exports,
+            usage_count=4,
+            period_start=active_subscription.current_period_start,
+            period_end=active_subscription.current_period_end
+        )
+
+        request = self.factory.get('/')
+        request.user = active_subscription.user
+        TenantSubscriptionManager.get_active_subscription(request)
+        get_plan_snapshot(plan)
+
+        with django_assert_num_queries(1):
+            access = TenantSubscriptionManager.has_features(request, ['test-feature', 'exports', 'missing'])
+
+        assert access == {
+            'test-feature': FeatureAccess(True, None, None),
+            'exports': FeatureAccess(True, 10, 6),
+            'missing': FeatureAccess(False, 0, None),
+        }
+
+    def test_counts_buffered_usage(self, active_subscription, module, settings, monkeypatch):
+        settings.WAGTAIL_SUBSCRIPTIONS = {'USAGE_BUFFERING': True, 'USAGE_BUFFER_SIZE': 100}
+        monkeypatch.setattr(metering, '_buffer', metering.UsageBuffer())
+        exports = Feature.objects.create(
+            module=module, name='Exports', slug='exports', feature_type='quota', default_quota=10
+        )
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=exports)
+        track_feature_usage(active_subscription, 'exports', count=3)
+        assert not UsageRecord.objects.exists()
+
+        request = self.factory.get('/')
+        request.user = active_subscription.user
+        assert TenantSubscriptionManager.has_features(request, ['exports'])['exports'] == FeatureAccess(True, 10, 7)
+
+    def test_without_subscription(self, user):
+        request = self.factory.get('/')
+        request.user = user
+        access = TenantSubscriptionManager.has_features(request, ['test-feature'])
+        assert not access['test-feature'].allowed
+
+    def test_template_tag(self, active_subscription, feature):
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+        request = self.factory.get('/')
+        request.user = active_subscription.user
+
+        rendered = Template(
+            '{% load subscription_tags %}'
+            '{% features_for request "test-feature" "missing" as access %}'
+            '{% for slug, item in access.items %}{{ slug }}={{ item.allowed }};{% endfor %}'
+        ).render(Context({'request': request}))
+        assert rendered == 'test-feature=True;missing=False;'
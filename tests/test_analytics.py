@@ -0,0 +1,234 @@
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from wagtail_subscriptions import metering
+from wagtail_subscriptions.analytics import SubscriptionAnalytics
+from wagtail_subscriptions.metering import UsageBuffer, flush_usage_buffer
+from wagtail_subscriptions.models import (
+    PlanFeature, Subscription, SubscriptionMetricsSnapshot, SubscriptionPlan, UsageRollup
+)
+from wagtail_subscriptions.utils import (
+    track_feature_usage, consume_feature_quota, release_feature_quota, record_usage_rollups, get_rollup_buckets
+)
+
+
+@pytest.fixture(autouse=True)
+def rollup_settings(settings):
+    settings.WAGTAIL_SUBSCRIPTIONS = {'USAGE_ROLLUPS': True}
+
+
+@pytest.mark.django_db
+class TestUsageRollups:
+    @pytest.fixture(autouse=True)
+    def included_feature(self, active_subscription, feature):
+        self.subscription = active_subscription
+        self.feature = feature
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+
+    def rollup(self, granularity):
+        return UsageRollup.objects.get(feature=self.feature, granularity=granularity)
+
+    def test_tracked_usage_is_rolled_up(self):
+        track_feature_usage(self.subscription, 'test-feature', count=2)
+        track_feature_usage(self.subscription, 'test-feature', count=3)
+
+        buckets = get_rollup_buckets(timezone.now())
+        for granularity in ('hour', 'day'):
+            rollup = self.rollup(granularity)
+            assert rollup.usage_count == 5
+            assert rollup.bucket_start == buckets[granularity]
+            assert rollup.plan_id == self.subscription.plan_id
+
+    def test_consume_and_release(self):
+        consume_feature_quota(self.subscription, 'test-feature', 4)
+        release_feature_quota(self.subscription, 'test-feature', 1)
+        assert self.rollup('hour').usage_count == 3
+        assert self.rollup('day').usage_count == 3
+
+    def test_buffered_usage_is_rolled_up_on_flush(self, settings, monkeypatch):
+        settings.WAGTAIL_SUBSCRIPTIONS = {
+            'USAGE_ROLLUPS': True,
+            'USAGE_BUFFERING': True,
+            'USAGE_BUFFER_INTERVAL': 3600,
+        }
+        monkeypatch.setattr(metering, '_buffer', UsageBuffer())
+        track_feature_usage(self.subscription, 'test-feature', count=2)
+        assert not UsageRollup.objects.exists()
+
+        flush_usage_buffer()
+        assert self.rollup('day').usage_count == 2
+
+    def test_sharded_rollups(self, settings, monkeypatch):
+        settings.WAGTAIL_SUBSCRIPTIONS = {'USAGE_ROLLUPS': True, 'USAGE_COUNTER_SHARDS': 4}
+        shards = iter(range(1000))
+        monkeypatch.setattr('wagtail_subscriptions.utils.random.randrange', lambda n: next(shards) % n)
+        for _ in range(4):
+            track_feature_usage(self.subscription, 'test-feature')
+
+        # Writes spread over several rollup rows, reads sum the shards
+        assert UsageRollup.objects.filter(granularity='day').count() > 1
+        assert SubscriptionAnalytics.get_usage_series('test-feature')[0]['usage'] == 4
+
+    def test_disabled(self, settings):
+        settings.WAGTAIL_SUBSCRIPTIONS = {}
+        track_feature_usage(self.subscription, 'test-feature')
+        assert not UsageRollup.objects.exists()
+
+
+@pytest.mark.django_db
+class TestUsageSeries:
+    def test_series_and_plan_breakdown(self, plan, feature, admin_client):
+        now = timezone.now()
+        yesterday = now - timedelta(days=1)
+        record_usage_rollups([(plan.pk, feature.pk, 3)], yesterday)
+        record_usage_rollups([(plan.pk, feature.pk, 4)], now)
+        record_usage_rollups([(plan.pk, feature.pk, 5)], now - timedelta(days=40))
+
+        series = SubscriptionAnalytics.get_usage_series('test-feature')
+        assert [row['usage'] for row in series] == [3, 4]
+        assert series[0]['bucket_start'] == get_rollup_buckets(yesterday)['day']
+
+        assert SubscriptionAnalytics.get_usage_by_plan('test-feature') == [
+            {'plan__slug': 'test-plan', 'plan__name': 'Test Plan', 'usage': 7}
+        ]
+
+        response = admin_client.get(
+            reverse('wagtail_subscriptions:analytics_api'),
+            {'metric': 'usage', 'feature': 'test-feature', 'granularity': 'hour', 'days': 1}
+        )
+        assert [row['usage'] for row in response.json()['series']] == [3, 4]
+
+
+def make_plans():
+    return {
+        period: SubscriptionPlan.objects.create(
+            name=period.title(), slug=period, price=Decimal(price), billing_period=period
+        )
+        for period, price in (('monthly', '30.00'), ('quarterly', '60.00'), ('yearly', '240.00'), ('lifetime', '500.00'))
+    }
+
+
+def make_subscriptions(user, plans, per_plan, status='active'):
+    now = timezone.now()
+    Subscription.objects.bulk_create([
+        Subscription(
+            user=user, plan=plan, status=status,
+            current_period_start=now, current_period_end=now + timedelta(days=30)
+        )
+        for plan in plans.values()
+        for _ in range(per_plan)
+    ], batch_size=1000)
+
+
+@pytest.mark.django_db
+class TestMRR:
+    def test_mrr_and_breakdown(self, user, django_assert_num_queries):
+        plans = make_plans()
+        make_subscriptions(user, plans, 3)
+        make_subscriptions(user, plans, 1, status='trialing')
+        make_subscriptions(user, plans, 5, status='canceled')
+
+        with django_assert_num_queries(1):
+            assert SubscriptionAnalytics.get_mrr() == Decimal('280.00')
+
+        breakdown = SubscriptionAnalytics.get_mrr(breakdown=True)
+        assert breakdown['total'] == Decimal('280.00')
+        assert breakdown['by_billing_period'] == {
+            'monthly': Decimal('120.00'), 'quarterly': Decimal('80.00'), 'yearly': Decimal('80.00')
+        }
+        assert [(row['slug'], row['subscriptions'], row['mrr']) for row in breakdown['by_plan']] == [
+            ('monthly', 4, Decimal('120.00')),
+            ('quarterly', 4, Decimal('80.00')),
+            ('yearly', 4, Decimal('80.00')),
+        ]
+
+    def test_api_breakdown(self, user, admin_client):
+        make_subscriptions(user, make_plans(), 2)
+        response = admin_client.get(reverse('wagtail_subscriptions:analytics_api'), {'metric': 'mrr'})
+        data = response.json()
+        assert data['value'] == 140.0
+        assert data['by_billing_period'] == {'monthly': 60.0, 'quarterly': 40.0, 'yearly': 40.0}
+        assert data['by_plan'][0]['subscriptions'] == 2
+
+    def test_no_subscriptions(self):
+        assert SubscriptionAnalytics.get_mrr() == Decimal('0.00')
+        assert SubscriptionAnalytics.get_mrr(breakdown=True)['by_plan'] == []
+
+
+@pytest.mark.django_db
+class TestMetricsSnapshots:
+    def test_series_reads_snapshots_and_today_live(self, active_subscription, django_assert_num_queries):
+        today = SubscriptionAnalytics.today()
+        for age in (3, 1):
+            SubscriptionMetricsSnapshot.objects.create(
+                date=today - timedelta(days=age), active_subscriptions=age, mrr=Decimal('10.00')
+            )
+        SubscriptionMetricsSnapshot.objects.create(date=today - timedelta(days=40), active_subscriptions=9)
+
+        with django_assert_num_queries(3):
+            series = SubscriptionAnalytics.get_metrics_series(days=30)
+
+        assert [(row['active_subscriptions'], row['is_live']) for row in series] == [(3, False), (1, False), (1, True)]
+        assert series[-1]['new_subscriptions'] == 1
+        assert series[-1]['mrr'] == Decimal('29.99')
+
+    def test_rates_from_snapshots(self, active_subscription, admin_client):
+        today = SubscriptionAnalytics.today()
+        assert SubscriptionAnalytics.get_snapshot_rates(days=2) is None
+
+        # A backfilled first day has no status counts to take the subscribers from
+        first = SubscriptionMetricsSnapshot.objects.create(date=today - timedelta(days=2))
+        SubscriptionMetricsSnapshot.objects.create(
+            date=today - timedelta(days=1), churned_subscriptions=2, new_trials=4, trial_conversions=1
+        )
+        assert SubscriptionAnalytics.get_snapshot_rates(days=2) is None
+
+        SubscriptionMetricsSnapshot.objects.filter(pk=first.pk).update(
+            active_subscriptions=8, trialing_subscriptions=1, past_due_subscriptions=1, mrr=Decimal('0.00')
+        )
+        assert SubscriptionAnalytics.get_snapshot_rates(days=2) == {'churn': 20.0, 'conversion': 25.0}
+
+        url = reverse('wagtail_subscriptions:analytics_api')
+        assert admin_client.get(url, {'metric': 'churn', 'days': 2}).json() == {'value': 20.0}
+        series = admin_client.get(url, {'metric': 'series', 'days': 2}).json()['series']
+        assert series[0]['date'] == str(today - timedelta(days=2))
+        assert series[-1]['is_live']
+
+
+    def test_churn_counts_subscribers_at_window_start(self, user, plan):
+        now = timezone.now()
+        for created_days_ago, canceled_days_ago in ((60, None), (60, 10), (60, 45), (5, None)):
+            subscription = Subscription.objects.create(
+                user=user, plan=plan, status='canceled' if canceled_days_ago else 'active',
+                current_period_start=now, current_period_end=now,
+                canceled_at=now - timedelta(days=canceled_days_ago) if canceled_days_ago else None
+            )
+            Subscription.objects.filter(pk=subscription.pk).update(created_at=now - timedelta(days=created_days_ago))
+
+        # Two subscribers at the start (one canceled earlier, one created later), one churned since
+        assert SubscriptionAnalytics.get_churn_rate(days=30) == 50.0
+
+
+@pytest.mark.slow
+@pytest.mark.django_db
+def test_mrr_benchmark(user):
+    """MRR is one grouped query whatever the number of subscriptions"""
+    plans = make_plans()
+    make_subscriptions(user, plans, 5000)
+
+    def naive_mrr():
+        total = Decimal('0.00')
+        for sub in Subscription.objects.filter(status__in=['active', 'trialing']):
+            months = SubscriptionAnalytics.MONTHS_PER_PERIOD.get(sub.plan.billing_period)
+            if months:
+                total += sub.plan.price / months
+        return total
+
+    with CaptureQueriesContext(connection) as context:
+        mrr = SubscriptionAnalytics.get_mrr()
+    assert len(context.captured_queries) == 1
+    assert naive_mrr() == mrr == Decimal('350000.00')
@@ -0,0 +1,172 @@
+import pytest
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.test import override_settings
+from wagtail_subscriptions import cache
+from wagtail_subscriptions.cache import Tier, compile_tiers, get_plan_snapshot, invalidate_plan_snapshot
+from wagtail_subscriptions.models import Feature, PlanFeature
+
+
+@pytest.mark.django_db
+class TestPlanSnapshot:
+    def setup_method(self):
+        invalidate_plan_snapshot()
+
+    def test_snapshot_contains_included_features(self, plan, feature, module):
+        hidden = Feature.objects.create(module=module, name='Hidden', slug='hidden')
+        PlanFeature.objects.create(plan=plan, feature=feature, quota_override=10)
+        PlanFeature.objects.create(plan=plan, feature=hidden, is_included=False)
+
+        snapshot = get_plan_snapshot(plan)
+        assert snapshot.has_feature('test-feature')
+        assert not snapshot.has_feature('hidden')
+        assert snapshot.get_quota('test-feature') == 10
+        assert snapshot.get_feature('test-feature').module == 'test-module'
+
+    def test_snapshot_is_cached(self, plan, feature, django_assert_num_queries):
+        PlanFeature.objects.create(plan=plan, feature=feature)
+        get_plan_snapshot(plan)
+
+        with django_assert_num_queries(0):
+            assert get_plan_snapshot(plan.pk).has_feature('test-feature')
+
+    def test_snapshot_is_immutable(self, plan):
+        snapshot = get_plan_snapshot(plan)
+        with pytest.raises(AttributeError):
+            snapshot.plan_id = 0
+        with pytest.raises(TypeError):
+            snapshot.features['x'] = None
+
+    def test_plan_feature_change_invalidates(self, plan, feature):
+        plan_feature = PlanFeature.objects.create(plan=plan, feature=feature)
+        assert get_plan_snapshot(plan).has_feature('test-feature')
+
+        plan_feature.is_included = False
+        plan_feature.save()
+        assert not get_plan_snapshot(plan).has_feature('test-feature')
+
+        plan_feature.delete()
+        assert get_plan_snapshot(plan).features == {}
+
+    def test_feature_change_invalidates(self, plan, feature):
+        PlanFeature.objects.create(plan=plan, feature=feature)
+        assert get_plan_snapshot(plan).has_feature('test-feature')
+
+        feature.is_active = False
+        feature.save()
+        assert not get_plan_snapshot(plan).has_feature('test-feature')
+
+    def test_module_change_invalidates(self, plan, feature, module):
+        PlanFeature.objects.create(plan=plan, feature=feature)
+        get_plan_snapshot(plan)
+
+        module.slug = 'renamed'
+        module.save()
+        assert get_plan_snapshot(plan).get_feature('test-feature').module == 'renamed'
+
+
+@pytest.mark.django_db
+class TestFeatureTiers:
+    TIERS = [
+        {'name': 'Growth', 'threshold': 1000, 'limit': 5000},
+        {'name': 'Starter', 'threshold': 0, 'limit': None},
+        {'name': 'Scale', 'threshold': 5000, 'limit': 20000},
+    ]
+
+    def setup_method(self):
+        invalidate_plan_snapshot()
+
+    def test_tiers_compiled_into_snapshot(self, plan, module):
+        feature = Feature.objects.create(module=module, name='Storage', slug='storage', feature_type='tiered')
+        PlanFeature.objects.create(plan=plan, feature=feature, tiers=self.TIERS)
+
+        tiers = get_plan_snapshot(plan).get_feature('storage').tiers
+        assert tiers.thresholds == (0, 1000, 5000)
+        assert tiers.cap == 20000
+        snapshot = get_plan_snapshot(plan)
+        assert snapshot.get_tier('storage', 0).name == 'Starter'
+        assert snapshot.get_tier('storage', 999).level == 1
+        assert snapshot.get_tier('storage', 1000) == Tier(2, 'Growth', 1000, 5000)
+        assert snapshot.get_tier('storage', 10**9).name == 'Scale'
+        assert tiers.as_table()[0] == {'level': 1, 'name': 'Starter', 'threshold': 0, 'limit': None}
+
+    def test_cap_stops_at_unreachable_tier(self):
+        tiers = compile_tiers([{'threshold': 0, 'limit': 100}, {'threshold': 500, 'limit': None}])
+        assert tiers.cap == 100
+        assert compile_tiers([]) is None
+
+    def test_malformed_tiers_are_skipped(self, plan, module, caplog):
+        feature = Feature.objects.create(module=module, name='Storage', slug='storage', feature_type='tiered')
+        # Saved without clean(), so nothing rejected the bad tiers
+        PlanFeature.objects.create(plan=plan, feature=feature, tiers=[
+            {'limit': 10},
+            {'threshold': '5'},
+            {'threshold': 0, 'limit': -1},
+            'tier',
+            {'threshold': 0, 'limit': 100},
+            {'threshold': 0, 'limit': 200},
+        ])
+
+        tiers = get_plan_snapshot(plan).get_feature('storage').tiers
+        assert (tiers.thresholds, tiers.limits) == ((0,), (100,))
+        assert len([record for record in caplog.records if 'malformed tier' in record.getMessage()]) == 5
+        assert compile_tiers({'threshold': 0}) is None
+
+    def test_validation(self, plan, feature):
+        plan_feature = PlanFeature(plan=plan, feature=feature, tiers=[{'threshold': 0}, {'threshold': 0}])
+        with pytest.raises(ValidationError):
+            plan_feature.clean()
+        plan_feature.tiers = [{'threshold': -1}]
+        with pytest.raises(ValidationError):
+            plan_feature.clean()
+        plan_feature.tiers = self.TIERS
+        plan_feature.clean()
+
+
+@pytest.mark.django_db
+class TestCatalogVersion:
+    def setup_method(self):
+        invalidate_plan_snapshot()
+        cache.get_shared_cache().delete(cache.CATALOG_VERSION_KEY)
+
+    def test_catalog_change_bumps_version(self, plan, feature):
+        version = cache.get_catalog_version()
+        PlanFeature.objects.create(plan=plan, feature=feature)
+        assert cache.get_catalog_version() > version
+
+    @override_settings(WAGTAIL_SUBSCRIPTIONS={'CATALOG_VERSION_CHECK_INTERVAL': 0})
+    def test_other_worker_change_drops_local_cache(self, plan, feature, django_assert_num_queries):
+        PlanFeature.objects.create(plan=plan, feature=feature)
+        get_plan_snapshot(plan)
+
+        with django_assert_num_queries(0):
+            get_plan_snapshot(plan)
+
+        # Another process edits the catalog
+        cache.get_shared_cache().incr(cache.CATALOG_VERSION_KEY)
+        with django_assert_num_queries(1):
+            get_plan_snapshot(plan)
+
+    @override_settings(WAGTAIL_SUBSCRIPTIONS={'CATALOG_VERSION_CHECK_INTERVAL': 0})
+    def test_version_bumped_again_on_commit(self, plan, feature, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                PlanFeature.objects.create(plan=plan, feature=feature)
+                # A worker rebuilding before the commit caches what it can read, under the new version
+                cache._plan_snapshots[plan.pk] = cache.PlanSnapshot(plan.pk, {})
+                cache.check_catalog_version()
+                version = cache.get_catalog_version()
+
+        assert callbacks
+        assert cache.get_catalog_version() > version
+        assert get_plan_snapshot(plan).has_feature('test-feature')
+
+    @override_settings(WAGTAIL_SUBSCRIPTIONS={'CATALOG_VERSION_CHECK_INTERVAL': 60})
+    def test_version_checked_at_most_once_per_interval(self, plan):
+        get_plan_snapshot(plan)
+        cache.check_catalog_version()
+
+        cache.get_shared_cache().incr(cache.CATALOG_VERSION_KEY)
+        assert plan.pk in cache._plan_snapshots
+        get_plan_snapshot(plan)
+        assert plan.pk in cache._plan_snapshots
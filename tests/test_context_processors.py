@@ -0,0 +1,24 @@
+import pytest
+from django.test import RequestFactory
+from django.template import Context, Template
+from wagtail_subscriptions.context_processors import subscription_context
+
+
+@pytest.mark.django_db
+class TestSubscriptionContext:
+    def setup_method(self):
+        self.factory = RequestFactory()
+
+    def test_context_is_lazy(self, user, django_assert_num_queries):
+        request = self.factory.get('/')
+        request.user = user
+
+        with django_assert_num_queries(0):
+            context = subscription_context(request)
+            Template('{{ is_multi_tenant }}').render(Context(context))
+
+        with django_assert_num_queries(1):
+            rendered = Template(
+                '{% if current_plan %}plan{% endif %}{{ subscription_info.plan }}'
+            ).render(Context(context))
+        assert rendered == 'No Plan'
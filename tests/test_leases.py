@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.utils import timezone
+from wagtail_subscriptions import leases
+from wagtail_subscriptions.cache import get_plan_snapshot
+from wagtail_subscriptions.leases import (
+    QuotaLeasePool, consume_leased_quota, release_leased_quota, return_quota_leases
+)
+from wagtail_subscriptions.models import Feature, PlanFeature, UsageBucket, UsageRecord
+from wagtail_subscriptions.permissions.decorators import quota_required
+from wagtail_subscriptions.utils import QuotaResult, get_usage_bucket
+
+
+@pytest.fixture(autouse=True)
+def lease_pool(settings, monkeypatch):
+    settings.WAGTAIL_SUBSCRIPTIONS = {'QUOTA_LEASE_SIZE': 10, 'QUOTA_LEASE_TTL': 60}
+    monkeypatch.setattr(leases, '_pool', QuotaLeasePool())
+
+
+@pytest.mark.django_db
+class TestQuotaLeases:
+    @pytest.fixture(autouse=True)
+    def quota_feature(self, active_subscription, module):
+        self.subscription = active_subscription
+        self.feature = Feature.objects.create(
+            module=module, name='Exports', slug='exports', feature_type='quota', default_quota=25
+        )
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=self.feature)
+        get_plan_snapshot(active_subscription.plan)
+
+    def usage(self):
+        return UsageRecord.objects.get(feature=self.feature).usage_count
+
+    def test_checks_served_from_lease(self, django_assert_num_queries):
+        assert consume_leased_quota(self.subscription, 'exports') == QuotaResult(True, 25, None)
+        assert self.usage() == 10
+
+        with django_assert_num_queries(0):
+            for _ in range(9):
+                assert consume_leased_quota(self.subscription, 'exports').allowed
+
+    def test_never_overshoots_quota(self):
+        allowed = sum(consume_leased_quota(self.subscription, 'exports').allowed for _ in range(40))
+        assert allowed == 25
+        assert self.usage() == 25
+
+    def test_unused_units_are_returned(self, settings):
+        consume_leased_quota(self.subscription, 'exports', 3)
+        assert release_leased_quota(self.subscription, 'exports', 1)
+        assert self.usage() == 10
+
+        assert return_quota_leases() == 1
+        assert self.usage() == 2
+
+    def test_expired_lease_is_replaced(self, settings):
+        settings.WAGTAIL_SUBSCRIPTIONS = {'QUOTA_LEASE_SIZE': 10, 'QUOTA_LEASE_TTL': 0}
+        consume_leased_quota(self.subscription, 'exports', 4)
+        consume_leased_quota(self.subscription, 'exports', 1)
+        # 6 unused units of the first lease went back before the second was taken
+        assert self.usage() == 14
+
+    def test_expired_leases_swept_by_other_keys(self, module, monkeypatch):
+        imports = Feature.objects.create(
+            module=module, name='Imports', slug='imports', feature_type='quota', default_quota=25
+        )
+        PlanFeature.objects.create(plan=self.subscription.plan, feature=imports)
+        get_plan_snapshot(self.subscription.plan)
+        clock = [1000.0]
+        monkeypatch.setattr(leases.time, 'monotonic', lambda: clock[0])
+
+        consume_leased_quota(self.subscription, 'exports', 3)
+        clock[0] += 30
+        consume_leased_quota(self.subscription, 'imports')
+        clock[0] += 40
+        # Served from the live imports lease, but the exports lease has expired meanwhile
+        assert consume_leased_quota(self.subscription, 'imports').allowed
+        assert self.usage() == 3
+        assert UsageRecord.objects.get(feature=imports).usage_count == 10
+
+    def test_unused_units_return_to_reserved_bucket(self, module, monkeypatch):
+        reports = Feature.objects.create(
+            module=module, name='Reports', slug='reports', feature_type='quota',
+            default_quota=25, quota_window=7 * 24 * 3600
+        )
+        PlanFeature.objects.create(plan=self.subscription.plan, feature=reports)
+        get_plan_snapshot(self.subscription.plan)
+        reserved_at = timezone.now()
+
+        consume_leased_quota(self.subscription, 'reports', 3)
+        later = reserved_at + timedelta(days=1)
+        monkeypatch.setattr(timezone, 'now', lambda: later)
+        return_quota_leases()
+
+        bucket = UsageBucket.objects.get(feature=reports)
+        assert bucket.bucket_start == get_usage_bucket(reserved_at)
+        assert bucket.usage_count == 3
+
+    def test_leased_decorator(self):
+        @quota_required('exports', leased=True)
+        def view(request):
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/')
+        request.user = self.subscription.user
+        response = view(request)
+        assert response.status_code == 200
+        assert response['X-Quota-Limit'] == '25'
+        assert 'X-Quota-Remaining' not in response
@@ -0,0 +1,82 @@
+import threading
+import pytest
+from wagtail_subscriptions.cache import get_plan_snapshot
+from wagtail_subscriptions import metering
+from wagtail_subscriptions.metering import UsageBuffer, get_usage_buffer, flush_usage_buffer
+from wagtail_subscriptions.models import Feature, PlanFeature, UsageRecord
+from wagtail_subscriptions.utils import UsageResult, track_feature_usage, check_feature_quota
+
+
+@pytest.fixture
+def buffered(settings, monkeypatch):
+    settings.WAGTAIL_SUBSCRIPTIONS = {
+        'USAGE_BUFFERING': True,
+        'USAGE_BUFFER_SIZE': 100,
+        'USAGE_BUFFER_INTERVAL': 3600,
+    }
+    monkeypatch.setattr(metering, '_buffer', UsageBuffer())
+
+
+@pytest.fixture
+def quota_feature(active_subscription, module):
+    feature = Feature.objects.create(
+        module=module, name='API Calls', slug='api-calls', feature_type='quota', default_quota=10
+    )
+    PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+    return feature
+
+
+@pytest.mark.django_db
+class TestUsageBuffer:
+    def test_buffers_until_flush(self, buffered, active_subscription, quota_feature, django_assert_num_queries):
+        get_plan_snapshot(active_subscription.plan)
+        with django_assert_num_queries(0):
+            for _ in range(3):
+                track_feature_usage(active_subscription, 'api-calls', count=3)
+        assert not UsageRecord.objects.exists()
+
+        # Quota checks see persisted + buffered usage
+        assert check_feature_quota(active_subscription, 'api-calls')
+        assert track_feature_usage(active_subscription, 'api-calls') == UsageResult(10, None, True)
+        assert not check_feature_quota(active_subscription, 'api-calls')
+
+        with django_assert_num_queries(1):
+            assert flush_usage_buffer() == 1
+        assert UsageRecord.objects.get(feature=quota_feature).usage_count == 10
+        assert not check_feature_quota(active_subscription, 'api-calls')
+
+    def test_flush_on_size(self, buffered, settings, active_subscription, quota_feature, feature):
+        settings.WAGTAIL_SUBSCRIPTIONS = dict(settings.WAGTAIL_SUBSCRIPTIONS, USAGE_BUFFER_SIZE=2)
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+
+        track_feature_usage(active_subscription, 'api-calls')
+        assert not UsageRecord.objects.exists()
+        track_feature_usage(active_subscription, 'test-feature')
+        assert UsageRecord.objects.count() == 2
+        assert len(get_usage_buffer()) == 0
+
+    def test_background_flush(self, buffered, monkeypatch):
+        buffer = get_usage_buffer()
+        flushed = threading.Event()
+        monkeypatch.setattr(buffer, 'flush', flushed.set)
+
+        buffer.start_flusher(0.01)
+        try:
+            # No add() call needed for the interval to trigger a flush
+            assert flushed.wait(5)
+        finally:
+            buffer.stop_flusher()
+
+    def test_failed_flush_keeps_deltas(self, buffered, active_subscription, quota_feature, monkeypatch):
+        track_feature_usage(active_subscription, 'api-calls', count=2)
+
+        def fail(deltas):
+            list(deltas)
+            raise RuntimeError('database unavailable')
+
+        monkeypatch.setattr(metering, 'bulk_increment_usage', fail)
+        with pytest.raises(RuntimeError):
+            flush_usage_buffer()
+        assert get_usage_buffer().pending(
+            active_subscription.pk, quota_feature.pk, active_subscription.current_period_start
+        ) == 2
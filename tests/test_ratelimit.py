@@ -0,0 +1,72 @@
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+from wagtail_subscriptions.cache import get_plan_snapshot
+from wagtail_subscriptions.models import Feature, PlanFeature, UsageRecord
+from wagtail_subscriptions.permissions.decorators import rate_limited
+from wagtail_subscriptions.ratelimit import consume_rate_limit, get_rate_limit_cache
+
+
+@pytest.mark.django_db
+class TestRateLimit:
+    @pytest.fixture(autouse=True)
+    def rate_feature(self, active_subscription, module):
+        get_rate_limit_cache().clear()
+        self.subscription = active_subscription
+        self.feature = Feature.objects.create(
+            module=module, name='API Requests', slug='api-requests', feature_type='rate',
+            default_quota=10, quota_window=60
+        )
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=self.feature)
+        get_plan_snapshot(active_subscription.plan)
+
+    def test_limit_within_window(self, django_assert_num_queries):
+        with django_assert_num_queries(0):
+            results = [consume_rate_limit(self.subscription, 'api-requests', now=6000) for _ in range(11)]
+
+        assert all(result.allowed for result in results[:10])
+        assert results[9].remaining == 0
+        denied = results[10]
+        assert not denied.allowed
+        assert denied.reset == 6060
+        assert denied.retry_after == 60
+        assert not UsageRecord.objects.exists()
+
+    def test_previous_window_is_weighted(self):
+        for _ in range(10):
+            consume_rate_limit(self.subscription, 'api-requests', now=6030)
+
+        # Half way into the next window half of the previous window still counts
+        result = consume_rate_limit(self.subscription, 'api-requests', now=6090)
+        assert result.allowed
+        assert result.remaining == 4
+        allowed = sum(consume_rate_limit(self.subscription, 'api-requests', now=6090).allowed for _ in range(10))
+        assert allowed == 4
+
+        denied = consume_rate_limit(self.subscription, 'api-requests', now=6090)
+        assert denied.retry_after == 6
+        assert consume_rate_limit(self.subscription, 'api-requests', now=6096).allowed
+
+    def test_denied_requests_are_not_counted(self):
+        for _ in range(15):
+            consume_rate_limit(self.subscription, 'api-requests', now=6000)
+        assert get_rate_limit_cache().get(f'wagtail_subscriptions:rate:{self.subscription.pk}:{self.feature.pk}:100') == 10
+
+    def test_other_features(self, feature):
+        PlanFeature.objects.create(plan=self.subscription.plan, feature=feature)
+        assert consume_rate_limit(self.subscription, 'test-feature').allowed
+        assert not consume_rate_limit(self.subscription, 'missing').allowed
+
+    def test_decorator(self):
+        @rate_limited('api-requests', count=4)
+        def view(request):
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/')
+        request.user = self.subscription.user
+        responses = [view(request) for _ in range(3)]
+
+        assert [response.status_code for response in responses] == [200, 200, 429]
+        assert responses[1]['X-RateLimit-Limit'] == '10'
+        assert responses[1]['X-RateLimit-Remaining'] == '2'
+        assert 'Retry-After' in responses[2]
@@ -0,0 +1,308 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from django.db import connections
+from django.test import RequestFactory
+from django.utils import timezone
+from wagtail_subscriptions import utils
+from wagtail_subscriptions.analytics import SubscriptionAnalytics
+from wagtail_subscriptions.cache import get_plan_snapshot
+from wagtail_subscriptions.models import Feature, PlanFeature, UsageBucket, UsageGauge, UsageRecord
+from wagtail_subscriptions.permissions.tenant_manager import TenantSubscriptionManager
+from wagtail_subscriptions.utils import (
+    track_feature_usage, increment_usage, _increment_counter, _usage_upsert_supported, _consume_counter_update, USAGE_RECORD_KEY,
+    consume_feature_quota, release_feature_quota, QuotaResult, UsageResult, get_current_usage, check_feature_quota,
+    get_usage_bucket, get_rolling_usage, acquire_feature_gauge, release_feature_gauge, set_feature_gauge,
+    get_feature_tier
+)
+
+
+@pytest.mark.django_db
+class TestTrackFeatureUsage:
+    def test_increments_usage(self, active_subscription, feature, django_assert_num_queries):
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+        assert track_feature_usage(active_subscription, 'test-feature').usage_count == 1
+
+        with django_assert_num_queries(1):
+            record = track_feature_usage(active_subscription, 'test-feature', count=4)
+
+        assert record == UsageResult(5, record.record_id, False)
+        assert UsageRecord.objects.get(pk=record.record_id).usage_count == 5
+
+    def test_idempotency_key(self, active_subscription, feature):
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+        assert track_feature_usage(active_subscription, 'test-feature', 2, idempotency_key='job-1').usage_count == 2
+        assert track_feature_usage(active_subscription, 'test-feature', 2, idempotency_key='job-1') is None
+        assert track_feature_usage(active_subscription, 'test-feature', 2, idempotency_key='job-2').usage_count == 4
+
+    def test_feature_not_in_plan(self, active_subscription, feature):
+        assert track_feature_usage(active_subscription, 'test-feature') is None
+        assert not UsageRecord.objects.exists()
+
+    def test_fallback_increment(self, active_subscription, feature):
+        values = {
+            'subscription_id': active_subscription.pk,
+            'feature_id': feature.pk,
+            'period_start': active_subscription.current_period_start,
+            'period_end': active_subscription.current_period_end,
+            'shard': 0,
+            'usage_count': 2,
+            'created_at': active_subscription.created_at,
+            'updated_at': active_subscription.created_at,
+        }
+        record_id, usage_count = _increment_counter(UsageRecord, values, USAGE_RECORD_KEY)
+        assert usage_count == 2
+        assert _increment_counter(UsageRecord, values, USAGE_RECORD_KEY) == (record_id, 4)
+
+    def test_upsert_flag_missing_on_old_django(self):
+        # Django < 4.1 has no supports_update_conflicts_with_target
+        old_connection = SimpleNamespace(features=SimpleNamespace(can_return_columns_from_insert=True))
+        assert _usage_upsert_supported(old_connection) is False
+
+
+@pytest.mark.django_db
+class TestConsumeFeatureQuota:
+    @pytest.fixture(autouse=True)
+    def quota_feature(self, active_subscription, module):
+        self.subscription = active_subscription
+        self.feature = Feature.objects.create(
+            module=module, name='Exports', slug='exports', feature_type='quota', default_quota=5
+        )
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=self.feature)
+        get_plan_snapshot(active_subscription.plan)
+
+    def test_consume_until_exhausted(self, django_assert_num_queries):
+        with django_assert_num_queries(1):
+            assert consume_feature_quota(self.subscription, 'exports', 3) == QuotaResult(True, 5, 2)
+        with django_assert_num_queries(1):
+            assert consume_feature_quota(self.subscription, 'exports', 2) == QuotaResult(True, 5, 0)
+
+        assert consume_feature_quota(self.subscription, 'exports') == QuotaResult(False, 5, 0)
+        assert UsageRecord.objects.get(feature=self.feature).usage_count == 5
+
+    def test_request_larger_than_remaining(self):
+        consume_feature_quota(self.subscription, 'exports', 4)
+        assert consume_feature_quota(self.subscription, 'exports', 2) == QuotaResult(False, 5, 1)
+        assert consume_feature_quota(self.subscription, 'exports', 6) == QuotaResult(False, 5, 1)
+
+    def test_release(self):
+        consume_feature_quota(self.subscription, 'exports', 5)
+        assert release_feature_quota(self.subscription, 'exports', 2)
+        assert consume_feature_quota(self.subscription, 'exports', 2) == QuotaResult(True, 5, 0)
+
+        release_feature_quota(self.subscription, 'exports', 10)
+        assert UsageRecord.objects.get(feature=self.feature).usage_count == 0
+
+    def test_unlimited_and_missing_features(self, feature):
+        PlanFeature.objects.create(plan=self.subscription.plan, feature=feature)
+        assert consume_feature_quota(self.subscription, 'test-feature') == QuotaResult(True, None, None)
+        assert not consume_feature_quota(self.subscription, 'missing').allowed
+
+    def test_fallback_conditional_update(self):
+        values = {
+            'subscription_id': self.subscription.pk,
+            'feature_id': self.feature.pk,
+            'period_start': self.subscription.current_period_start,
+            'period_end': self.subscription.current_period_end,
+            'shard': 0,
+            'usage_count': 3,
+            'created_at': self.subscription.created_at,
+            'updated_at': self.subscription.created_at,
+        }
+        assert _consume_counter_update(UsageRecord, values, USAGE_RECORD_KEY, 5) == 3
+        assert _consume_counter_update(UsageRecord, values, USAGE_RECORD_KEY, 5) is None
+        assert _consume_counter_update(UsageRecord, dict(values, usage_count=2), USAGE_RECORD_KEY, 5) == 5
+
+
+@pytest.mark.django_db
+class TestShardedCounters:
+    @pytest.fixture(autouse=True)
+    def sharded(self, settings, active_subscription, module, monkeypatch):
+        settings.WAGTAIL_SUBSCRIPTIONS = {'USAGE_COUNTER_SHARDS': 4}
+        shards = iter(range(1000))
+        monkeypatch.setattr('wagtail_subscriptions.utils.random.randrange', lambda n: next(shards) % n)
+        self.subscription = active_subscription
+        self.feature = Feature.objects.create(
+            module=module, name='Exports', slug='exports', feature_type='quota', default_quota=10
+        )
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=self.feature)
+
+    def test_writes_spread_and_reads_sum(self):
+        for _ in range(8):
+            track_feature_usage(self.subscription, 'exports')
+
+        assert sorted(UsageRecord.objects.values_list('shard', 'usage_count')) == [(0, 2), (1, 2), (2, 2), (3, 2)]
+        assert get_current_usage(self.subscription, self.feature.pk) == 8
+        assert check_feature_quota(self.subscription, 'exports')
+
+        track_feature_usage(self.subscription, 'exports', count=2)
+        assert not check_feature_quota(self.subscription, 'exports')
+
+        usage = SubscriptionAnalytics.get_feature_usage('exports')
+        assert (usage['total_usage'], usage['avg_usage'], usage['unique_users']) == (10, 10, 1)
+
+    def test_consume_accounts_for_all_shards(self):
+        track_feature_usage(self.subscription, 'exports', count=3)
+        track_feature_usage(self.subscription, 'exports', count=3)
+
+        assert consume_feature_quota(self.subscription, 'exports', 4) == QuotaResult(True, 10, 0)
+        assert consume_feature_quota(self.subscription, 'exports') == QuotaResult(False, 10, 0)
+
+
+@pytest.mark.django_db
+class TestRollingQuota:
+    @pytest.fixture(autouse=True)
+    def rolling_feature(self, active_subscription, module, monkeypatch):
+        monkeypatch.setattr(utils, '_bucket_pruning', {'bucket_start': None, 'feature_ids': set()})
+        self.subscription = active_subscription
+        self.feature = Feature.objects.create(
+            module=module, name='Exports', slug='exports', feature_type='quota',
+            default_quota=5, quota_window=7 * 24 * 3600
+        )
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=self.feature)
+
+    def add_bucket(self, age, usage_count):
+        return UsageBucket.objects.create(
+            subscription=self.subscription,
+            feature=self.feature,
+            bucket_start=get_usage_bucket(timezone.now() - age),
+            usage_count=usage_count
+        )
+
+    def test_consume_within_window(self):
+        self.add_bucket(timedelta(days=2), 3)
+
+        assert consume_feature_quota(self.subscription, 'exports', 3) == QuotaResult(False, 5, 2)
+        assert consume_feature_quota(self.subscription, 'exports', 2) == QuotaResult(True, 5, 0)
+        assert not check_feature_quota(self.subscription, 'exports')
+        # The billing period counter still records the usage
+        assert get_current_usage(self.subscription, self.feature.pk) == 2
+
+        assert release_feature_quota(self.subscription, 'exports', 2)
+        assert get_rolling_usage(self.subscription, self.feature.pk, self.feature.quota_window) == 3
+
+    def test_expired_buckets_are_ignored_and_pruned(self):
+        expired = self.add_bucket(timedelta(days=8), 5)
+        assert check_feature_quota(self.subscription, 'exports')
+
+        track_feature_usage(self.subscription, 'exports', count=4)
+        assert not UsageBucket.objects.filter(pk=expired.pk).exists()
+        assert get_rolling_usage(self.subscription, self.feature.pk, self.feature.quota_window) == 4
+
+    def test_batch_check_remaining(self):
+        self.add_bucket(timedelta(hours=5), 1)
+        track_feature_usage(self.subscription, 'exports')
+
+        request = RequestFactory().get('/')
+        request.user = self.subscription.user
+        assert TenantSubscriptionManager.has_features(request, ['exports'])['exports'].remaining == 3
+
+
+@pytest.mark.django_db
+class TestFeatureGauge:
+    @pytest.fixture(autouse=True)
+    def seats(self, active_subscription, module):
+        self.subscription = active_subscription
+        self.feature = Feature.objects.create(
+            module=module, name='Team Members', slug='team-members', feature_type='gauge', default_quota=3
+        )
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=self.feature)
+        get_plan_snapshot(active_subscription.plan)
+
+    def test_acquire_and_release(self, django_assert_num_queries):
+        with django_assert_num_queries(1):
+            assert acquire_feature_gauge(self.subscription, 'team-members', 2) == QuotaResult(True, 3, 1)
+        assert acquire_feature_gauge(self.subscription, 'team-members', 2) == QuotaResult(False, 3, 1)
+        assert acquire_feature_gauge(self.subscription, 'team-members') == QuotaResult(True, 3, 0)
+        assert not check_feature_quota(self.subscription, 'team-members')
+
+        assert release_feature_gauge(self.subscription, 'team-members')
+        assert check_feature_quota(self.subscription, 'team-members')
+        assert UsageGauge.objects.get().usage_count == 2
+        assert not UsageRecord.objects.exists()
+
+    def test_set_and_batch_check(self):
+        set_feature_gauge(self.subscription, 'team-members', 1)
+        set_feature_gauge(self.subscription, 'team-members', 2)
+
+        request = RequestFactory().get('/')
+        request.user = self.subscription.user
+        assert TenantSubscriptionManager.has_features(request, ['team-members'])['team-members'].remaining == 1
+
+    def test_other_feature_types_are_denied(self, feature):
+        PlanFeature.objects.create(plan=self.subscription.plan, feature=feature)
+        assert not acquire_feature_gauge(self.subscription, 'test-feature').allowed
+        assert not acquire_feature_gauge(self.subscription, 'missing').allowed
+
+
+@pytest.mark.django_db
+class TestTieredFeature:
+    @pytest.fixture(autouse=True)
+    def tiered_feature(self, active_subscription, module):
+        self.subscription = active_subscription
+        self.feature = Feature.objects.create(module=module, name='Storage', slug='storage', feature_type='tiered')
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=self.feature, tiers=[
+            {'name': 'Starter', 'threshold': 0, 'limit': None},
+            {'name': 'Growth', 'threshold': 10, 'limit': 12},
+        ])
+
+    def test_tier_follows_usage(self):
+        assert get_feature_tier(self.subscription, 'storage').name == 'Starter'
+        assert self.subscription.get_feature_tier('storage', usage=11).name == 'Growth'
+
+        track_feature_usage(self.subscription, 'storage', count=10)
+        assert get_feature_tier(self.subscription, 'storage').name == 'Growth'
+        assert check_feature_quota(self.subscription, 'storage')
+
+        request = RequestFactory().get('/')
+        request.user = self.subscription.user
+        assert TenantSubscriptionManager.has_features(request, ['storage'])['storage'][1:] == (12, 2)
+
+    def test_consume_stops_at_cap(self):
+        assert consume_feature_quota(self.subscription, 'storage', 11) == QuotaResult(True, 12, 1)
+        assert consume_feature_quota(self.subscription, 'storage', 2) == QuotaResult(False, 12, 1)
+        assert consume_feature_quota(self.subscription, 'storage') == QuotaResult(True, 12, 0)
+        assert not check_feature_quota(self.subscription, 'storage')
+
+
+@pytest.mark.slow
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_increments_are_not_lost(active_subscription, feature):
+    """Increments from many threads must all be counted"""
+    PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+
+    def work(_):
+        try:
+            for _ in range(20):
+                increment_usage(active_subscription, feature.pk)
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(work, range(8)))
+
+    assert UsageRecord.objects.get(feature=feature).usage_count == 160
+
+
+@pytest.mark.slow
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_consumers_never_exceed_quota(active_subscription, module):
+    """Concurrent reservations must stop exactly at the quota"""
+    feature = Feature.objects.create(
+        module=module, name='Exports', slug='exports', feature_type='quota', default_quota=100
+    )
+    PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+
+    def work(_):
+        try:
+            return sum(consume_feature_quota(active_subscription, 'exports').allowed for _ in range(20))
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        allowed = sum(executor.map(work, range(8)))
+
+    assert allowed == 100
+    assert UsageRecord.objects.get(feature=feature).usage_count == 100
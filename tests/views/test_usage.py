@@ -0,0 +1,168 @@
+import json
+import pytest
+from datetime import timedelta
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from wagtail_subscriptions.cache import get_plan_snapshot
+from wagtail_subscriptions.ingestion import ingest_usage_events
+from wagtail_subscriptions.models import PlanFeature, UsageRecord, UsageEventKey, UsageRollup
+from wagtail_subscriptions.utils import get_rollup_buckets
+
+
+@pytest.fixture(autouse=True)
+def api_settings(settings):
+    settings.WAGTAIL_SUBSCRIPTIONS = {'USAGE_API_KEYS': ['secret-key'], 'USAGE_API_MAX_EVENTS': 100}
+
+
+@pytest.mark.django_db
+class TestUsageIngestAPI:
+    @pytest.fixture(autouse=True)
+    def included_feature(self, active_subscription, feature):
+        self.subscription = active_subscription
+        self.feature = feature
+        PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+        self.url = reverse('wagtail_subscriptions:usage_api')
+
+    def post(self, events, client=None, **extra):
+        extra.setdefault('HTTP_AUTHORIZATION', 'Bearer secret-key')
+        return (client or Client()).post(
+            self.url, json.dumps({'events': events}), content_type='application/json', **extra
+        )
+
+    def test_aggregates_events(self, django_assert_max_num_queries):
+        events = [
+            {'subscription': self.subscription.pk, 'feature_slug': 'test-feature', 'count': 2},
+            {'user': self.subscription.user_id, 'feature_slug': 'test-feature'},
+        ] * 50
+        with django_assert_max_num_queries(8):
+            response = self.post(events)
+
+        assert response.status_code == 200
+        assert response.json()['accepted'] == 100
+        assert UsageRecord.objects.get(feature=self.feature).usage_count == 150
+
+    def test_per_event_results(self):
+        future = (timezone.now() + timedelta(days=1)).isoformat()
+        before_period = (self.subscription.current_period_start - timedelta(days=1)).isoformat()
+        response = self.post([
+            {'subscription': self.subscription.pk, 'feature_slug': 'test-feature', 'idempotency_key': 'a'},
+            {'subscription': self.subscription.pk, 'feature_slug': 'test-feature', 'idempotency_key': 'a'},
+            {'subscription': self.subscription.pk, 'feature_slug': 'missing'},
+            {'subscription': 0, 'feature_slug': 'test-feature'},
+            {'subscription': self.subscription.pk, 'feature_slug': 'test-feature', 'count': -1},
+            {'subscription': self.subscription.pk, 'feature_slug': 'test-feature', 'timestamp': future},
+            {'subscription': self.subscription.pk, 'feature_slug': 'test-feature', 'timestamp': before_period},
+            'not an event',
+        ])
+
+        data = response.json()
+        assert [result['status'] for result in data['results']] == [
+            'accepted', 'duplicate', 'rejected', 'rejected', 'rejected', 'rejected', 'rejected', 'rejected'
+        ]
+        assert data['results'][2]['error'] == 'feature not included in plan'
+        assert (data['accepted'], data['rejected']) == (1, 6)
+        assert UsageRecord.objects.get(feature=self.feature).usage_count == 1
+
+    def test_replayed_batch_is_not_counted(self):
+        events = [
+            {'subscription': self.subscription.pk, 'feature_slug': 'test-feature', 'count': 2, 'idempotency_key': 'job-1'},
+            {'subscription': self.subscription.pk, 'feature_slug': 'test-feature', 'count': 3, 'idempotency_key': 'job-2'},
+        ]
+        assert self.post(events).json()['accepted'] == 2
+        replay = self.post(events + [
+            {'subscription': self.subscription.pk, 'feature_slug': 'test-feature', 'idempotency_key': 'job-3'},
+        ]).json()
+
+        assert [result['status'] for result in replay['results']] == ['duplicate', 'duplicate', 'accepted']
+        assert UsageRecord.objects.get(feature=self.feature).usage_count == 6
+        assert UsageEventKey.objects.count() == 3
+
+    def test_authentication(self, admin_user):
+        assert self.post([], HTTP_AUTHORIZATION='Bearer wrong').status_code == 401
+
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(admin_user)
+        assert self.post([], client=client, HTTP_AUTHORIZATION='').status_code == 403
+
+        client = Client()
+        client.force_login(admin_user)
+        assert self.post([], client=client, HTTP_AUTHORIZATION='').status_code == 200
+
+    def test_bad_requests(self):
+        response = Client().post(self.url, 'nope', content_type='application/json', HTTP_AUTHORIZATION='Bearer secret-key')
+        assert response.status_code == 400
+        assert self.post([{}] * 101).status_code == 413
+
+    def test_malformed_fields_are_rejected(self):
+        response = self.post([
+            {'subscription': [self.subscription.pk], 'feature_slug': 'test-feature'},
+            {'user': {'id': self.subscription.user_id}, 'feature_slug': 'test-feature'},
+            {'subscription': self.subscription.pk, 'feature_slug': ['test-feature']},
+            {'subscription': self.subscription.pk, 'feature_slug': 'test-feature', 'count': 2 ** 31},
+            {'subscription': self.subscription.pk, 'feature_slug': 'test-feature'},
+        ])
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [result['status'] for result in data['results']] == ['rejected'] * 4 + ['accepted']
+        assert UsageRecord.objects.get(feature=self.feature).usage_count == 1
+
+    def test_rollups_dated_by_event_timestamp(self, settings):
+        settings.WAGTAIL_SUBSCRIPTIONS = {'USAGE_API_KEYS': ['secret-key'], 'USAGE_ROLLUPS': True}
+        earlier = timezone.now() - timedelta(hours=3)
+        self.subscription.current_period_start = earlier - timedelta(days=1)
+        self.subscription.save()
+        self.post([
+            {'subscription': self.subscription.pk, 'feature_slug': 'test-feature', 'count': 2, 'timestamp': earlier.isoformat()},
+            {'subscription': self.subscription.pk, 'feature_slug': 'test-feature'},
+        ])
+
+        hourly = {
+            rollup.bucket_start: rollup.usage_count
+            for rollup in UsageRollup.objects.filter(feature=self.feature, granularity='hour')
+        }
+        assert hourly == {
+            get_rollup_buckets(earlier)['hour']: 2,
+            get_rollup_buckets(timezone.now())['hour']: 1,
+        }
+        assert UsageRecord.objects.get(feature=self.feature).usage_count == 3
+
+
+@pytest.mark.slow
+@pytest.mark.django_db
+def test_dedupe_benchmark(active_subscription, feature, settings):
+    """
+    Idempotency keys cost one extra INSERT ... ON CONFLICT DO NOTHING per
+    batch, i.e. one probe of the unique key index per event.
+    """
+    settings.WAGTAIL_SUBSCRIPTIONS = {'USAGE_API_MAX_EVENTS': 5000}
+    PlanFeature.objects.create(plan=active_subscription.plan, feature=feature)
+    get_plan_snapshot(active_subscription.plan)
+
+    def make_events(prefix, keyed):
+        return [
+            dict(
+                {'subscription': active_subscription.pk, 'feature_slug': 'test-feature'},
+                **({'idempotency_key': f'{prefix}-{i}'} if keyed else {})
+            )
+            for i in range(5000)
+        ]
+
+    queries = {}
+    for label, keyed in (('plain', False), ('keyed', True)):
+        events = make_events(label, keyed)
+        with CaptureQueriesContext(connection) as context:
+            ingest_usage_events(events)
+        queries[label] = [query['sql'] for query in context.captured_queries]
+
+    key_inserts = [sql for sql in queries['keyed'] if 'ON CONFLICT' in sql and 'DO NOTHING' in sql]
+    batches = len(key_inserts)
+    assert len(queries['keyed']) - len(queries['plain']) == batches
+    assert UsageEventKey.objects.count() == 5000
+
+    # The key column has exactly one (unique) index to probe
+    unique_fields = [field.name for field in UsageEventKey._meta.fields if field.unique]
+    assert unique_fields == ['id', 'key']
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from ..models import Module, Feature, PlanFeature, UsageRecord
+from ..models import Module, Feature, PlanFeature, UsageRecord, UsageRollup
 
 
 @admin.register(Module)
@@ -30,4 +30,11 @@ class UsageRecordAdmin(admin.ModelAdmin):
     list_display = ['subscription', 'feature', 'usage_count', 'period_start', 'period_end']
     list_filter = ['feature', 'period_start']
     search_fields = ['subscription__user__email', 'feature__name']
-    readonly_fields = ['created_at', 'updated_at']
\ No newline at end of file
+    readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(UsageRollup)
+class UsageRollupAdmin(admin.ModelAdmin):
+    list_display = ['plan', 'feature', 'granularity', 'bucket_start', 'usage_count']
+    list_filter = ['granularity', 'plan', 'feature']
+    readonly_fields = ['updated_at']
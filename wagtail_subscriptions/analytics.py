@@ -1,40 +1,77 @@
 from decimal import Decimal
-from django.db.models import Count, Sum, Avg
+from django.conf import settings
+from django.db.models import Count, Q, Sum, Avg
 from django.utils import timezone
-from datetime import timedelta
-from .models import Subscription, Payment, UsageRecord
+from datetime import datetime, time, timedelta
+from .models import Subscription, SubscriptionMetricsSnapshot, Payment, UsageRecord, UsageRollup
+from .utils import get_rollup_buckets
 
 
 class SubscriptionAnalytics:
     """Analytics for subscription metrics"""
     
+    # Billing periods that recur, in months; lifetime plans add no recurring revenue
+    MONTHS_PER_PERIOD = {
+        'monthly': 1,
+        'quarterly': 3,
+        'yearly': 12,
+    }
+    
     @staticmethod
-    def get_mrr():
-        """Calculate Monthly Recurring Revenue"""
-        active_subs = Subscription.objects.filter(status__in=['active', 'trialing'])
-        monthly_revenue = Decimal('0.00')
+    def get_mrr(breakdown=False):
+        """
+        Calculate Monthly Recurring Revenue.
+        
+        Active and trialing subscriptions are counted per plan with a single
+        aggregate query, and each plan's price is normalized to a month.
+        With breakdown=True a dict with the total and the MRR per plan and
+        per billing period is returned instead of the total alone.
+        """
+        rows = Subscription.objects.filter(status__in=['active', 'trialing']).values(
+            'plan_id', 'plan__slug', 'plan__name', 'plan__price', 'plan__billing_period'
+        ).annotate(subscriptions=Count('id')).order_by('plan_id')
         
-        for sub in active_subs:
-            if sub.plan.billing_period == 'monthly':
-                monthly_revenue += sub.plan.price
-            elif sub.plan.billing_period == 'yearly':
-                monthly_revenue += sub.plan.price / 12
-            elif sub.plan.billing_period == 'quarterly':
-                monthly_revenue += sub.plan.price / 3
+        total = Decimal('0.00')
+        by_plan = []
+        by_billing_period = {}
+        for row in rows:
+            months = SubscriptionAnalytics.MONTHS_PER_PERIOD.get(row['plan__billing_period'])
+            if months is None:
+                continue
+            mrr = row['plan__price'] * row['subscriptions'] / months
+            total += mrr
+            period = row['plan__billing_period']
+            by_billing_period[period] = by_billing_period.get(period, Decimal('0.00')) + mrr
+            by_plan.append({
+                'plan_id': row['plan_id'],
+                'slug': row['plan__slug'],
+                'name': row['plan__name'],
+                'billing_period': period,
+                'subscriptions': row['subscriptions'],
+                'mrr': mrr,
+            })
         
-        return monthly_revenue
+        if not breakdown:
+            return total
+        return {'total': total, 'by_plan': by_plan, 'by_billing_period': by_billing_period}
     
     @staticmethod
     def get_churn_rate(days=30):
-        """Calculate churn rate for the last N days"""
+        """
+        Calculate churn rate for the last N days: subscriptions canceled in
+        the window over the subscribers at its start, i.e. subscriptions
+        created before it and not canceled by then.
+        """
         end_date = timezone.now()
         start_date = end_date - timedelta(days=days)
         
-        total_start = Subscription.objects.filter(created_at__lt=start_date).count()
-        churned = Subscription.objects.filter(
-            canceled_at__gte=start_date,
-            canceled_at__lt=end_date
-        ).count()
+        counts = Subscription.objects.aggregate(
+            total_start=Count('id', filter=Q(created_at__lt=start_date) & (
+                Q(canceled_at__isnull=True) | Q(canceled_at__gte=start_date)
+            )),
+            churned=Count('id', filter=Q(canceled_at__gte=start_date, canceled_at__lt=end_date)),
+        )
+        total_start, churned = counts['total_start'], counts['churned']
         
         return (churned / total_start * 100) if total_start > 0 else 0
     
@@ -65,13 +102,167 @@ class SubscriptionAnalytics:
         end_date = timezone.now()
         start_date = end_date - timedelta(days=days)
         
-        usage = UsageRecord.objects.filter(
+        records = UsageRecord.objects.filter(
             feature__slug=feature_slug,
             period_start__gte=start_date
-        ).aggregate(
+        )
+        usage = records.aggregate(
             total_usage=Sum('usage_count'),
-            avg_usage=Avg('usage_count'),
             unique_users=Count('subscription__user', distinct=True)
         )
+        # Average per subscription and period, summing counter shards first
+        usage['avg_usage'] = records.values('subscription', 'period_start').annotate(
+            total=Sum('usage_count')
+        ).aggregate(avg_usage=Avg('total'))['avg_usage']
+        
+        return usage
+    
+    @staticmethod
+    def get_usage_series(feature_slug, granularity='day', days=30, plan=None):
+        """Get usage of a feature per hour or day from the rollup tables (requires USAGE_ROLLUPS)"""
+        start_date = get_rollup_buckets(timezone.now() - timedelta(days=days))[granularity]
+        
+        rollups = UsageRollup.objects.filter(
+            feature__slug=feature_slug,
+            granularity=granularity,
+            bucket_start__gte=start_date
+        )
+        if plan is not None:
+            rollups = rollups.filter(plan=plan)
+        
+        return list(
+            rollups.values('bucket_start').annotate(usage=Sum('usage_count')).order_by('bucket_start')
+        )
+    
+    @staticmethod
+    def get_usage_by_plan(feature_slug, days=30):
+        """Get usage of a feature per plan over the last N days from the daily rollups"""
+        start_date = get_rollup_buckets(timezone.now() - timedelta(days=days))['day']
+        
+        return list(
+            UsageRollup.objects.filter(
+                feature__slug=feature_slug,
+                granularity='day',
+                bucket_start__gte=start_date
+            ).values('plan__slug', 'plan__name').annotate(usage=Sum('usage_count')).order_by('-usage')
+        )
+    
+    # Metrics describing the subscriptions when recorded rather than the day's events
+    POINT_IN_TIME_FIELDS = (
+        'active_subscriptions',
+        'trialing_subscriptions',
+        'past_due_subscriptions',
+        'mrr',
+    )
+    
+    # Metrics stored in SubscriptionMetricsSnapshot
+    SNAPSHOT_FIELDS = (
+        'active_subscriptions',
+        'trialing_subscriptions',
+        'past_due_subscriptions',
+        'mrr',
+        'new_subscriptions',
+        'new_trials',
+        'churned_subscriptions',
+        'trial_conversions',
+    )
+    
+    @staticmethod
+    def today():
+        """Current date in the active time zone"""
+        return timezone.localdate() if settings.USE_TZ else timezone.now().date()
+    
+    @staticmethod
+    def _day_bounds(day):
+        start = datetime.combine(day, time.min)
+        if settings.USE_TZ:
+            start = timezone.make_aware(start)
+        return start, start + timedelta(days=1)
+    
+    @staticmethod
+    def get_daily_metrics(day=None):
+        """
+        Compute the snapshot metrics of a day (today by default) live: status
+        counts and the day's events in one conditional aggregate, plus MRR.
+        Status counts and MRR describe the subscriptions as they are now, so
+        they are only given for today and yesterday (the day just closed);
+        for earlier days they are None.
+        """
+        today = SubscriptionAnalytics.today()
+        day = day or today
+        start, end = SubscriptionAnalytics._day_bounds(day)
+        created = Q(created_at__gte=start, created_at__lt=end)
+        aggregates = {
+            'new_subscriptions': Count('id', filter=created),
+            'new_trials': Count('id', filter=created & Q(trial_end__isnull=False)),
+            'churned_subscriptions': Count('id', filter=Q(canceled_at__gte=start, canceled_at__lt=end)),
+            'trial_conversions': Count('id', filter=Q(trial_end__gte=start, trial_end__lt=end, status='active')),
+        }
+        current = day >= today - timedelta(days=1)
+        if current:
+            aggregates.update(
+                active_subscriptions=Count('id', filter=Q(status='active')),
+                trialing_subscriptions=Count('id', filter=Q(status='trialing')),
+                past_due_subscriptions=Count('id', filter=Q(status='past_due')),
+            )
+        metrics = dict.fromkeys(SubscriptionAnalytics.POINT_IN_TIME_FIELDS)
+        metrics.update(Subscription.objects.aggregate(**aggregates))
+        if current:
+            metrics['mrr'] = SubscriptionAnalytics.get_mrr()
+        metrics['date'] = day
+        return metrics
+    
+    @staticmethod
+    def record_metrics_snapshot(day=None):
+        """
+        Store the metrics of a day, replacing an earlier snapshot of the same
+        day. Backfilling a past day keeps the status counts and MRR it was
+        recorded with, or leaves them empty.
+        """
+        metrics = SubscriptionAnalytics.get_daily_metrics(day)
+        snapshot, _ = SubscriptionMetricsSnapshot.objects.update_or_create(
+            date=metrics.pop('date'),
+            defaults={field: value for field, value in metrics.items() if value is not None}
+        )
+        return snapshot
+    
+    @staticmethod
+    def get_metrics_series(days=30):
+        """
+        Daily metrics for the last N days: recorded snapshots for past days
+        and a live row for today. Days without a snapshot are left out.
+        """
+        today = SubscriptionAnalytics.today()
+        series = [
+            dict(row, is_live=False)
+            for row in SubscriptionMetricsSnapshot.objects.filter(
+                date__gte=today - timedelta(days=days), date__lt=today
+            ).order_by('date').values('date', *SubscriptionAnalytics.SNAPSHOT_FIELDS)
+        ]
+        series.append(dict(SubscriptionAnalytics.get_daily_metrics(today), is_live=True))
+        return series
+    
+    @staticmethod
+    def get_snapshot_rates(days=30):
+        """
+        Churn and trial conversion rates (in percent) over the last N days,
+        read from the snapshots plus today's live metrics. Churn is defined
+        as in get_churn_rate(), with the subscribers at the start taken from
+        the status counts of the window's first day. Returns None when that
+        day has no snapshot or was backfilled without status counts.
+        """
+        series = SubscriptionAnalytics.get_metrics_series(days)
+        first = series[0]
+        if first['is_live'] or first['date'] != SubscriptionAnalytics.today() - timedelta(days=days):
+            return None
+        if any(first[field] is None for field in SubscriptionAnalytics.POINT_IN_TIME_FIELDS):
+            return None
         
-        return usage
\ No newline at end of file
+        subscribers = first['active_subscriptions'] + first['trialing_subscriptions'] + first['past_due_subscriptions']
+        churned = sum(row['churned_subscriptions'] for row in series[1:])
+        trials = sum(row['new_trials'] for row in series[1:])
+        conversions = sum(row['trial_conversions'] for row in series[1:])
+        return {
+            'churn': (churned / subscribers * 100) if subscribers > 0 else 0,
+            'conversion': (conversions / trials * 100) if trials > 0 else 0,
+        }
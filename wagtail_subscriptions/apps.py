@@ -9,4 +9,8 @@ class WagtailSubscriptionsConfig(AppConfig):
     
     def ready(self):
         # Import signal handlers
-        from . import signals  # noqa
\ No newline at end of file
+        from . import signals  # noqa
+        
+        # Detect multi-tenant mode once instead of on every request
+        from .permissions.tenant_manager import TenantSubscriptionManager
+        TenantSubscriptionManager.is_multi_tenant()
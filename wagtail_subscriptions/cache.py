@@ -0,0 +1,357 @@
+import logging
+import time
+from bisect import bisect_right
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+from django.core.cache import caches
+from .settings import get_setting
+
+CATALOG_VERSION_KEY = 'wagtail_subscriptions:catalog_version'
+
+logger = logging.getLogger(__name__)
+
+
+class Tier(NamedTuple):
+    """One level of a tiered feature: applies from threshold usage, capped at limit"""
+    level: int
+    name: str
+    threshold: int
+    limit: Optional[int]
+
+
+class FeatureTiers:
+    """Tier levels of a plan feature, precompiled into sorted arrays for binary search"""
+    __slots__ = ('thresholds', 'limits', 'names', 'cap')
+
+    def __init__(self, tiers):
+        tiers = sorted(tiers, key=lambda tier: tier['threshold'])
+        self.thresholds = tuple(int(tier['threshold']) for tier in tiers)
+        self.limits = tuple(tier.get('limit') for tier in tiers)
+        self.names = tuple(tier.get('name') or str(level) for level, tier in enumerate(tiers, 1))
+        # Usage stops at the first limit that is reached before the next tier begins
+        self.cap = None
+        for index, limit in enumerate(self.limits):
+            if limit is not None and (index + 1 == len(self.limits) or limit < self.thresholds[index + 1]):
+                self.cap = limit
+                break
+
+    def __len__(self):
+        return len(self.thresholds)
+
+    def __getitem__(self, index):
+        return Tier(index + 1, self.names[index], self.thresholds[index], self.limits[index])
+
+    def resolve(self, usage):
+        """Tier reached with usage, or None below the first threshold"""
+        index = bisect_right(self.thresholds, usage) - 1
+        return self[index] if index >= 0 else None
+
+    def as_table(self):
+        return [self[index]._asdict() for index in range(len(self))]
+
+
+def _is_count(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def compile_tiers(tiers):
+    """
+    Compile PlanFeature.tiers into FeatureTiers, or None when it has no
+    tiers. Tiers that PlanFeature.clean() would reject (e.g. saved without
+    validation) are skipped with a warning rather than failing the plan.
+    """
+    if not isinstance(tiers, list):
+        if tiers:
+            logger.warning('Ignoring tiers that are not a list: %r', tiers)
+        return None
+    valid, thresholds = [], set()
+    for tier in tiers:
+        if (
+            not isinstance(tier, dict)
+            or not _is_count(tier.get('threshold'))
+            or not (tier.get('limit') is None or _is_count(tier['limit']))
+            or tier['threshold'] in thresholds
+        ):
+            logger.warning('Skipping malformed tier %r', tier)
+            continue
+        thresholds.add(tier['threshold'])
+        valid.append(tier)
+    return FeatureTiers(valid) if valid else None
+
+
+class FeatureEntitlement(NamedTuple):
+    """A feature included in a plan, as seen by permission checks"""
+    feature_id: int
+    slug: str
+    quota: Optional[int]
+    feature_type: str
+    module: str
+    window: Optional[int] = None
+    tiers: Optional[FeatureTiers] = None
+
+
+class PlanSnapshot:
+    """Immutable view of the features included in a subscription plan"""
+    __slots__ = ('plan_id', 'features')
+
+    def __init__(self, plan_id, features):
+        object.__setattr__(self, 'plan_id', plan_id)
+        object.__setattr__(self, 'features', MappingProxyType(dict(features)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('PlanSnapshot is immutable')
+
+    def has_feature(self, feature_slug):
+        return feature_slug in self.features
+
+    def get_feature(self, feature_slug):
+        return self.features.get(feature_slug)
+
+    def get_quota(self, feature_slug):
+        entitlement = self.features.get(feature_slug)
+        return entitlement.quota if entitlement else 0
+
+    def get_tier(self, feature_slug, usage):
+        """Tier of a tiered feature reached with usage, or None"""
+        entitlement = self.features.get(feature_slug)
+        if entitlement is None or entitlement.tiers is None:
+            return None
+        return entitlement.tiers.resolve(usage)
+
+
+# Process-local snapshots keyed by plan id
+_plan_snapshots = {}
+
+# Process-local map of feature slug -> bitmask, or None until first use
+_feature_bits = None
+
+# Process-local permission sets ("app_label.codename") keyed by plan id
+_plan_permissions = {}
+
+# Catalog version the process-local caches were built against
+_catalog_state = {'version': None, 'checked_at': 0.0}
+
+
+def get_shared_cache():
+    return caches[get_setting('CACHE_ALIAS')]
+
+
+def get_catalog_version():
+    """Read the catalog generation shared by all workers"""
+    cache = get_shared_cache()
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    """Signal every worker that plans or features changed"""
+    cache = get_shared_cache()
+    try:
+        version = cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # The key was missing or evicted; any new value differs from what workers hold
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    clear_local_caches()
+    _catalog_state['version'] = version
+    _catalog_state['checked_at'] = time.monotonic()
+    return version
+
+
+def _catalog_check_due(now):
+    return now - _catalog_state['checked_at'] >= get_setting('CATALOG_VERSION_CHECK_INTERVAL')
+
+
+def _apply_catalog_version(version, now):
+    if version != _catalog_state['version']:
+        clear_local_caches()
+        _catalog_state['version'] = version
+    _catalog_state['checked_at'] = now
+
+
+def check_catalog_version():
+    """
+    Drop the process-local caches if the shared catalog version moved.
+    
+    The shared cache is consulted at most once per
+    CATALOG_VERSION_CHECK_INTERVAL seconds (0 checks on every lookup).
+    """
+    now = time.monotonic()
+    if _catalog_check_due(now):
+        _apply_catalog_version(get_catalog_version(), now)
+
+
+async def acheck_catalog_version():
+    """Async version of check_catalog_version()"""
+    now = time.monotonic()
+    if _catalog_check_due(now):
+        cache = get_shared_cache()
+        version = await cache.aget(CATALOG_VERSION_KEY)
+        if version is None:
+            await cache.aadd(CATALOG_VERSION_KEY, 1, timeout=None)
+            version = await cache.aget(CATALOG_VERSION_KEY, 1)
+        _apply_catalog_version(version, now)
+
+
+def get_local_catalog_version():
+    """Catalog version the process-local caches currently reflect"""
+    check_catalog_version()
+    return _catalog_state['version']
+
+
+def clear_local_caches():
+    """Drop every process-local catalog cache"""
+    invalidate_plan_snapshot()
+    invalidate_feature_bits()
+    _plan_permissions.clear()
+
+
+def _plan_snapshot_rows(plan_id):
+    from .models import PlanFeature
+
+    return PlanFeature.objects.filter(
+        plan_id=plan_id,
+        is_included=True,
+        feature__is_active=True
+    ).values_list(
+        'feature_id',
+        'feature__slug',
+        'quota_override',
+        'feature__default_quota',
+        'feature__feature_type',
+        'feature__module__slug',
+        'feature__quota_window',
+        'tiers',
+    )
+
+
+def _make_plan_snapshot(plan_id, rows):
+    features = {}
+    for feature_id, slug, quota_override, default_quota, feature_type, module, window, tiers in rows:
+        features[slug] = FeatureEntitlement(
+            feature_id=feature_id,
+            slug=slug,
+            quota=quota_override or default_quota,
+            feature_type=feature_type,
+            module=module,
+            window=window,
+            tiers=compile_tiers(tiers) if feature_type == 'tiered' else None,
+        )
+    return PlanSnapshot(plan_id, features)
+
+
+def build_plan_snapshot(plan_id):
+    """Load the included, active features of a plan with a single query"""
+    return _make_plan_snapshot(plan_id, _plan_snapshot_rows(plan_id))
+
+
+def get_plan_snapshot(plan):
+    """Get the cached snapshot for a plan (instance or primary key)"""
+    check_catalog_version()
+    plan_id = getattr(plan, 'pk', plan)
+    snapshot = _plan_snapshots.get(plan_id)
+    if snapshot is None:
+        snapshot = build_plan_snapshot(plan_id)
+        _plan_snapshots[plan_id] = snapshot
+    return snapshot
+
+
+async def aget_plan_snapshot(plan):
+    """Async version of get_plan_snapshot() using the async ORM"""
+    await acheck_catalog_version()
+    plan_id = getattr(plan, 'pk', plan)
+    snapshot = _plan_snapshots.get(plan_id)
+    if snapshot is None:
+        rows = [row async for row in _plan_snapshot_rows(plan_id)]
+        snapshot = _make_plan_snapshot(plan_id, rows)
+        _plan_snapshots[plan_id] = snapshot
+    return snapshot
+
+
+def invalidate_plan_snapshot(plan_id=None):
+    """Drop the snapshot of one plan, or of every plan when no id is given"""
+    if plan_id is None:
+        _plan_snapshots.clear()
+    else:
+        _plan_snapshots.pop(plan_id, None)
+
+
+def _feature_bits_rows():
+    from .models import Feature
+
+    return Feature.objects.filter(bit_index__isnull=False).values_list('slug', 'bit_index')
+
+
+def _make_feature_bits(rows):
+    feature_bits = {}
+    for slug, bit_index in rows:
+        # Slugs are only unique per module, so a slug may map to several bits
+        feature_bits[slug] = feature_bits.get(slug, 0) | (1 << bit_index)
+    return feature_bits
+
+
+def get_feature_bits():
+    """Get the cached map of feature slug to its bit in SubscriptionPlan.feature_mask"""
+    global _feature_bits
+    check_catalog_version()
+    if _feature_bits is None:
+        _feature_bits = _make_feature_bits(_feature_bits_rows())
+    return _feature_bits
+
+
+async def aget_feature_bits():
+    """Async version of get_feature_bits()"""
+    global _feature_bits
+    await acheck_catalog_version()
+    if _feature_bits is None:
+        _feature_bits = _make_feature_bits([row async for row in _feature_bits_rows()])
+    return _feature_bits
+
+
+def _combine_feature_bits(feature_bits, feature_slugs):
+    mask = 0
+    for slug in feature_slugs:
+        mask |= feature_bits.get(slug, 0)
+    return mask
+
+
+def get_features_mask(feature_slugs):
+    """Combine the bits of the given feature slugs into a single mask"""
+    return _combine_feature_bits(get_feature_bits(), feature_slugs)
+
+
+async def aget_features_mask(feature_slugs):
+    """Async version of get_features_mask()"""
+    return _combine_feature_bits(await aget_feature_bits(), feature_slugs)
+
+
+def invalidate_feature_bits():
+    """Drop the cached feature slug to bit map"""
+    global _feature_bits
+    _feature_bits = None
+
+
+def get_plan_permissions(plan_id):
+    """
+    Get the Django permissions granted by a plan, as a frozenset of
+    "app_label.codename" strings, from its features and subscription groups.
+    """
+    check_catalog_version()
+    permissions = _plan_permissions.get(plan_id)
+    if permissions is None:
+        from django.contrib.auth.models import Permission
+        from django.db.models import Q
+
+        rows = Permission.objects.filter(
+            Q(
+                subscriptionpermission__feature__plan_features__plan_id=plan_id,
+                subscriptionpermission__feature__plan_features__is_included=True,
+                subscriptionpermission__feature__is_active=True,
+            ) | Q(subscription_groups__plan_id=plan_id)
+        ).values_list('content_type__app_label', 'codename').distinct()
+        permissions = frozenset(f"{app_label}.{codename}" for app_label, codename in rows)
+        _plan_permissions[plan_id] = permissions
+    return permissions
@@ -1,10 +1,11 @@
+from django.utils.functional import SimpleLazyObject
 from .permissions.tenant_manager import TenantSubscriptionManager
 
 
 def subscription_context(request):
-    """Add subscription context to all templates"""
+    """Add subscription context to all templates (evaluated only when a template uses it)"""
     return {
-        'subscription_info': TenantSubscriptionManager.get_subscriber_info(request),
+        'subscription_info': SimpleLazyObject(lambda: TenantSubscriptionManager.get_subscriber_info(request)),
         'is_multi_tenant': TenantSubscriptionManager.is_multi_tenant(),
-        'current_plan': TenantSubscriptionManager.get_active_plan(request),
-    }
\ No newline at end of file
+        'current_plan': SimpleLazyObject(lambda: TenantSubscriptionManager.get_active_plan(request)),
+    }
@@ -0,0 +1,166 @@
+from datetime import timedelta, timezone as dt_timezone
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .cache import get_plan_snapshot
+from .models import Subscription, UsageEventKey
+from .permissions.tenant_manager import TenantSubscriptionManager
+from .utils import bulk_increment_usage, claim_usage_event_keys, get_rollup_buckets
+
+ACTIVE_STATUSES = TenantSubscriptionManager.ACTIVE_STATUSES
+
+MAX_KEY_LENGTH = UsageEventKey._meta.get_field('key').max_length
+
+# Largest value a PositiveIntegerField holds on every backend
+MAX_COUNT = 2147483647
+
+# Tolerated clock skew for event timestamps from the future
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+
+class UsageEventError(ValueError):
+    """An event of a usage batch that cannot be applied"""
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _positive_int(value, name):
+    if not _is_int(value) or not 1 <= value <= MAX_COUNT:
+        raise UsageEventError(f'{name} must be a positive integer up to {MAX_COUNT}')
+    return value
+
+
+def _parse_timestamp(value, now):
+    if value is None:
+        return now
+    timestamp = parse_datetime(value) if isinstance(value, str) else None
+    if timestamp is None:
+        raise UsageEventError('timestamp must be an ISO 8601 datetime')
+    if timezone.is_naive(timestamp) and timezone.is_aware(now):
+        timestamp = timezone.make_aware(timestamp, dt_timezone.utc)
+    elif timezone.is_aware(timestamp) and timezone.is_naive(now):
+        timestamp = timezone.make_naive(timestamp)
+    if timestamp > now + MAX_CLOCK_SKEW:
+        raise UsageEventError('timestamp is in the future')
+    return timestamp
+
+
+def _load_subscriptions(events):
+    """Fetch the subscriptions referenced by id, and the active ones of referenced users"""
+    subscription_ids = set()
+    user_ids = set()
+    for event in events:
+        if not isinstance(event, dict):
+            continue
+        if _is_int(event.get('subscription')):
+            subscription_ids.add(event['subscription'])
+        elif _is_int(event.get('user')):
+            user_ids.add(event['user'])
+    
+    by_id = {}
+    if subscription_ids:
+        by_id = Subscription.objects.in_bulk(subscription_ids)
+    by_user = {}
+    if user_ids:
+        for subscription in Subscription.objects.filter(
+            user_id__in=user_ids, status__in=ACTIVE_STATUSES
+        ).order_by('-created_at'):
+            by_user.setdefault(subscription.user_id, subscription)
+    return by_id, by_user
+
+
+def _resolve_event(event, by_id, by_user, now):
+    """Validate one event and return (subscription, feature_id, count, timestamp)"""
+    if not isinstance(event, dict):
+        raise UsageEventError('event must be an object')
+    
+    if 'subscription' in event:
+        if not _is_int(event['subscription']):
+            raise UsageEventError('subscription must be an integer id')
+        subscription = by_id.get(event['subscription'])
+    elif 'user' in event:
+        if not _is_int(event['user']):
+            raise UsageEventError('user must be an integer id')
+        subscription = by_user.get(event['user'])
+    else:
+        raise UsageEventError('subscription or user is required')
+    if subscription is None or subscription.status not in ACTIVE_STATUSES:
+        raise UsageEventError('no active subscription')
+    
+    feature_slug = event.get('feature_slug')
+    if not isinstance(feature_slug, str):
+        raise UsageEventError('feature_slug must be a string')
+    entitlement = get_plan_snapshot(subscription.plan_id).get_feature(feature_slug)
+    if entitlement is None:
+        raise UsageEventError('feature not included in plan')
+    
+    count = _positive_int(event.get('count', 1), 'count')
+    timestamp = _parse_timestamp(event.get('timestamp'), now)
+    if timestamp < subscription.current_period_start:
+        raise UsageEventError('timestamp is before the current billing period')
+    return subscription, entitlement.feature_id, count, timestamp
+
+
+def ingest_usage_events(events):
+    """
+    Validate a batch of usage events and apply the valid ones.
+    
+    Each event is a dict with "subscription" (id) or "user" (id),
+    "feature_slug", and optional "count", "timestamp" and
+    "idempotency_key". Counts are summed per usage record in memory and
+    written with bulk upserts in one transaction; events whose key was
+    already applied are reported as duplicates. Returns one result dict
+    per event, in order.
+    """
+    now = timezone.now()
+    by_id, by_user = _load_subscriptions(events)
+    
+    results = []
+    accepted = []
+    seen_keys = set()
+    for index, event in enumerate(events):
+        try:
+            subscription, feature_id, count, timestamp = _resolve_event(event, by_id, by_user, now)
+        except UsageEventError as error:
+            results.append({'status': 'rejected', 'error': str(error)})
+            continue
+        
+        key = event.get('idempotency_key')
+        if key is not None:
+            key = str(key)
+            if len(key) > MAX_KEY_LENGTH:
+                results.append({'status': 'rejected', 'error': 'idempotency_key is too long'})
+                continue
+            if key in seen_keys:
+                results.append({'status': 'duplicate'})
+                continue
+            seen_keys.add(key)
+        
+        results.append({'status': 'accepted'})
+        accepted.append((index, key, subscription, feature_id, count, get_rollup_buckets(timestamp)['hour']))
+    
+    with transaction.atomic():
+        claimed = claim_usage_event_keys(
+            (key, subscription.pk, feature_id, count)
+            for _, key, subscription, feature_id, count, _ in accepted
+            if key is not None
+        )
+        
+        # Totals per hour the usage happened in, so rollups and buckets are dated by the events
+        totals = {}
+        for index, key, subscription, feature_id, count, hour in accepted:
+            if key is not None and key not in claimed:
+                results[index] = {'status': 'duplicate'}
+                continue
+            usage_key = (
+                subscription.pk, subscription.plan_id, feature_id,
+                subscription.current_period_start, subscription.current_period_end
+            )
+            hourly = totals.setdefault(hour, {})
+            hourly[usage_key] = hourly.get(usage_key, 0) + count
+        
+        for hour, hourly in sorted(totals.items()):
+            bulk_increment_usage((usage_key + (count,) for usage_key, count in hourly.items()), timestamp=hour)
+    return results
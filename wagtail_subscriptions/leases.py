@@ -0,0 +1,174 @@
+import atexit
+import threading
+import time
+from django.utils import timezone
+from .cache import get_plan_snapshot
+from .settings import get_setting
+from .utils import QuotaResult, consume_feature_quota, get_usage_bucket, release_feature_quota
+
+
+class QuotaLease:
+    """A block of quota units reserved in the database and handed out from memory"""
+    __slots__ = ('subscription', 'feature_slug', 'quota', 'available', 'expires_at', 'bucket_start')
+    
+    def __init__(self, subscription, feature_slug, quota, available, expires_at, bucket_start=None):
+        self.subscription = subscription
+        self.feature_slug = feature_slug
+        self.quota = quota
+        self.available = available
+        self.expires_at = expires_at
+        # Usage bucket the block was reserved in, so unused units go back to it
+        self.bucket_start = bucket_start
+
+
+class QuotaLeasePool:
+    """
+    Per-process quota leases.
+    
+    A lease reserves QUOTA_LEASE_SIZE units with consume_feature_quota(), so
+    the units count as used in UsageRecord and the plan's quota can never be
+    overshot. Checks are then served from memory until the block runs out.
+    Unused units are released when the lease expires (QUOTA_LEASE_TTL
+    seconds), when it is replaced, and at process exit.
+    
+    The pool lock only guards the in-memory leases. Database reservations
+    and releases happen outside it, under one of LOCK_STRIPES locks picked
+    by lease key, so a slow refill only holds up checks of the same key.
+    """
+    LOCK_STRIPES = 64
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._leases = {}
+        self._next_expiry = None
+        self._key_locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+    
+    @staticmethod
+    def _key(subscription, feature_slug):
+        return subscription.pk, feature_slug, subscription.current_period_start
+    
+    def _key_lock(self, key):
+        return self._key_locks[hash(key) % self.LOCK_STRIPES]
+    
+    @staticmethod
+    def _return(lease):
+        if lease.available:
+            release_feature_quota(lease.subscription, lease.feature_slug, lease.available, lease.bucket_start)
+            lease.available = 0
+    
+    def _pop_expired(self, now):
+        """Remove and return the expired leases; only scans once the earliest expiry has passed"""
+        if self._next_expiry is None or self._next_expiry > now:
+            return []
+        expired = [key for key, lease in self._leases.items() if lease.expires_at <= now]
+        leases = [self._leases.pop(key) for key in expired]
+        self._next_expiry = min((lease.expires_at for lease in self._leases.values()), default=None)
+        return leases
+    
+    def _store(self, key, lease):
+        self._leases[key] = lease
+        if self._next_expiry is None or lease.expires_at < self._next_expiry:
+            self._next_expiry = lease.expires_at
+    
+    def _take(self, key, count, now):
+        """Take count units from a live local lease, returning (result, expired leases)"""
+        with self._lock:
+            expired = self._pop_expired(now)
+            lease = self._leases.get(key)
+            if lease is not None and lease.available >= count:
+                lease.available -= count
+                return QuotaResult(True, lease.quota, None), expired
+        return None, expired
+    
+    def consume(self, subscription, feature_slug, count=1):
+        """Take count units, from the local lease when possible. remaining is not reported."""
+        entitlement = get_plan_snapshot(subscription.plan_id).get_feature(feature_slug)
+        if entitlement is None or entitlement.feature_type != 'quota' or not entitlement.quota:
+            # Nothing to lease: missing features are denied, unlimited ones tracked
+            return consume_feature_quota(subscription, feature_slug, count)
+        
+        key = self._key(subscription, feature_slug)
+        result, expired = self._take(key, count, time.monotonic())
+        for lease in expired:
+            self._return(lease)
+        if result is not None:
+            return result
+        
+        with self._key_lock(key):
+            # Another thread may have refilled the lease while we waited
+            result, expired = self._take(key, count, time.monotonic())
+            for lease in expired:
+                self._return(lease)
+            if result is not None:
+                return result
+            
+            with self._lock:
+                stale = self._leases.pop(key, None)
+            if stale is not None:
+                self._return(stale)
+            
+            size = max(get_setting('QUOTA_LEASE_SIZE'), count)
+            result = consume_feature_quota(subscription, feature_slug, size)
+            if not result.allowed and result.remaining and result.remaining >= count and size > count:
+                # Not enough left for a full block, lease what remains
+                size = result.remaining
+                result = consume_feature_quota(subscription, feature_slug, size)
+            if not result.allowed:
+                return result
+            
+            lease = QuotaLease(
+                subscription, feature_slug, result.quota, size - count,
+                time.monotonic() + get_setting('QUOTA_LEASE_TTL'),
+                get_usage_bucket(timezone.now()) if entitlement.window else None
+            )
+            with self._lock:
+                self._store(key, lease)
+            return QuotaResult(True, result.quota, None)
+    
+    def release(self, subscription, feature_slug, count=1):
+        """Give units back to the local lease, or to the database if it is gone"""
+        with self._lock:
+            lease = self._leases.get(self._key(subscription, feature_slug))
+            if lease is not None and lease.expires_at > time.monotonic():
+                lease.available += count
+                return True
+        return release_feature_quota(subscription, feature_slug, count)
+    
+    def return_all(self):
+        """Release the unused units of every lease"""
+        with self._lock:
+            leases, self._leases = self._leases, {}
+            self._next_expiry = None
+        for lease in leases.values():
+            self._return(lease)
+        return len(leases)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_lease_pool():
+    """The process-wide lease pool, created on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = QuotaLeasePool()
+                atexit.register(return_quota_leases)
+    return _pool
+
+
+def consume_leased_quota(subscription, feature_slug, count=1):
+    return get_lease_pool().consume(subscription, feature_slug, count)
+
+
+def release_leased_quota(subscription, feature_slug, count=1):
+    return get_lease_pool().release(subscription, feature_slug, count)
+
+
+def return_quota_leases():
+    """Release unused leased units, e.g. from a worker shutdown hook"""
+    if _pool is not None:
+        return _pool.return_all()
+    return 0
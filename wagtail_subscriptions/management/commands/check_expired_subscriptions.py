@@ -2,6 +2,7 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.utils.translation import gettext as _
 from wagtail_subscriptions.models import Subscription
+from wagtail_subscriptions.permissions.entitlements import invalidate_entitlements
 
 
 class Command(BaseCommand):
@@ -34,6 +35,10 @@ class Command(BaseCommand):
             self.stdout.write(f"Would update {expired_trials.count()} expired trials")
             self.stdout.write(f"Would update {expired_subscriptions.count()} expired subscriptions")
         else:
+            # update() skips signals, so invalidate entitlement tokens explicitly
+            user_ids = set(expired_trials.values_list('user_id', flat=True))
+            user_ids.update(expired_subscriptions.values_list('user_id', flat=True))
+            
             # Update expired trials
             updated_trials = expired_trials.update(status='past_due')
             self.stdout.write(f"Updated {updated_trials} expired trials")
@@ -42,6 +47,9 @@ class Command(BaseCommand):
             updated_subs = expired_subscriptions.update(status='past_due')
             self.stdout.write(f"Updated {updated_subs} expired subscriptions")
             
+            if user_ids:
+                invalidate_entitlements(*user_ids)
+            
             self.stdout.write(
                 self.style.SUCCESS(f"Successfully processed expired subscriptions")
             )
\ No newline at end of file
@@ -0,0 +1,47 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from wagtail_subscriptions.models import UsageEventKey
+from wagtail_subscriptions.settings import get_setting
+
+
+class Command(BaseCommand):
+    help = 'Delete usage idempotency keys older than their retention period'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Keep keys from the last N days (default: USAGE_EVENT_KEY_TTL_DAYS)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of keys deleted per query'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be deleted without making changes'
+        )
+    
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else get_setting('USAGE_EVENT_KEY_TTL_DAYS')
+        cutoff = timezone.now() - timedelta(days=days)
+        expired = UsageEventKey.objects.filter(created_at__lt=cutoff)
+        
+        if options['dry_run']:
+            self.stdout.write(f"Would delete {expired.count()} usage event keys")
+            return
+        
+        # Delete in chunks to keep transactions and locks short
+        deleted = 0
+        while True:
+            pks = list(expired.values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            deleted += UsageEventKey.objects.filter(pk__in=pks).delete()[0]
+        
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} usage event keys"))
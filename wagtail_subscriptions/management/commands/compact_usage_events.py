@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from wagtail_subscriptions.metering import compact_usage_events
+from wagtail_subscriptions.models import UsageEvent
+
+
+class Command(BaseCommand):
+    help = 'Fold appended usage events into UsageRecord totals'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Number of events compacted per transaction'
+        )
+        parser.add_argument(
+            '--archive',
+            action='store_true',
+            help='Keep compacted events as an audit trail instead of deleting them'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be compacted without making changes'
+        )
+    
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            pending = UsageEvent.objects.filter(compacted_at__isnull=True).count()
+            self.stdout.write(f"Would compact {pending} usage events")
+            return
+        
+        total = 0
+        while True:
+            compacted = compact_usage_events(options['chunk_size'], archive=options['archive'])
+            if not compacted:
+                break
+            total += compacted
+        
+        self.stdout.write(self.style.SUCCESS(f"Compacted {total} usage events"))
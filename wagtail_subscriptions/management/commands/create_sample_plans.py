@@ -104,7 +104,7 @@ class Command(BaseCommand):
                 'module': collaboration_module,
                 'name': 'Team Members',
                 'slug': 'team-members',
-                'feature_type': 'quota',
+                'feature_type': 'gauge',
                 'description': 'Number of team members',
                 'default_quota': 1,
                 'quota_unit': 'users'
@@ -113,7 +113,7 @@ class Command(BaseCommand):
                 'module': collaboration_module,
                 'name': 'Organizations',
                 'slug': 'organizations',
-                'feature_type': 'quota',
+                'feature_type': 'gauge',
                 'description': 'Number of organizations/entities',
                 'default_quota': 1,
                 'quota_unit': 'organizations'
@@ -0,0 +1,39 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from wagtail_subscriptions.analytics import SubscriptionAnalytics
+
+
+class Command(BaseCommand):
+    help = 'Record the daily subscription metrics snapshot (safe to run more than once per day)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            default=None,
+            help='Day to record as YYYY-MM-DD (default: yesterday, the last complete day)'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=1,
+            help='Record this many days ending at --date; status counts and MRR are only recorded for today and yesterday'
+        )
+    
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                end = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['date']}")
+        else:
+            end = SubscriptionAnalytics.today() - timedelta(days=1)
+        
+        for offset in range(options['days'] - 1, -1, -1):
+            day = end - timedelta(days=offset)
+            snapshot = SubscriptionAnalytics.record_metrics_snapshot(day)
+            self.stdout.write(
+                f"Recorded metrics for {day}: {snapshot.new_subscriptions} new, "
+                f"{snapshot.churned_subscriptions} churned, MRR {snapshot.mrr if snapshot.mrr is not None else '-'}"
+            )
+        
+        self.stdout.write(self.style.SUCCESS('Subscription metrics recorded'))
@@ -0,0 +1,204 @@
+import atexit
+import logging
+import threading
+import time
+from django.db import close_old_connections, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import UsageEvent
+from .settings import get_setting
+from .utils import bulk_increment_usage, get_rollup_buckets
+
+logger = logging.getLogger(__name__)
+
+class UsageBuffer:
+    """
+    Write-behind buffer of usage increments kept in process memory.
+    
+    Increments are summed per (subscription, feature, period) and written with
+    one bulk upsert when USAGE_BUFFER_SIZE keys are pending, when
+    USAGE_BUFFER_INTERVAL seconds passed since the last flush, and when the
+    process exits. The interval is checked on add and, once
+    start_flusher() was called, by a background thread so idle processes
+    write their usage too. Subclass and point USAGE_BUFFER_CLASS at it to
+    keep the deltas elsewhere.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._deltas = {}
+        self._last_flush = time.monotonic()
+        self._flusher = None
+        self._stopped = threading.Event()
+    
+    def add(self, subscription, feature_id, count=1):
+        """Queue an increment and return the buffered delta for its key"""
+        key = (subscription.pk, feature_id, subscription.current_period_start)
+        with self._lock:
+            entry = self._deltas.get(key)
+            if entry is None:
+                entry = self._deltas[key] = [0, subscription.plan_id, subscription.current_period_end]
+            entry[0] += count
+            pending = entry[0]
+            flush_due = (
+                len(self._deltas) >= get_setting('USAGE_BUFFER_SIZE')
+                or time.monotonic() - self._last_flush >= get_setting('USAGE_BUFFER_INTERVAL')
+            )
+        
+        if flush_due:
+            self.flush()
+        return pending
+    
+    def pending(self, subscription_id, feature_id, period_start):
+        """Usage buffered in this process and not yet written"""
+        entry = self._deltas.get((subscription_id, feature_id, period_start))
+        return entry[0] if entry else 0
+    
+    def __len__(self):
+        return len(self._deltas)
+    
+    def start_flusher(self, interval=None):
+        """Flush every interval seconds (USAGE_BUFFER_INTERVAL) from a daemon thread"""
+        if self._flusher is None:
+            interval = interval or get_setting('USAGE_BUFFER_INTERVAL')
+            self._flusher = threading.Thread(
+                target=self._flush_periodically, args=(interval,), name='usage-buffer-flusher', daemon=True
+            )
+            self._flusher.start()
+    
+    def stop_flusher(self):
+        self._stopped.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+    
+    def _flush_periodically(self, interval):
+        while not self._stopped.wait(interval):
+            if time.monotonic() - self._last_flush < interval:
+                continue
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing buffered usage failed, retrying in %s seconds', interval)
+            finally:
+                close_old_connections()
+    
+    def flush(self):
+        """Write every buffered delta and return the number of records touched"""
+        with self._lock:
+            deltas, self._deltas = self._deltas, {}
+            self._last_flush = time.monotonic()
+        if not deltas:
+            return 0
+        
+        try:
+            bulk_increment_usage(
+                (subscription_id, plan_id, feature_id, period_start, period_end, count)
+                for (subscription_id, feature_id, period_start), (count, plan_id, period_end) in deltas.items()
+            )
+        except Exception:
+            # Put the deltas back so a failed flush loses nothing
+            with self._lock:
+                for key, (count, plan_id, period_end) in deltas.items():
+                    entry = self._deltas.setdefault(key, [0, plan_id, period_end])
+                    entry[0] += count
+            raise
+        return len(deltas)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def is_buffering_enabled():
+    return bool(get_setting('USAGE_BUFFERING'))
+
+
+def get_usage_buffer():
+    """The process-wide usage buffer, created on first use"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = import_string(get_setting('USAGE_BUFFER_CLASS'))()
+                if get_setting('USAGE_BUFFER_FLUSH_THREAD'):
+                    _buffer.start_flusher()
+                atexit.register(flush_usage_buffer)
+    return _buffer
+
+
+def flush_usage_buffer():
+    """Flush buffered usage, e.g. from a worker shutdown hook"""
+    if _buffer is not None:
+        return _buffer.flush()
+    return 0
+
+
+def is_event_log_enabled():
+    return bool(get_setting('USAGE_EVENT_LOG'))
+
+
+def append_usage_event(subscription, feature_id, count=1):
+    """Record usage as a new UsageEvent row, without touching the shared UsageRecord row"""
+    return UsageEvent.objects.create(
+        subscription_id=subscription.pk,
+        feature_id=feature_id,
+        usage_count=count,
+        period_start=subscription.current_period_start,
+        period_end=subscription.current_period_end
+    )
+
+
+def get_pending_usage(subscription, feature_id):
+    """Usage of the current period not yet in UsageRecord: uncompacted events and this process' buffer"""
+    pending = 0
+    if is_event_log_enabled():
+        pending += UsageEvent.objects.filter(
+            subscription=subscription,
+            feature_id=feature_id,
+            period_start=subscription.current_period_start,
+            compacted_at__isnull=True
+        ).aggregate(total=Sum('usage_count'))['total'] or 0
+    if is_buffering_enabled():
+        pending += get_usage_buffer().pending(subscription.pk, feature_id, subscription.current_period_start)
+    return pending
+
+
+def compact_usage_events(chunk_size=10000, archive=False):
+    """
+    Fold one chunk of uncompacted UsageEvents into UsageRecord totals, then
+    delete them (or mark them compacted when archiving).
+    
+    Returns the number of events compacted; call until it returns 0.
+    """
+    with transaction.atomic():
+        events = list(
+            UsageEvent.objects.filter(compacted_at__isnull=True)
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by('pk')
+            .values_list(
+                'pk', 'subscription_id', 'subscription__plan_id', 'feature_id',
+                'period_start', 'period_end', 'usage_count', 'created_at'
+            )[:chunk_size]
+        )
+        if not events:
+            return 0
+        
+        # Totals per hour the events happened in, so rollups and rolling-window
+        # buckets are dated by the events rather than the compaction time
+        totals = {}
+        for _, subscription_id, plan_id, feature_id, period_start, period_end, count, created_at in events:
+            key = (subscription_id, plan_id, feature_id, period_start, period_end)
+            hourly = totals.setdefault(get_rollup_buckets(created_at)['hour'], {})
+            hourly[key] = hourly.get(key, 0) + count
+        
+        for hour, hourly in sorted(totals.items()):
+            bulk_increment_usage((key + (count,) for key, count in hourly.items()), timestamp=hour)
+        
+        compacted = UsageEvent.objects.filter(pk__in=[event[0] for event in events])
+        if archive:
+            compacted.update(compacted_at=timezone.now())
+        else:
+            compacted.delete()
+    return len(events)
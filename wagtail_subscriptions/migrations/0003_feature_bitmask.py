@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:46
+
+from django.db import migrations, models
+
+
+def populate_feature_masks(apps, schema_editor):
+    Feature = apps.get_model('wagtail_subscriptions', 'Feature')
+    PlanFeature = apps.get_model('wagtail_subscriptions', 'PlanFeature')
+    SubscriptionPlan = apps.get_model('wagtail_subscriptions', 'SubscriptionPlan')
+
+    for bit_index, feature in enumerate(Feature.objects.order_by('pk')):
+        feature.bit_index = bit_index
+        feature.save(update_fields=['bit_index'])
+
+    masks = {pk: 0 for pk in SubscriptionPlan.objects.values_list('pk', flat=True)}
+    rows = PlanFeature.objects.filter(
+        is_included=True,
+        feature__is_active=True
+    ).values_list('plan_id', 'feature__bit_index')
+    for plan_id, bit_index in rows:
+        masks[plan_id] |= 1 << bit_index
+    for plan_id, mask in masks.items():
+        SubscriptionPlan.objects.filter(pk=plan_id).update(feature_mask=format(mask, 'x'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_subscriptions', '0002_invoice_payment_paymentmethod_subscriptiongroup_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feature',
+            name='bit_index',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, unique=True, verbose_name='Bit Index'),
+        ),
+        migrations.AddField(
+            model_name='subscriptionplan',
+            name='feature_mask',
+            field=models.TextField(default='0', editable=False, verbose_name='Feature Mask'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['plan', 'status'], name='wagtail_sub_plan_id_7a9345_idx'),
+        ),
+        migrations.RunPython(populate_feature_masks, migrations.RunPython.noop),
+    ]
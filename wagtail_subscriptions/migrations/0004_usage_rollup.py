@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_subscriptions', '0003_feature_bitmask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('usage_count', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('feature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_rollups', to='wagtail_subscriptions.feature')),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_rollups', to='wagtail_subscriptions.subscriptionplan')),
+            ],
+            options={
+                'verbose_name': 'Usage Rollup',
+                'verbose_name_plural': 'Usage Rollups',
+                'indexes': [models.Index(fields=['feature', 'granularity', 'bucket_start'], name='wagtail_sub_feature_3a2eb1_idx')],
+                'unique_together': {('plan', 'feature', 'granularity', 'bucket_start')},
+            },
+        ),
+    ]
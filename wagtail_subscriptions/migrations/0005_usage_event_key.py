@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_subscriptions', '0004_usage_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageEventKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('usage_count', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('feature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_event_keys', to='wagtail_subscriptions.feature')),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_event_keys', to='wagtail_subscriptions.subscription')),
+            ],
+            options={
+                'verbose_name': 'Usage Event Key',
+                'verbose_name_plural': 'Usage Event Keys',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_subscriptions', '0005_usage_event_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('usage_count', models.PositiveIntegerField(default=1)),
+                ('period_start', models.DateTimeField()),
+                ('period_end', models.DateTimeField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('compacted_at', models.DateTimeField(blank=True, null=True)),
+                ('feature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_events', to='wagtail_subscriptions.feature')),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_events', to='wagtail_subscriptions.subscription')),
+            ],
+            options={
+                'verbose_name': 'Usage Event',
+                'verbose_name_plural': 'Usage Events',
+                'indexes': [models.Index(fields=['subscription', 'feature', 'period_start'], name='wagtail_sub_subscri_63a391_idx'), models.Index(fields=['compacted_at', 'id'], name='wagtail_sub_compact_7a5b2c_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_subscriptions', '0006_usage_event'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='usagerecord',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='usagerecord',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterUniqueTogether(
+            name='usagerecord',
+            unique_together={('subscription', 'feature', 'period_start', 'shard')},
+        ),
+    ]
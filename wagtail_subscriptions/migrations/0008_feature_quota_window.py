@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_subscriptions', '0007_usage_record_shard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feature',
+            name='quota_window',
+            field=models.PositiveIntegerField(blank=True, help_text='Window length in seconds for rate limits, e.g. 60 for requests per minute', null=True, verbose_name='Quota Window'),
+        ),
+        migrations.AlterField(
+            model_name='feature',
+            name='feature_type',
+            field=models.CharField(choices=[('binary', 'Binary (On/Off)'), ('quota', 'Quota (Usage Limit)'), ('tiered', 'Tiered (Multiple Levels)'), ('rate', 'Rate Limit (Per Time Window)')], default='binary', max_length=20),
+        ),
+    ]
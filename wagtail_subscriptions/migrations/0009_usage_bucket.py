@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_subscriptions', '0008_feature_quota_window'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='feature',
+            name='quota_window',
+            field=models.PositiveIntegerField(blank=True, help_text='Window length in seconds: per-window limit for rate features (60 for requests per minute), rolling window for quota features (604800 for a rolling week)', null=True, verbose_name='Quota Window'),
+        ),
+        migrations.CreateModel(
+            name='UsageBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('usage_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('feature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_buckets', to='wagtail_subscriptions.feature')),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_buckets', to='wagtail_subscriptions.subscription')),
+            ],
+            options={
+                'verbose_name': 'Usage Bucket',
+                'verbose_name_plural': 'Usage Buckets',
+                'indexes': [models.Index(fields=['feature', 'bucket_start'], name='wagtail_sub_feature_ad1fc3_idx')],
+                'unique_together': {('subscription', 'feature', 'bucket_start')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_subscriptions', '0009_usage_bucket'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='feature',
+            name='feature_type',
+            field=models.CharField(choices=[('binary', 'Binary (On/Off)'), ('quota', 'Quota (Usage Limit)'), ('tiered', 'Tiered (Multiple Levels)'), ('rate', 'Rate Limit (Per Time Window)'), ('gauge', 'Gauge (Concurrent Count)')], default='binary', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='UsageGauge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('usage_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('feature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_gauges', to='wagtail_subscriptions.feature')),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_gauges', to='wagtail_subscriptions.subscription')),
+            ],
+            options={
+                'verbose_name': 'Usage Gauge',
+                'verbose_name_plural': 'Usage Gauges',
+                'unique_together': {('subscription', 'feature')},
+            },
+        ),
+    ]
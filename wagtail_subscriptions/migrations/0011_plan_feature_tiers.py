@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_subscriptions', '0010_usage_gauge'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planfeature',
+            name='tiers',
+            field=models.JSONField(blank=True, default=list, help_text='Levels with the usage threshold they start at and an optional usage limit (null for none)', verbose_name='Tiers'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_subscriptions', '0011_plan_feature_tiers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubscriptionMetricsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='Date')),
+                ('active_subscriptions', models.PositiveIntegerField(default=0)),
+                ('trialing_subscriptions', models.PositiveIntegerField(default=0)),
+                ('past_due_subscriptions', models.PositiveIntegerField(default=0)),
+                ('mrr', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='MRR')),
+                ('new_subscriptions', models.PositiveIntegerField(default=0)),
+                ('new_trials', models.PositiveIntegerField(default=0)),
+                ('churned_subscriptions', models.PositiveIntegerField(default=0)),
+                ('trial_conversions', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Subscription Metrics Snapshot',
+                'verbose_name_plural': 'Subscription Metrics Snapshots',
+                'ordering': ['date'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_subscriptions', '0012_subscription_metrics_snapshot'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='subscriptionmetricssnapshot',
+            name='active_subscriptions',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='subscriptionmetricssnapshot',
+            name='mrr',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True, verbose_name='MRR'),
+        ),
+        migrations.AlterField(
+            model_name='subscriptionmetricssnapshot',
+            name='past_due_subscriptions',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='subscriptionmetricssnapshot',
+            name='trialing_subscriptions',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_subscriptions', '0013_metrics_snapshot_point_in_time'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='usagerollup',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='usagerollup',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterUniqueTogether(
+            name='usagerollup',
+            unique_together={('plan', 'feature', 'granularity', 'bucket_start', 'shard')},
+        ),
+    ]
@@ -1,4 +1,6 @@
 from .core import *
 from .features import *
 from .permissions import *
-from .payments import *
\ No newline at end of file
+from .payments import *
+from .usage import *
+from .metrics import *
\ No newline at end of file
@@ -27,6 +27,9 @@ class SubscriptionPlan(models.Model):
     is_active = models.BooleanField(default=True, verbose_name=_('Active'))
     sort_order = models.PositiveIntegerField(default=0, verbose_name=_('Sort Order'))
     
+    # Hex-encoded bitmask of included features, indexed by Feature.bit_index
+    feature_mask = models.TextField(default='0', editable=False, verbose_name=_('Feature Mask'))
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -54,6 +57,53 @@ class SubscriptionPlan(models.Model):
     
     def __str__(self):
         return f"{self.name} - ${self.price}/{self.billing_period}"
+    
+    @property
+    def feature_bits(self):
+        return int(self.feature_mask or '0', 16)
+    
+    def has_feature(self, feature_slug):
+        """Check if the plan includes a feature using the precomputed bitmask"""
+        from ..cache import get_features_mask
+        return bool(self.feature_bits & get_features_mask([feature_slug]))
+    
+    async def ahas_feature(self, feature_slug):
+        """Async version of has_feature() for ASGI views"""
+        from ..cache import aget_features_mask
+        return bool(self.feature_bits & await aget_features_mask([feature_slug]))
+    
+    def has_all_features(self, feature_slugs):
+        """Check if the plan includes every one of the given features"""
+        from ..cache import get_features_mask
+        plan_bits = self.feature_bits
+        return all(plan_bits & get_features_mask([slug]) for slug in feature_slugs)
+    
+    def has_any_feature(self, feature_slugs):
+        """Check if the plan includes at least one of the given features"""
+        from ..cache import get_features_mask
+        return bool(self.feature_bits & get_features_mask(feature_slugs))
+    
+    @classmethod
+    def refresh_feature_masks(cls, plan_ids=None):
+        """Recompute the stored feature bitmask of the given plans (all plans by default)"""
+        from .features import Feature, PlanFeature
+        
+        Feature.assign_bit_indexes()
+        plans = cls.objects.all() if plan_ids is None else cls.objects.filter(pk__in=plan_ids)
+        masks = {pk: 0 for pk in plans.values_list('pk', flat=True)}
+        rows = PlanFeature.objects.filter(
+            plan_id__in=list(masks),
+            is_included=True,
+            feature__is_active=True,
+            feature__bit_index__isnull=False
+        ).values_list('plan_id', 'feature__bit_index')
+        
+        for plan_id, bit_index in rows:
+            masks[plan_id] |= 1 << bit_index
+        
+        for plan_id, mask in masks.items():
+            cls.objects.filter(pk=plan_id).update(feature_mask=format(mask, 'x'))
+        return masks
 
 
 class Subscription(models.Model):
@@ -87,6 +137,7 @@ class Subscription(models.Model):
         verbose_name_plural = _('Subscriptions')
         indexes = [
             models.Index(fields=['user', 'status']),
+            models.Index(fields=['plan', 'status']),
             models.Index(fields=['external_id']),
         ]
     
@@ -103,27 +154,17 @@ class Subscription(models.Model):
     
     def has_feature_access(self, feature_slug):
         """Check if subscription has access to a specific feature"""
-        try:
-            plan_feature = self.plan.plan_features.get(
-                feature__slug=feature_slug,
-                feature__is_active=True,
-                is_included=True
-            )
-            return True
-        except:
-            return False
+        return self.plan.has_feature(feature_slug)
     
     def get_feature_quota(self, feature_slug):
         """Get quota for a specific feature"""
-        try:
-            plan_feature = self.plan.plan_features.get(
-                feature__slug=feature_slug,
-                feature__is_active=True,
-                is_included=True
-            )
-            return plan_feature.effective_quota
-        except:
-            return 0
+        from ..cache import get_plan_snapshot
+        return get_plan_snapshot(self.plan_id).get_quota(feature_slug)
+    
+    def get_feature_tier(self, feature_slug, usage=None):
+        """Get the tier of a tiered feature reached this period (or with the given usage)"""
+        from ..utils import get_feature_tier
+        return get_feature_tier(self, feature_slug, usage)
 
 
 class Customer(models.Model):
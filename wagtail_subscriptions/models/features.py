@@ -1,4 +1,5 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
 from django.utils.translation import gettext_lazy as _
 from wagtail.admin.panels import FieldPanel, MultiFieldPanel
 from wagtail.snippets.models import register_snippet
@@ -46,6 +47,8 @@ class Feature(models.Model):
         ('binary', _('Binary (On/Off)')),
         ('quota', _('Quota (Usage Limit)')),
         ('tiered', _('Tiered (Multiple Levels)')),
+        ('rate', _('Rate Limit (Per Time Window)')),
+        ('gauge', _('Gauge (Concurrent Count)')),
     ]
     
     module = models.ForeignKey(Module, on_delete=models.CASCADE, related_name='features')
@@ -57,10 +60,20 @@ class Feature(models.Model):
     # For quota-based features
     default_quota = models.PositiveIntegerField(null=True, blank=True, verbose_name=_('Default Quota'))
     quota_unit = models.CharField(max_length=50, blank=True, verbose_name=_('Quota Unit'))
+    quota_window = models.PositiveIntegerField(
+        null=True, blank=True, verbose_name=_('Quota Window'),
+        help_text=_(
+            'Window length in seconds: per-window limit for rate features (60 for requests per minute), '
+            'rolling window for quota features (604800 for a rolling week)'
+        )
+    )
     
     is_active = models.BooleanField(default=True, verbose_name=_('Active'))
     sort_order = models.PositiveIntegerField(default=0, verbose_name=_('Sort Order'))
     
+    # Stable position of this feature in SubscriptionPlan.feature_mask
+    bit_index = models.PositiveIntegerField(null=True, blank=True, unique=True, editable=False, verbose_name=_('Bit Index'))
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -75,6 +88,7 @@ class Feature(models.Model):
         MultiFieldPanel([
             FieldPanel('default_quota'),
             FieldPanel('quota_unit'),
+            FieldPanel('quota_window'),
         ], heading=_('Quota Settings')),
         MultiFieldPanel([
             FieldPanel('is_active'),
@@ -90,6 +104,49 @@ class Feature(models.Model):
     
     def __str__(self):
         return f"{self.module.name} - {self.name}"
+    
+    # Attempts at taking the next free bit index when concurrent saves race for it
+    BIT_INDEX_ATTEMPTS = 5
+    
+    @staticmethod
+    def _next_bit_index():
+        last_index = Feature.objects.aggregate(models.Max('bit_index'))['bit_index__max']
+        return 0 if last_index is None else last_index + 1
+    
+    @classmethod
+    def assign_bit_indexes(cls):
+        """
+        Give a bit index to features created without save(), e.g. by
+        bulk_create(), loaddata or data migrations. Returns how many were
+        assigned.
+        """
+        missing = list(cls.objects.filter(bit_index__isnull=True).order_by('pk').values_list('pk', flat=True))
+        for pk in missing:
+            for attempt in range(cls.BIT_INDEX_ATTEMPTS):
+                try:
+                    with transaction.atomic():
+                        cls.objects.filter(pk=pk, bit_index__isnull=True).update(bit_index=cls._next_bit_index())
+                    break
+                except IntegrityError:
+                    if attempt + 1 == cls.BIT_INDEX_ATTEMPTS:
+                        raise
+        return len(missing)
+    
+    def save(self, *args, **kwargs):
+        if self.bit_index is not None:
+            return super().save(*args, **kwargs)
+        
+        for attempt in range(self.BIT_INDEX_ATTEMPTS):
+            self.bit_index = self._next_bit_index()
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Retry only if another feature took the index meanwhile
+                taken = Feature.objects.filter(bit_index=self.bit_index).exists()
+                self.bit_index = None
+                if not taken or attempt + 1 == self.BIT_INDEX_ATTEMPTS:
+                    raise
 
 
 @register_snippet
@@ -101,6 +158,11 @@ class PlanFeature(models.Model):
     # Feature-specific settings
     is_included = models.BooleanField(default=True, verbose_name=_('Included'))
     quota_override = models.PositiveIntegerField(null=True, blank=True, verbose_name=_('Quota Override'))
+    # For tiered features: [{"name": "Growth", "threshold": 1000, "limit": 5000}, ...]
+    tiers = models.JSONField(
+        default=list, blank=True, verbose_name=_('Tiers'),
+        help_text=_('Levels with the usage threshold they start at and an optional usage limit (null for none)')
+    )
     
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -112,6 +174,7 @@ class PlanFeature(models.Model):
         MultiFieldPanel([
             FieldPanel('is_included'),
             FieldPanel('quota_override'),
+            FieldPanel('tiers'),
         ], heading=_('Feature Settings')),
     ]
     
@@ -123,6 +186,23 @@ class PlanFeature(models.Model):
     def __str__(self):
         return f"{self.plan.name} - {self.feature.name}"
     
+    def clean(self):
+        super().clean()
+        if not self.tiers:
+            return
+        if not isinstance(self.tiers, list) or not all(isinstance(tier, dict) for tier in self.tiers):
+            raise ValidationError({'tiers': _('Tiers must be a list of objects.')})
+        thresholds = []
+        for tier in self.tiers:
+            threshold, limit = tier.get('threshold'), tier.get('limit')
+            if not isinstance(threshold, int) or threshold < 0:
+                raise ValidationError({'tiers': _('Every tier needs a non-negative integer threshold.')})
+            if limit is not None and (not isinstance(limit, int) or limit < 0):
+                raise ValidationError({'tiers': _('Tier limits must be non-negative integers or null.')})
+            thresholds.append(threshold)
+        if len(set(thresholds)) != len(thresholds):
+            raise ValidationError({'tiers': _('Tier thresholds must be unique.')})
+    
     @property
     def effective_quota(self):
         """Get the effective quota for this feature in this plan"""
@@ -137,6 +217,8 @@ class UsageRecord(models.Model):
     usage_count = models.PositiveIntegerField(default=0)
     period_start = models.DateTimeField()
     period_end = models.DateTimeField()
+    # Hot counters are split over USAGE_COUNTER_SHARDS rows; usage is the sum of the shards
+    shard = models.PositiveSmallIntegerField(default=0)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -144,7 +226,7 @@ class UsageRecord(models.Model):
     class Meta:
         verbose_name = _('Usage Record')
         verbose_name_plural = _('Usage Records')
-        unique_together = ['subscription', 'feature', 'period_start']
+        unique_together = ['subscription', 'feature', 'period_start', 'shard']
         indexes = [
             models.Index(fields=['subscription', 'feature']),
             models.Index(fields=['period_start', 'period_end']),
@@ -0,0 +1,30 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class SubscriptionMetricsSnapshot(models.Model):
+    """Subscription metrics of one day, recorded by the record_subscription_metrics command"""
+    date = models.DateField(unique=True, verbose_name=_('Date'))
+    
+    # Subscriptions per status when the snapshot was recorded, empty for backfilled days
+    active_subscriptions = models.PositiveIntegerField(null=True, blank=True)
+    trialing_subscriptions = models.PositiveIntegerField(null=True, blank=True)
+    past_due_subscriptions = models.PositiveIntegerField(null=True, blank=True)
+    mrr = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True, verbose_name=_('MRR'))
+    
+    # Events during the day
+    new_subscriptions = models.PositiveIntegerField(default=0)
+    new_trials = models.PositiveIntegerField(default=0)
+    churned_subscriptions = models.PositiveIntegerField(default=0)
+    trial_conversions = models.PositiveIntegerField(default=0)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['date']
+        verbose_name = _('Subscription Metrics Snapshot')
+        verbose_name_plural = _('Subscription Metrics Snapshots')
+    
+    def __str__(self):
+        return f"Metrics for {self.date}"
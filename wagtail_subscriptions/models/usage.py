@@ -0,0 +1,111 @@
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+class UsageRollup(models.Model):
+    """Usage of a feature by all subscribers of a plan, aggregated per hour or day"""
+    GRANULARITIES = [
+        ('hour', _('Hourly')),
+        ('day', _('Daily')),
+    ]
+    
+    plan = models.ForeignKey('SubscriptionPlan', on_delete=models.CASCADE, related_name='usage_rollups')
+    feature = models.ForeignKey('Feature', on_delete=models.CASCADE, related_name='usage_rollups')
+    granularity = models.CharField(max_length=10, choices=GRANULARITIES)
+    bucket_start = models.DateTimeField()
+    # Split over USAGE_COUNTER_SHARDS rows like UsageRecord; usage is the sum of the shards
+    shard = models.PositiveSmallIntegerField(default=0)
+    usage_count = models.PositiveBigIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Usage Rollup')
+        verbose_name_plural = _('Usage Rollups')
+        unique_together = ['plan', 'feature', 'granularity', 'bucket_start', 'shard']
+        indexes = [
+            models.Index(fields=['feature', 'granularity', 'bucket_start']),
+        ]
+    
+    def __str__(self):
+        return f"{self.plan} - {self.feature}: {self.usage_count} ({self.granularity} of {self.bucket_start})"
+
+
+class UsageBucket(models.Model):
+    """Usage of a rolling-window quota feature by one subscription within a time bucket"""
+    subscription = models.ForeignKey('Subscription', on_delete=models.CASCADE, related_name='usage_buckets')
+    feature = models.ForeignKey('Feature', on_delete=models.CASCADE, related_name='usage_buckets')
+    bucket_start = models.DateTimeField()
+    usage_count = models.PositiveIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Usage Bucket')
+        verbose_name_plural = _('Usage Buckets')
+        unique_together = ['subscription', 'feature', 'bucket_start']
+        indexes = [
+            models.Index(fields=['feature', 'bucket_start']),
+        ]
+    
+    def __str__(self):
+        return f"{self.subscription} - {self.feature}: {self.usage_count} (from {self.bucket_start})"
+
+
+class UsageGauge(models.Model):
+    """Current concurrent usage (e.g. seats) of a gauge feature by a subscription"""
+    subscription = models.ForeignKey('Subscription', on_delete=models.CASCADE, related_name='usage_gauges')
+    feature = models.ForeignKey('Feature', on_delete=models.CASCADE, related_name='usage_gauges')
+    usage_count = models.PositiveIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Usage Gauge')
+        verbose_name_plural = _('Usage Gauges')
+        unique_together = ['subscription', 'feature']
+    
+    def __str__(self):
+        return f"{self.subscription} - {self.feature}: {self.usage_count}"
+
+
+class UsageEventKey(models.Model):
+    """Idempotency key of an applied usage event, so replays are not counted twice"""
+    key = models.CharField(max_length=255, unique=True)
+    subscription = models.ForeignKey('Subscription', on_delete=models.CASCADE, related_name='usage_event_keys')
+    feature = models.ForeignKey('Feature', on_delete=models.CASCADE, related_name='usage_event_keys')
+    usage_count = models.PositiveIntegerField(default=1)
+    
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    class Meta:
+        verbose_name = _('Usage Event Key')
+        verbose_name_plural = _('Usage Event Keys')
+    
+    def __str__(self):
+        return self.key
+
+
+class UsageEvent(models.Model):
+    """Append-only usage row, compacted into UsageRecord by compact_usage_events"""
+    subscription = models.ForeignKey('Subscription', on_delete=models.CASCADE, related_name='usage_events')
+    feature = models.ForeignKey('Feature', on_delete=models.CASCADE, related_name='usage_events')
+    usage_count = models.PositiveIntegerField(default=1)
+    period_start = models.DateTimeField()
+    period_end = models.DateTimeField()
+    
+    created_at = models.DateTimeField(default=timezone.now)
+    # Set instead of deleting when compacted events are archived
+    compacted_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = _('Usage Event')
+        verbose_name_plural = _('Usage Events')
+        indexes = [
+            models.Index(fields=['subscription', 'feature', 'period_start']),
+            models.Index(fields=['compacted_at', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.subscription} - {self.feature}: {self.usage_count}"
@@ -0,0 +1,35 @@
+from django.contrib.auth.backends import BaseBackend
+from ..cache import get_plan_permissions
+from .tenant_manager import TenantSubscriptionManager
+
+
+class SubscriptionPermissionBackend(BaseBackend):
+    """
+    Grant Django permissions from the user's active subscription plan.
+    
+    Permissions come from SubscriptionPermission rows of the plan's included
+    features and from the plan's SubscriptionGroups. Sets are cached per plan
+    and invalidated with the catalog version.
+    
+    Add to settings after the default backend:
+    AUTHENTICATION_BACKENDS = [
+        'django.contrib.auth.backends.ModelBackend',
+        'wagtail_subscriptions.permissions.backends.SubscriptionPermissionBackend',
+    ]
+    """
+    
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_subscription_perm_cache'):
+            plan_id = user_obj.subscriptions.filter(
+                status__in=TenantSubscriptionManager.ACTIVE_STATUSES
+            ).values_list('plan_id', flat=True).first()
+            user_obj._subscription_perm_cache = get_plan_permissions(plan_id) if plan_id else frozenset()
+        return user_obj._subscription_perm_cache
+    
+    def has_module_perms(self, user_obj, app_label):
+        return any(
+            perm[:perm.index('.')] == app_label
+            for perm in self.get_all_permissions(user_obj)
+        )
@@ -1,21 +1,42 @@
+import asyncio
 from functools import wraps
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import redirect
+from django.utils import timezone
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
+from ..cache import get_plan_snapshot
 from ..models import Subscription
+from ..leases import consume_leased_quota, release_leased_quota
+from ..ratelimit import consume_rate_limit
+from ..utils import consume_feature_quota, get_window_reset, release_feature_quota
 from .tenant_manager import TenantSubscriptionManager
 
 
 def subscription_required(view_func=None, *, redirect_url='/pricing/'):
     """Decorator to require an active subscription (works in both single/multi-tenant modes)"""
     def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_async_view(request, *args, **kwargs):
+                plan = await TenantSubscriptionManager.aget_active_plan(request)
+                if not plan:
+                    messages.warning(request, _('An active subscription is required to access this feature.'))
+                    return redirect(redirect_url)
+                request.subscription = await TenantSubscriptionManager.aget_active_subscription(request)
+                request.subscription_plan = plan
+                return await view_func(request, *args, **kwargs)
+            return _wrapped_async_view
+        
         @wraps(view_func)
         def _wrapped_view(request, *args, **kwargs):
             plan = TenantSubscriptionManager.get_active_plan(request)
             if not plan:
                 messages.warning(request, _('An active subscription is required to access this feature.'))
                 return redirect(redirect_url)
+            request.subscription = TenantSubscriptionManager.get_active_subscription(request)
             request.subscription_plan = plan
             return view_func(request, *args, **kwargs)
         return _wrapped_view
@@ -29,6 +50,18 @@ def subscription_required(view_func=None, *, redirect_url='/pricing/'):
 def feature_required(feature_slug, redirect_url='/pricing/'):
     """Decorator to require access to a specific feature (works in both single/multi-tenant modes)"""
     def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_async_view(request, *args, **kwargs):
+                if not await TenantSubscriptionManager.ahas_feature_access(request, feature_slug):
+                    messages.warning(
+                        request, 
+                        _('Your current subscription plan does not include access to this feature.')
+                    )
+                    return redirect(redirect_url)
+                return await view_func(request, *args, **kwargs)
+            return _wrapped_async_view
+        
         @wraps(view_func)
         def _wrapped_view(request, *args, **kwargs):
             if not TenantSubscriptionManager.has_feature_access(request, feature_slug):
@@ -39,4 +72,145 @@ def feature_required(feature_slug, redirect_url='/pricing/'):
                 return redirect(redirect_url)
             return view_func(request, *args, **kwargs)
         return _wrapped_view
-    return decorator
\ No newline at end of file
+    return decorator
+
+
+def set_quota_headers(response, result, subscription, feature_slug=None):
+    """
+    Add X-Quota-* headers describing the subscriber's quota. The quota
+    resets at the end of the billing period, or for a rolling-window
+    feature when its oldest usage in the window expires.
+    """
+    if result.quota is None:
+        return response
+    entitlement = get_plan_snapshot(subscription.plan_id).get_feature(feature_slug) if feature_slug else None
+    if entitlement is not None and entitlement.window:
+        reset = get_window_reset(subscription, entitlement.feature_id, entitlement.window)
+    else:
+        reset = subscription.current_period_end
+    response['X-Quota-Limit'] = str(result.quota)
+    if result.remaining is not None:
+        response['X-Quota-Remaining'] = str(result.remaining)
+    response['X-Quota-Reset'] = str(int(reset.timestamp()))
+    if not result.allowed:
+        response['Retry-After'] = str(max(int((reset - timezone.now()).total_seconds()), 0))
+    return response
+
+
+def check_quota(subscription, feature_slug, count, leased=False):
+    """Consume quota for a request, returning (result, error_response)"""
+    if subscription is None:
+        return None, HttpResponseForbidden(_('An active subscription is required to access this feature.'))
+    if leased:
+        result = consume_leased_quota(subscription, feature_slug, count)
+    else:
+        result = consume_feature_quota(subscription, feature_slug, count)
+    if result.allowed:
+        return result, None
+    if result.quota == 0:
+        return result, HttpResponseForbidden(
+            _('Your current subscription plan does not include access to this feature.')
+        )
+    response = HttpResponse(_('Quota exceeded for this billing period.'), status=429)
+    return result, set_quota_headers(response, result, subscription, feature_slug)
+
+
+def quota_required(feature_slug, count=1, leased=False):
+    """
+    Decorator consuming count units of a quota feature per request.
+    
+    Responds with 429 once the quota is used up and reports the quota in
+    X-Quota-Limit/X-Quota-Remaining/X-Quota-Reset headers. Units are given
+    back if the view raises. With leased=True units come from a local quota
+    lease, so most requests need no query (X-Quota-Remaining is omitted).
+    """
+    release = release_leased_quota if leased else release_feature_quota
+    
+    def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_async_view(request, *args, **kwargs):
+                subscription = await TenantSubscriptionManager.aget_active_subscription(request)
+                result, error = await sync_to_async(check_quota)(subscription, feature_slug, count, leased)
+                if error:
+                    return error
+                try:
+                    response = await view_func(request, *args, **kwargs)
+                except Exception:
+                    await sync_to_async(release)(subscription, feature_slug, count)
+                    raise
+                return set_quota_headers(response, result, subscription, feature_slug)
+            return _wrapped_async_view
+        
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            subscription = TenantSubscriptionManager.get_active_subscription(request)
+            result, error = check_quota(subscription, feature_slug, count, leased)
+            if error:
+                return error
+            try:
+                response = view_func(request, *args, **kwargs)
+            except Exception:
+                release(subscription, feature_slug, count)
+                raise
+            return set_quota_headers(response, result, subscription, feature_slug)
+        return _wrapped_view
+    return decorator
+
+
+def set_rate_limit_headers(response, result):
+    """Add X-RateLimit-* headers describing the subscriber's current rate limit window"""
+    if result.limit is None:
+        return response
+    response['X-RateLimit-Limit'] = str(result.limit)
+    response['X-RateLimit-Remaining'] = str(result.remaining)
+    response['X-RateLimit-Reset'] = str(result.reset)
+    if result.retry_after is not None:
+        response['Retry-After'] = str(result.retry_after)
+    return response
+
+
+def check_rate_limit(subscription, feature_slug, count):
+    """Count a request against a rate limit, returning (result, error_response)"""
+    if subscription is None:
+        return None, HttpResponseForbidden(_('An active subscription is required to access this feature.'))
+    result = consume_rate_limit(subscription, feature_slug, count)
+    if result.allowed:
+        return result, None
+    if result.limit == 0:
+        return result, HttpResponseForbidden(
+            _('Your current subscription plan does not include access to this feature.')
+        )
+    response = HttpResponse(_('Rate limit exceeded.'), status=429)
+    return result, set_rate_limit_headers(response, result)
+
+
+def rate_limited(feature_slug, count=1):
+    """
+    Decorator throttling requests with the per-window limit of a rate feature.
+    
+    Responds with 429 and Retry-After once the plan's limit is reached and
+    reports it in X-RateLimit-Limit/X-RateLimit-Remaining/X-RateLimit-Reset
+    headers. Counters live in the RATE_LIMIT_CACHE_ALIAS cache, not in UsageRecord.
+    """
+    def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_async_view(request, *args, **kwargs):
+                subscription = await TenantSubscriptionManager.aget_active_subscription(request)
+                result, error = await sync_to_async(check_rate_limit)(subscription, feature_slug, count)
+                if error:
+                    return error
+                response = await view_func(request, *args, **kwargs)
+                return set_rate_limit_headers(response, result)
+            return _wrapped_async_view
+        
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            subscription = TenantSubscriptionManager.get_active_subscription(request)
+            result, error = check_rate_limit(subscription, feature_slug, count)
+            if error:
+                return error
+            return set_rate_limit_headers(view_func(request, *args, **kwargs), result)
+        return _wrapped_view
+    return decorator
@@ -0,0 +1,79 @@
+import time
+from typing import NamedTuple, Optional
+from django.core import signing
+from ..cache import get_local_catalog_version, get_shared_cache
+from ..settings import get_setting
+
+SESSION_KEY = '_wagtail_subscriptions_entitlements'
+TOKEN_SALT = 'wagtail_subscriptions.entitlements'
+USER_VERSION_KEY = 'wagtail_subscriptions:entitlements:{}'
+
+
+class Entitlements(NamedTuple):
+    """Resolved plan and feature quotas of a subscriber"""
+    plan_id: Optional[int]
+    subscription_id: Optional[int]
+    quotas: dict
+
+    def has_feature(self, feature_slug):
+        return feature_slug in self.quotas
+
+    def get_quota(self, feature_slug):
+        return self.quotas.get(feature_slug, 0)
+
+
+def is_token_enabled(request):
+    """Tokens are opt-in and only apply to signed-in users of single-tenant sites"""
+    return bool(
+        get_setting('ENTITLEMENT_TOKEN_ENABLED')
+        and hasattr(request, 'session')
+        and not getattr(request, 'tenant', None)
+        and hasattr(request, 'user')
+        and request.user.is_authenticated
+    )
+
+
+def get_user_version(user_id):
+    return get_shared_cache().get(USER_VERSION_KEY.format(user_id), 0)
+
+
+def invalidate_entitlements(*user_ids):
+    """Invalidate the entitlement tokens of the given users in every session"""
+    version = time.time_ns()
+    get_shared_cache().set_many(
+        {USER_VERSION_KEY.format(user_id): version for user_id in user_ids},
+        timeout=None
+    )
+
+
+def get_token_versions(request):
+    """Catalog and user versions a token must carry to be trusted"""
+    return get_local_catalog_version(), get_user_version(request.user.pk)
+
+
+def read_entitlement_token(request, versions):
+    """Return the entitlements stored in the session, or None if missing, expired or stale"""
+    token = request.session.get(SESSION_KEY)
+    if not token:
+        return None
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT, max_age=get_setting('ENTITLEMENT_TOKEN_TTL'))
+    except signing.BadSignature:
+        return None
+
+    if payload['user'] != request.user.pk or (payload['catalog'], payload['version']) != versions:
+        return None
+    return Entitlements(payload['plan'], payload['subscription'], payload['quotas'])
+
+
+def write_entitlement_token(request, entitlements, versions):
+    """Store signed entitlements in the session, tagged with the versions read before resolving them"""
+    catalog_version, user_version = versions
+    request.session[SESSION_KEY] = signing.dumps({
+        'user': request.user.pk,
+        'catalog': catalog_version,
+        'version': user_version,
+        'plan': entitlements.plan_id,
+        'subscription': entitlements.subscription_id,
+        'quotas': entitlements.quotas,
+    }, salt=TOKEN_SALT, compress=True)
@@ -1,21 +1,24 @@
 from django.utils.deprecation import MiddlewareMixin
-from ..models import Subscription
+from django.utils.functional import SimpleLazyObject
+from .tenant_manager import TenantSubscriptionManager
 
 
 class SubscriptionMiddleware(MiddlewareMixin):
-    """Middleware to add subscription information to request"""
+    """
+    Middleware to add subscription information to request.
+    
+    request.subscription is resolved lazily, on first access, so requests
+    that never read it (or are answered from the entitlement token) make no
+    subscription query. Async views should use
+    TenantSubscriptionManager.aget_active_subscription() instead.
+    """
     
     def process_request(self, request):
-        if request.user.is_authenticated:
-            try:
-                subscription = Subscription.objects.select_related('plan').get(
-                    user=request.user,
-                    status__in=['trialing', 'active']
-                )
-                request.subscription = subscription
-            except Subscription.DoesNotExist:
-                request.subscription = None
-        else:
-            request.subscription = None
-        
-        return None
\ No newline at end of file
+        # Shares the memoized lookup used by decorators, mixins and template tags
+        request.subscription = SimpleLazyObject(lambda: TenantSubscriptionManager.get_active_subscription(request))
+        return None
+    
+    async def __acall__(self, request):
+        # Nothing here touches the database, so skip MiddlewareMixin's thread hop
+        self.process_request(request)
+        return await self.get_response(request)
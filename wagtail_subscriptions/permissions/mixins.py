@@ -1,8 +1,12 @@
+from asgiref.sync import sync_to_async
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
 from ..models import Subscription
+from ..leases import release_leased_quota
+from ..utils import release_feature_quota
+from .decorators import check_quota, check_rate_limit, set_quota_headers, set_rate_limit_headers
 from .tenant_manager import TenantSubscriptionManager
 
 
@@ -11,13 +15,27 @@ class SubscriptionRequiredMixin:
     subscription_redirect_url = '/subscriptions/pricing/'
     
     def dispatch(self, request, *args, **kwargs):
+        if getattr(self, 'view_is_async', False):
+            return self._async_subscription_dispatch(request, *args, **kwargs)
+        
         plan = TenantSubscriptionManager.get_active_plan(request)
         if not plan:
             messages.warning(request, _('An active subscription is required to access this feature.'))
             return redirect(self.subscription_redirect_url)
         
+        self.subscription = request.subscription = TenantSubscriptionManager.get_active_subscription(request)
         request.subscription_plan = plan
         return super().dispatch(request, *args, **kwargs)
+    
+    async def _async_subscription_dispatch(self, request, *args, **kwargs):
+        plan = await TenantSubscriptionManager.aget_active_plan(request)
+        if not plan:
+            messages.warning(request, _('An active subscription is required to access this feature.'))
+            return redirect(self.subscription_redirect_url)
+        
+        self.subscription = request.subscription = await TenantSubscriptionManager.aget_active_subscription(request)
+        request.subscription_plan = plan
+        return await super().dispatch(request, *args, **kwargs)
 
 
 class FeatureRequiredMixin:
@@ -26,6 +44,9 @@ class FeatureRequiredMixin:
     subscription_redirect_url = '/subscriptions/pricing/'
     
     def dispatch(self, request, *args, **kwargs):
+        if getattr(self, 'view_is_async', False):
+            return self._async_feature_dispatch(request, *args, **kwargs)
+        
         if self.required_feature and not TenantSubscriptionManager.has_feature_access(request, self.required_feature):
             messages.warning(
                 request,
@@ -34,6 +55,81 @@ class FeatureRequiredMixin:
             return redirect(self.subscription_redirect_url)
         
         return super().dispatch(request, *args, **kwargs)
+    
+    async def _async_feature_dispatch(self, request, *args, **kwargs):
+        if self.required_feature and not await TenantSubscriptionManager.ahas_feature_access(request, self.required_feature):
+            messages.warning(
+                request,
+                _('Your current subscription plan does not include access to this feature.')
+            )
+            return redirect(self.subscription_redirect_url)
+        
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class QuotaRequiredMixin:
+    """Mixin consuming quota_cost units of a quota feature per request (see quota_required)"""
+    quota_feature = None
+    quota_cost = 1
+    quota_leased = False
+    
+    def _release_quota(self, subscription):
+        release = release_leased_quota if self.quota_leased else release_feature_quota
+        release(subscription, self.quota_feature, self.quota_cost)
+    
+    def dispatch(self, request, *args, **kwargs):
+        if getattr(self, 'view_is_async', False):
+            return self._async_quota_dispatch(request, *args, **kwargs)
+        
+        subscription = TenantSubscriptionManager.get_active_subscription(request)
+        result, error = check_quota(subscription, self.quota_feature, self.quota_cost, self.quota_leased)
+        if error:
+            return error
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        except Exception:
+            self._release_quota(subscription)
+            raise
+        return set_quota_headers(response, result, subscription, self.quota_feature)
+    
+    async def _async_quota_dispatch(self, request, *args, **kwargs):
+        subscription = await TenantSubscriptionManager.aget_active_subscription(request)
+        result, error = await sync_to_async(check_quota)(
+            subscription, self.quota_feature, self.quota_cost, self.quota_leased
+        )
+        if error:
+            return error
+        try:
+            response = await super().dispatch(request, *args, **kwargs)
+        except Exception:
+            await sync_to_async(self._release_quota)(subscription)
+            raise
+        return set_quota_headers(response, result, subscription, self.quota_feature)
+
+
+class RateLimitedMixin:
+    """Mixin counting each request against the per-window limit of a rate feature (see rate_limited)"""
+    rate_limit_feature = None
+    rate_limit_cost = 1
+    
+    def dispatch(self, request, *args, **kwargs):
+        if getattr(self, 'view_is_async', False):
+            return self._async_rate_limit_dispatch(request, *args, **kwargs)
+        
+        subscription = TenantSubscriptionManager.get_active_subscription(request)
+        result, error = check_rate_limit(subscription, self.rate_limit_feature, self.rate_limit_cost)
+        if error:
+            return error
+        return set_rate_limit_headers(super().dispatch(request, *args, **kwargs), result)
+    
+    async def _async_rate_limit_dispatch(self, request, *args, **kwargs):
+        subscription = await TenantSubscriptionManager.aget_active_subscription(request)
+        result, error = await sync_to_async(check_rate_limit)(
+            subscription, self.rate_limit_feature, self.rate_limit_cost
+        )
+        if error:
+            return error
+        return set_rate_limit_headers(await super().dispatch(request, *args, **kwargs), result)
 
 
 class AdminSubscriptionMixin:
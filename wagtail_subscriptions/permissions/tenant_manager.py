@@ -1,14 +1,76 @@
+from typing import NamedTuple, Optional
+from asgiref.sync import sync_to_async
+from django.db.models import Q, Sum
+from ..cache import get_plan_snapshot, aget_plan_snapshot
+from ..models import UsageBucket, UsageGauge, UsageRecord, SubscriptionPlan
+from ..settings import get_setting
+from ..utils import get_feature_tier, get_window_start
+from .entitlements import (
+    Entitlements, is_token_enabled, get_token_versions, read_entitlement_token, write_entitlement_token
+)
+
+
+class FeatureAccess(NamedTuple):
+    """Result of a batch feature check"""
+    allowed: bool
+    quota: Optional[int]
+    remaining: Optional[int]
+
+
 class TenantSubscriptionManager:
     """Handles subscription permissions for both single-tenant and multi-tenant modes"""
     
-    @staticmethod
-    def is_multi_tenant():
+    ACTIVE_STATUSES = ['active', 'trialing']
+    
+    # Resolved once, normally from AppConfig.ready()
+    _multi_tenant = None
+    
+    @classmethod
+    def is_multi_tenant(cls):
         """Auto-detect if running in multi-tenant mode"""
-        try:
-            import django_tenants
-            return True
-        except ImportError:
-            return False
+        if cls._multi_tenant is None:
+            try:
+                import django_tenants
+                cls._multi_tenant = True
+            except ImportError:
+                cls._multi_tenant = False
+        return cls._multi_tenant
+    
+    @staticmethod
+    def get_active_subscription(request):
+        """Get the user's active subscription, resolved once and memoized on the request"""
+        if not hasattr(request, '_active_subscription'):
+            subscription = None
+            if not getattr(request, 'tenant', None) and hasattr(request, 'user') and request.user.is_authenticated:
+                subscription = request.user.subscriptions.filter(
+                    status__in=TenantSubscriptionManager.ACTIVE_STATUSES
+                ).select_related('plan').first()
+            request._active_subscription = subscription
+        return request._active_subscription
+    
+    @staticmethod
+    async def aget_active_subscription(request):
+        """Async version of get_active_subscription(), sharing the same request memo"""
+        if not hasattr(request, '_active_subscription'):
+            subscription = None
+            user = await TenantSubscriptionManager._aget_user(request)
+            if not getattr(request, 'tenant', None) and user is not None and user.is_authenticated:
+                subscription = await user.subscriptions.filter(
+                    status__in=TenantSubscriptionManager.ACTIVE_STATUSES
+                ).select_related('plan').afirst()
+            request._active_subscription = subscription
+        return request._active_subscription
+    
+    @staticmethod
+    async def _aget_user(request):
+        """Resolve request.user without touching the database from the event loop"""
+        if hasattr(request, 'auser'):
+            return await request.auser()
+        if not hasattr(request, 'user'):
+            return None
+        # The lazy user set by AuthenticationMiddleware may hit the session store
+        await sync_to_async(lambda: request.user.is_authenticated)()
+        return request.user
     
     @staticmethod
     def get_active_plan(request):
@@ -18,46 +80,232 @@ class TenantSubscriptionManager:
             return getattr(request.tenant, 'subscription_plan', None)
         else:
             # Single-tenant mode: get plan from user's subscription
-            if hasattr(request, 'user') and request.user.is_authenticated:
-                subscription = request.user.subscriptions.filter(
-                    status__in=['active', 'trialing']
-                ).first()
-                return subscription.plan if subscription else None
-        return None
+            subscription = TenantSubscriptionManager.get_active_subscription(request)
+            return subscription.plan if subscription else None
+    
+    @staticmethod
+    async def aget_active_plan(request):
+        """Async version of get_active_plan()"""
+        tenant = getattr(request, 'tenant', None)
+        if tenant:
+            # Multi-tenant mode: load the tenant's plan with the async ORM unless already cached
+            descriptor = getattr(type(tenant), 'subscription_plan', None)
+            if not hasattr(descriptor, 'is_cached') or descriptor.is_cached(tenant):
+                return getattr(tenant, 'subscription_plan', None)
+            plan_id = getattr(tenant, 'subscription_plan_id', None)
+            tenant.subscription_plan = await SubscriptionPlan.objects.filter(pk=plan_id).afirst() if plan_id else None
+            return tenant.subscription_plan
+        subscription = await TenantSubscriptionManager.aget_active_subscription(request)
+        return subscription.plan if subscription else None
+    
+    @staticmethod
+    def clear_request_cache(request):
+        """Forget the memoized subscription, e.g. after subscribing during a request"""
+        for attr in ('_active_subscription', '_entitlements'):
+            if hasattr(request, attr):
+                delattr(request, attr)
+    
+    @staticmethod
+    def get_entitlements(request):
+        """
+        Get the plan id and feature quotas of the current subscriber.
+        
+        With ENTITLEMENT_TOKEN_ENABLED these are read from a signed session
+        token, so feature checks need no subscription queries until it expires.
+        """
+        if hasattr(request, '_entitlements'):
+            return request._entitlements
+        
+        use_token, versions, entitlements = TenantSubscriptionManager._read_token(request)
+        if entitlements is None:
+            plan = TenantSubscriptionManager.get_active_plan(request)
+            subscription = TenantSubscriptionManager.get_active_subscription(request)
+            entitlements = TenantSubscriptionManager._make_entitlements(
+                plan, subscription, get_plan_snapshot(plan) if plan else None
+            )
+            if use_token:
+                write_entitlement_token(request, entitlements, versions)
+        
+        request._entitlements = entitlements
+        return entitlements
+    
+    @staticmethod
+    async def aget_entitlements(request):
+        """Async version of get_entitlements(); the session and cache are read in a thread"""
+        if hasattr(request, '_entitlements'):
+            return request._entitlements
+        
+        use_token, versions, entitlements = await sync_to_async(TenantSubscriptionManager._read_token)(request)
+        if entitlements is None:
+            plan = await TenantSubscriptionManager.aget_active_plan(request)
+            subscription = await TenantSubscriptionManager.aget_active_subscription(request)
+            entitlements = TenantSubscriptionManager._make_entitlements(
+                plan, subscription, await aget_plan_snapshot(plan) if plan else None
+            )
+            if use_token:
+                await sync_to_async(write_entitlement_token)(request, entitlements, versions)
+        
+        request._entitlements = entitlements
+        return entitlements
+    
+    @staticmethod
+    def _read_token(request):
+        """Return (use_token, versions, entitlements), entitlements being None without a valid token"""
+        if not is_token_enabled(request):
+            return False, None, None
+        versions = get_token_versions(request)
+        return True, versions, read_entitlement_token(request, versions)
+    
+    @staticmethod
+    def _make_entitlements(plan, subscription, snapshot):
+        quotas = {}
+        if plan:
+            quotas = {slug: e.quota for slug, e in snapshot.features.items()}
+        return Entitlements(
+            plan.pk if plan else None,
+            subscription.pk if subscription else None,
+            quotas
+        )
+    
+    @staticmethod
+    async def _atoken_enabled(request):
+        # Checking the user may load it from the session, so only leave the event loop when tokens are on
+        if not get_setting('ENTITLEMENT_TOKEN_ENABLED'):
+            return False
+        return await sync_to_async(is_token_enabled)(request)
     
     @staticmethod
     def has_feature_access(request, feature_slug):
         """Check if current context has access to feature"""
+        if is_token_enabled(request):
+            return TenantSubscriptionManager.get_entitlements(request).has_feature(feature_slug)
+        
         plan = TenantSubscriptionManager.get_active_plan(request)
         if not plan:
             return False
         
-        try:
-            plan_feature = plan.plan_features.get(
-                feature__slug=feature_slug,
-                feature__is_active=True,
-                is_included=True
-            )
-            return True
-        except:
+        return plan.has_feature(feature_slug)
+    
+    @staticmethod
+    async def ahas_feature_access(request, feature_slug):
+        """Async version of has_feature_access()"""
+        if await TenantSubscriptionManager._atoken_enabled(request):
+            return (await TenantSubscriptionManager.aget_entitlements(request)).has_feature(feature_slug)
+        
+        plan = await TenantSubscriptionManager.aget_active_plan(request)
+        if not plan:
             return False
+        
+        return await plan.ahas_feature(feature_slug)
+    
+    @staticmethod
+    def has_all_features(request, feature_slugs):
+        """Check if current context has access to every one of the given features"""
+        plan = TenantSubscriptionManager.get_active_plan(request)
+        if not plan:
+            return False
+        
+        return plan.has_all_features(feature_slugs)
     
     @staticmethod
     def get_feature_quota(request, feature_slug):
         """Get quota for a specific feature"""
+        if is_token_enabled(request):
+            return TenantSubscriptionManager.get_entitlements(request).get_quota(feature_slug)
+        
         plan = TenantSubscriptionManager.get_active_plan(request)
         if not plan:
             return 0
         
-        try:
-            plan_feature = plan.plan_features.get(
-                feature__slug=feature_slug,
-                feature__is_active=True,
-                is_included=True
-            )
-            return plan_feature.effective_quota
-        except:
+        return get_plan_snapshot(plan).get_quota(feature_slug)
+    
+    @staticmethod
+    async def aget_feature_quota(request, feature_slug):
+        """Async version of get_feature_quota()"""
+        if await TenantSubscriptionManager._atoken_enabled(request):
+            return (await TenantSubscriptionManager.aget_entitlements(request)).get_quota(feature_slug)
+        
+        plan = await TenantSubscriptionManager.aget_active_plan(request)
+        if not plan:
             return 0
+        
+        return (await aget_plan_snapshot(plan)).get_quota(feature_slug)
+    
+    @staticmethod
+    def get_feature_tier(request, feature_slug, usage=None):
+        """Get the tier of a tiered feature reached this period (or with the given usage)"""
+        subscription = TenantSubscriptionManager.get_active_subscription(request)
+        if not subscription:
+            return None
+        return get_feature_tier(subscription, feature_slug, usage)
+    
+    @staticmethod
+    def has_features(request, feature_slugs):
+        """
+        Check several features at once.
+        
+        Returns a dict of slug -> FeatureAccess(allowed, quota, remaining).
+        ``remaining`` is only set for quota and gauge features with a limit
+        and for tiered features, whose quota is the limit of the tier reached;
+        the usage of all of them is read with a single query (plus one each
+        for rolling-window quotas and for gauges, and one per feature for
+        uncompacted usage events when the event log is enabled).
+        """
+        from ..metering import get_pending_usage
+        
+        plan = TenantSubscriptionManager.get_active_plan(request)
+        access = {slug: FeatureAccess(False, 0, None) for slug in feature_slugs}
+        if not plan:
+            return access
+        
+        snapshot = get_plan_snapshot(plan)
+        entitlements = {}
+        for slug in feature_slugs:
+            entitlement = snapshot.get_feature(slug)
+            if entitlement:
+                entitlements[slug] = entitlement
+        
+        limited = [e.feature_id for e in entitlements.values() if e.feature_type == 'quota' and e.quota]
+        rolling = {e.feature_id: e.window for e in entitlements.values() if e.feature_id in limited and e.window}
+        gauges = [e.feature_id for e in entitlements.values() if e.feature_type == 'gauge' and e.quota]
+        tiered = [e.feature_id for e in entitlements.values() if e.feature_type == 'tiered' and e.tiers is not None]
+        usage = {}
+        subscription = TenantSubscriptionManager.get_active_subscription(request)
+        if (limited or tiered) and subscription:
+            periodic = [feature_id for feature_id in limited if feature_id not in rolling] + tiered
+            if periodic:
+                usage.update(UsageRecord.objects.filter(
+                    subscription=subscription,
+                    feature_id__in=periodic,
+                    period_start=subscription.current_period_start
+                ).values('feature_id').annotate(total=Sum('usage_count')).values_list('feature_id', 'total'))
+            if rolling:
+                windows = Q()
+                for feature_id, window in rolling.items():
+                    windows |= Q(feature_id=feature_id, bucket_start__gte=get_window_start(window))
+                usage.update(UsageBucket.objects.filter(windows, subscription=subscription).values(
+                    'feature_id'
+                ).annotate(total=Sum('usage_count')).values_list('feature_id', 'total'))
+            for feature_id in limited + tiered:
+                # Buffered or logged usage has not reached the usage record yet
+                usage[feature_id] = usage.get(feature_id, 0) + get_pending_usage(subscription, feature_id)
+        if gauges and subscription:
+            usage.update(UsageGauge.objects.filter(
+                subscription=subscription, feature_id__in=gauges
+            ).values_list('feature_id', 'usage_count'))
+        
+        for slug, entitlement in entitlements.items():
+            remaining = None
+            if entitlement.feature_id in tiered:
+                used = usage.get(entitlement.feature_id, 0)
+                tier = entitlement.tiers.resolve(used)
+                quota = tier.limit if tier else None
+                access[slug] = FeatureAccess(True, quota, None if quota is None else max(quota - used, 0))
+                continue
+            if entitlement.feature_id in limited or entitlement.feature_id in gauges:
+                remaining = max(entitlement.quota - usage.get(entitlement.feature_id, 0), 0)
+            access[slug] = FeatureAccess(True, entitlement.quota, remaining)
+        return access
     
     @staticmethod
     def get_subscriber_info(request):
@@ -70,10 +318,10 @@ class TenantSubscriptionManager:
                 'plan': request.tenant.subscription_plan.name if request.tenant.subscription_plan else 'No Plan'
             }
         elif hasattr(request, 'user') and request.user.is_authenticated:
-            subscription = request.user.subscriptions.filter(status__in=['active', 'trialing']).first()
+            subscription = TenantSubscriptionManager.get_active_subscription(request)
             return {
                 'type': 'user',
                 'name': request.user.get_full_name() or request.user.username,
                 'plan': subscription.plan.name if subscription else 'No Plan'
             }
-        return None
\ No newline at end of file
+        return None
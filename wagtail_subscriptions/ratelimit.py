@@ -0,0 +1,85 @@
+import math
+import time
+from typing import NamedTuple, Optional
+from django.core.cache import caches
+from .cache import get_plan_snapshot
+from .settings import get_setting
+
+RATE_KEY = 'wagtail_subscriptions:rate:{}:{}:{}'
+
+
+class RateLimitResult(NamedTuple):
+    """Outcome of a rate limit check; reset is the Unix time the current window ends"""
+    allowed: bool
+    limit: Optional[int]
+    remaining: Optional[int]
+    reset: Optional[int]
+    retry_after: Optional[int] = None
+
+
+def get_rate_limit_cache():
+    return caches[get_setting('RATE_LIMIT_CACHE_ALIAS')]
+
+
+def _window_key(subscription_id, feature_id, index):
+    return RATE_KEY.format(subscription_id, feature_id, index)
+
+
+def _add(cache, key, delta, timeout):
+    """Increment a counter, creating it with an expiry when it does not exist yet"""
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, timeout=timeout):
+            return delta
+        return cache.incr(key, delta)
+
+
+def _retry_after(limit, window, offset, previous, current, count):
+    """Seconds until the weighted previous window has decayed enough to admit count units"""
+    if previous and current + count <= limit:
+        decayed_at = window * (1 - (limit - count - current) / previous)
+        return max(math.ceil(decayed_at - offset), 1)
+    return max(math.ceil(window - offset), 1)
+
+
+def consume_rate_limit(subscription, feature_slug, count=1, now=None):
+    """
+    Take count units of a rate feature's per-window limit.
+
+    Uses a sliding window counter: one cache counter per fixed window, with
+    the previous window weighted by how much of it still overlaps the
+    sliding window. A check is two or three cache operations and never
+    touches the database. Features that are not rate limited are allowed,
+    features missing from the plan are denied.
+    """
+    entitlement = get_plan_snapshot(subscription.plan_id).get_feature(feature_slug)
+    if entitlement is None:
+        return RateLimitResult(False, 0, 0, None)
+    if entitlement.feature_type != 'rate' or not entitlement.quota or not entitlement.window:
+        return RateLimitResult(True, None, None, None)
+
+    limit, window = entitlement.quota, entitlement.window
+    now = time.time() if now is None else now
+    index, offset = divmod(now, window)
+    index = int(index)
+    reset = (index + 1) * window
+
+    cache = get_rate_limit_cache()
+    key = _window_key(subscription.pk, entitlement.feature_id, index)
+    previous = cache.get(_window_key(subscription.pk, entitlement.feature_id, index - 1), 0)
+    weighted = previous * (1 - offset / window)
+
+    # Count first so concurrent requests see each other's units, undo if over the limit
+    current = _add(cache, key, count, timeout=2 * window)
+    if weighted + current > limit:
+        try:
+            cache.decr(key, count)
+        except ValueError:
+            pass
+        current -= count
+        return RateLimitResult(
+            False, limit, max(int(limit - weighted - current), 0), reset,
+            _retry_after(limit, window, offset, previous, current, count)
+        )
+    return RateLimitResult(True, limit, max(int(limit - weighted - current), 0), reset)
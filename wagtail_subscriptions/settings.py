@@ -20,9 +20,47 @@ WAGTAIL_SUBSCRIPTIONS_DEFAULTS = {
     'PERMISSIONS': {
         'AUTO_CREATE_GROUPS': True,
         'SYNC_PERMISSIONS': True,
-    }
+    },
+    # Cache backend shared by all workers, used for catalog versioning
+    'CACHE_ALIAS': 'default',
+    # Seconds between checks of the shared catalog version
+    'CATALOG_VERSION_CHECK_INTERVAL': 5,
+    # Keep a signed copy of the user's plan and quotas in the session
+    'ENTITLEMENT_TOKEN_ENABLED': False,
+    'ENTITLEMENT_TOKEN_TTL': 300,
+    # Buffer usage increments in memory and write them in bulk
+    'USAGE_BUFFERING': False,
+    'USAGE_BUFFER_CLASS': 'wagtail_subscriptions.metering.UsageBuffer',
+    'USAGE_BUFFER_SIZE': 500,
+    'USAGE_BUFFER_INTERVAL': 10,
+    # Flush the buffer every USAGE_BUFFER_INTERVAL from a background thread, not only on add
+    'USAGE_BUFFER_FLUSH_THREAD': True,
+    # Maintain hourly/daily per-plan usage aggregates (UsageRollup)
+    'USAGE_ROLLUPS': False,
+    # Bearer tokens accepted by the bulk usage API, and its batch size limit
+    'USAGE_API_KEYS': [],
+    'USAGE_API_MAX_EVENTS': 10000,
+    # Days to remember usage idempotency keys (cleanup_usage_event_keys)
+    'USAGE_EVENT_KEY_TTL_DAYS': 7,
+    # Append usage as UsageEvent rows, folded into UsageRecord by compact_usage_events
+    'USAGE_EVENT_LOG': False,
+    # Number of UsageRecord rows each usage counter is spread over
+    'USAGE_COUNTER_SHARDS': 1,
+    # Quota units reserved per local lease, and seconds before unused units are returned
+    'QUOTA_LEASE_SIZE': 50,
+    'QUOTA_LEASE_TTL': 30,
+    # Cache backend holding rate limit counters; must be shared by all workers
+    'RATE_LIMIT_CACHE_ALIAS': 'default',
+    # Seconds per UsageBucket of rolling-window quotas (features with a quota_window)
+    'USAGE_BUCKET_SECONDS': 3600,
 }
 
 # Get user settings and merge with defaults
 user_settings = getattr(settings, 'WAGTAIL_SUBSCRIPTIONS', {})
-WAGTAIL_SUBSCRIPTIONS = {**WAGTAIL_SUBSCRIPTIONS_DEFAULTS, **user_settings}
\ No newline at end of file
+WAGTAIL_SUBSCRIPTIONS = {**WAGTAIL_SUBSCRIPTIONS_DEFAULTS, **user_settings}
+
+
+def get_setting(name):
+    """Read a setting at call time so overrides (e.g. in tests) are honoured"""
+    user_settings = getattr(settings, 'WAGTAIL_SUBSCRIPTIONS', {})
+    return user_settings.get(name, WAGTAIL_SUBSCRIPTIONS_DEFAULTS.get(name))
@@ -1,11 +1,29 @@
-from django.db.models.signals import post_save, pre_save
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import Customer, Subscription
+from .models import (
+    Customer, Subscription, SubscriptionPlan, Module, Feature, PlanFeature,
+    SubscriptionPermission, SubscriptionGroup
+)
+from .cache import bump_catalog_version
+from .permissions.entitlements import invalidate_entitlements
 
 User = get_user_model()
 
 
+def on_commit(func, *args):
+    """
+    Run an invalidation once the transaction commits, when other workers can
+    read the change; a worker rebuilding its cache before that would store
+    pre-commit data under the new version. Inside a transaction it also runs
+    right away so this worker sees its own change.
+    """
+    if transaction.get_connection().in_atomic_block:
+        func(*args)
+    transaction.on_commit(lambda: func(*args))
+
+
 @receiver(post_save, sender=User)
 def create_customer_profile(sender, instance, created, **kwargs):
     """Create a customer profile when a user is created"""
@@ -23,4 +41,67 @@ def update_subscription_status(sender, instance, **kwargs):
     """Update subscription status based on dates and external data"""
     # This would contain logic to sync with payment processor
     # and update status based on current date vs. trial_end, etc.
-    pass
\ No newline at end of file
+    pass
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_subscriber_entitlements(sender, instance, **kwargs):
+    """Status or plan changes (webhooks, admin edits) invalidate the user's entitlement token"""
+    on_commit(invalidate_entitlements, instance.user_id)
+
+
+@receiver(post_save, sender=SubscriptionPlan)
+@receiver(post_delete, sender=SubscriptionPlan)
+def invalidate_plan_cache(sender, instance, **kwargs):
+    """Tell every worker to drop its cached entitlements for the catalog"""
+    on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=SubscriptionPlan)
+def refresh_plan_feature_mask(sender, instance, **kwargs):
+    """Recompute the feature mask so a stale instance can't overwrite it on save"""
+    masks = SubscriptionPlan.refresh_feature_masks([instance.pk])
+    instance.feature_mask = format(masks.get(instance.pk, 0), 'x')
+
+
+@receiver(post_save, sender=PlanFeature)
+@receiver(post_delete, sender=PlanFeature)
+def invalidate_plan_feature_cache(sender, instance, **kwargs):
+    """Tell every worker that a plan's features changed"""
+    on_commit(bump_catalog_version)
+    masks = SubscriptionPlan.refresh_feature_masks([instance.plan_id])
+    # Keep an already-loaded plan (e.g. plan.plan_features.create()) in sync
+    if PlanFeature._meta.get_field('plan').is_cached(instance) and instance.plan_id in masks:
+        instance.plan.feature_mask = format(masks[instance.plan_id], 'x')
+
+
+@receiver(post_save, sender=Feature)
+@receiver(post_delete, sender=Feature)
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    """Features and modules can be shared by every plan, so bump the catalog version"""
+    on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Feature)
+def refresh_feature_plan_masks(sender, instance, **kwargs):
+    """Recompute the masks of plans using a feature whose active state may have changed"""
+    plan_ids = PlanFeature.objects.filter(feature=instance).values_list('plan_id', flat=True)
+    SubscriptionPlan.refresh_feature_masks(list(plan_ids))
+
+
+@receiver(post_save, sender=SubscriptionPermission)
+@receiver(post_delete, sender=SubscriptionPermission)
+@receiver(post_save, sender=SubscriptionGroup)
+@receiver(post_delete, sender=SubscriptionGroup)
+def invalidate_permission_cache(sender, instance, **kwargs):
+    """Cached plan permission sets are part of the catalog"""
+    on_commit(bump_catalog_version)
+
+
+@receiver(m2m_changed, sender=SubscriptionGroup.permissions.through)
+def invalidate_group_permission_cache(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        on_commit(bump_catalog_version)
@@ -42,6 +42,20 @@ def has_feature(request, feature_slug):
         return False
     return TenantSubscriptionManager.has_feature_access(request, feature_slug)
 
+@register.simple_tag
+def features_for(request, *feature_slugs):
+    """
+    Check several features with one lookup
+    
+    Usage:
+    {% features_for request "reports" "exports" as access %}
+    {% if access.reports.allowed %}...{% endif %}
+    {{ access.exports.remaining }}
+    """
+    if not request:
+        return {}
+    return TenantSubscriptionManager.has_features(request, feature_slugs)
+
 @register.simple_tag(takes_context=True)
 def subscription_info(context):
     """Get subscription information for current context"""
@@ -20,5 +20,6 @@ urlpatterns = [
         path('subscription/', views.SubscriptionAPIView.as_view(), name='subscription_api'),
         path('analytics/', views.AnalyticsAPIView.as_view(), name='analytics_api'),
         path('plans/', PricingPlansAPIView.as_view(), name='api_plans'),
+        path('usage/', views.UsageIngestAPIView.as_view(), name='usage_api'),
     ])),
 ]
\ No newline at end of file
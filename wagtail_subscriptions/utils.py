@@ -1,71 +1,778 @@
+import random
 from decimal import Decimal
+from typing import NamedTuple, Optional
 from django.utils import timezone
 from datetime import timedelta
-from .models import UsageRecord, Subscription
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+from .models import UsageRecord, UsageRollup, UsageBucket, UsageGauge, UsageEventKey, Subscription, SubscriptionPlan
+from .cache import get_features_mask, get_plan_snapshot
+from .settings import get_setting
 
 
-def track_feature_usage(subscription, feature_slug, count=1):
-    """Track usage of a feature for quota management"""
+class QuotaResult(NamedTuple):
+    """Outcome of consuming or releasing feature quota"""
+    allowed: bool
+    quota: Optional[int]
+    remaining: Optional[int]
+
+
+class UsageResult(NamedTuple):
+    """
+    Outcome of tracking usage. usage_count is the count of the UsageRecord
+    row (counter shard) written to, or the count still pending when the
+    usage went to the event log or the buffer, in which case record_id is
+    None and pending is True.
+    """
+    usage_count: int
+    record_id: Optional[int] = None
+    pending: bool = False
+
+
+def _usage_upsert_supported(connection):
+    # supports_update_conflicts_with_target is missing before Django 4.1, which use the F() fallback
+    return bool(
+        getattr(connection.features, 'supports_update_conflicts_with_target', False)
+        and connection.features.can_return_columns_from_insert
+    )
+
+
+USAGE_RECORD_KEY = ('subscription_id', 'feature_id', 'period_start', 'shard')
+USAGE_ROLLUP_KEY = ('plan_id', 'feature_id', 'granularity', 'bucket_start', 'shard')
+USAGE_BUCKET_KEY = ('subscription_id', 'feature_id', 'bucket_start')
+USAGE_GAUGE_KEY = ('subscription_id', 'feature_id')
+
+
+def _upsert_counters(connection, model, rows, unique_fields):
+    """
+    Insert rows of a counter model or add their usage_count to the existing
+    rows with the same unique_fields, with one INSERT ... ON CONFLICT
+    statement per batch. Returns [(pk, usage_count)].
+    """
+    opts = model._meta
+    qn = connection.ops.quote_name
+    names = list(rows[0])
+    fields = [opts.get_field(name) for name in names]
+    conflict = [qn(opts.get_field(name).column) for name in unique_fields]
+    table = qn(opts.db_table)
+    usage_count = qn(opts.get_field('usage_count').column)
+    updated_at = qn(opts.get_field('updated_at').column)
+    placeholders = f"({', '.join(['%s'] * len(fields))})"
+    batch_size = max(connection.ops.bulk_batch_size(fields, rows), 1)
+    
+    results = []
+    with connection.cursor() as cursor:
+        for offset in range(0, len(rows), batch_size):
+            batch = rows[offset:offset + batch_size]
+            params = [
+                field.get_db_prep_save(values[name], connection)
+                for values in batch
+                for name, field in zip(names, fields)
+            ]
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(qn(field.column) for field in fields)}) "
+                f"VALUES {', '.join([placeholders] * len(batch))} "
+                f"ON CONFLICT ({', '.join(conflict)}) "
+                f"DO UPDATE SET {usage_count} = {table}.{usage_count} + EXCLUDED.{usage_count}, "
+                f"{updated_at} = EXCLUDED.{updated_at} "
+                f"RETURNING {qn(opts.pk.column)}, {usage_count}",
+                params
+            )
+            results.extend(cursor.fetchall())
+    return results
+
+
+def _increment_counter(model, values, unique_fields):
+    """Portable fallback: F() increment, creating the row in a savepoint if missing"""
+    records = model.objects.filter(**{name: values[name] for name in unique_fields})
+    with transaction.atomic():
+        while True:
+            if records.update(usage_count=F('usage_count') + values['usage_count'], updated_at=values['updated_at']):
+                return records.values_list('pk', 'usage_count').get()
+            try:
+                with transaction.atomic():
+                    record = model.objects.create(**values)
+                return record.pk, record.usage_count
+            except IntegrityError:
+                # Another request created the row first, increment it instead
+                continue
+
+
+def _bulk_increment_counters(model, rows, unique_fields):
+    if not rows:
+        return []
+    connection = connections[router.db_for_write(model)]
+    if _usage_upsert_supported(connection):
+        return _upsert_counters(connection, model, rows, unique_fields)
+    with transaction.atomic():
+        return [_increment_counter(model, values, unique_fields) for values in rows]
+
+
+def is_rollup_enabled():
+    return bool(get_setting('USAGE_ROLLUPS'))
+
+
+def get_rollup_buckets(timestamp):
+    """Start of the hourly and daily rollup buckets containing timestamp"""
+    hour = timestamp.replace(minute=0, second=0, microsecond=0)
+    return {'hour': hour, 'day': hour.replace(hour=0)}
+
+
+def record_usage_rollups(deltas, timestamp=None, shard=None):
+    """
+    Add usage deltas, an iterable of (plan_id, feature_id, count), to the
+    hourly and daily UsageRollup buckets containing timestamp (now). Like
+    UsageRecord, the rollups of a plan's feature are split over
+    USAGE_COUNTER_SHARDS rows, picked at random unless shard is given.
+    """
+    timestamp = timestamp or timezone.now()
+    totals = {}
+    for plan_id, feature_id, count in deltas:
+        totals[plan_id, feature_id] = totals.get((plan_id, feature_id), 0) + count
+    
+    rows = [
+        {
+            'plan_id': plan_id,
+            'feature_id': feature_id,
+            'granularity': granularity,
+            'bucket_start': bucket_start,
+            'shard': row_shard,
+            'usage_count': count,
+            'updated_at': timestamp,
+        }
+        for (plan_id, feature_id), count in totals.items()
+        if count > 0
+        for row_shard in [pick_usage_shard() if shard is None else shard]
+        for granularity, bucket_start in get_rollup_buckets(timestamp).items()
+    ]
+    return _bulk_increment_counters(UsageRollup, rows, USAGE_ROLLUP_KEY)
+
+
+def _release_usage_rollups(plan_id, feature_id, count, timestamp=None):
+    timestamp = timestamp or timezone.now()
+    buckets = Q()
+    for granularity, bucket_start in get_rollup_buckets(timestamp).items():
+        buckets |= Q(granularity=granularity, bucket_start=bucket_start)
+    UsageRollup.objects.filter(buckets, plan_id=plan_id, feature_id=feature_id, shard=0).update(
+        usage_count=Case(
+            When(usage_count__gte=count, then=F('usage_count') - count),
+            default=Value(0)
+        ),
+        updated_at=timestamp
+    )
+
+
+# Process-local record of the features whose expired buckets were pruned during the current bucket
+_bucket_pruning = {'bucket_start': None, 'feature_ids': set()}
+
+
+def get_usage_bucket(timestamp):
+    """Start of the USAGE_BUCKET_SECONDS bucket containing timestamp"""
+    size = get_setting('USAGE_BUCKET_SECONDS')
+    return timestamp - timedelta(seconds=int(timestamp.timestamp()) % size, microseconds=timestamp.microsecond)
+
+
+def get_window_start(window, timestamp=None):
+    """
+    Oldest bucket counted in a rolling window of window seconds ending at
+    timestamp (now). Usage leaves the window one whole bucket at a time.
+    """
+    timestamp = timestamp or timezone.now()
+    return get_usage_bucket(timestamp) - timedelta(seconds=max(window - get_setting('USAGE_BUCKET_SECONDS'), 0))
+
+
+def get_rolling_windows(plan_id):
+    """Map feature id -> window in seconds of the plan's limited rolling-window quota features"""
+    return {
+        entitlement.feature_id: entitlement.window
+        for entitlement in get_plan_snapshot(plan_id).features.values()
+        if entitlement.feature_type == 'quota' and entitlement.quota and entitlement.window
+    }
+
+
+def prune_usage_buckets(windows, timestamp=None):
+    """Delete the buckets that left their feature's rolling window; windows maps feature id -> seconds"""
+    timestamp = timestamp or timezone.now()
+    deleted = 0
+    for feature_id, window in windows.items():
+        deleted += UsageBucket.objects.filter(
+            feature_id=feature_id,
+            bucket_start__lt=get_window_start(window, timestamp)
+        ).delete()[0]
+    return deleted
+
+
+def _prune_expired_buckets(windows, timestamp):
+    """Prune each feature once per process and bucket, the first time it is written"""
+    bucket_start = get_usage_bucket(timestamp)
+    if _bucket_pruning['bucket_start'] != bucket_start:
+        _bucket_pruning['bucket_start'] = bucket_start
+        _bucket_pruning['feature_ids'] = set()
+    due = {feature_id: window for feature_id, window in windows.items() if feature_id not in _bucket_pruning['feature_ids']}
+    if due:
+        _bucket_pruning['feature_ids'].update(due)
+        prune_usage_buckets(due, timestamp)
+
+
+def record_usage_buckets(deltas, timestamp=None):
+    """
+    Add usage deltas, an iterable of (subscription_id, feature_id, window,
+    count), to the UsageBucket containing timestamp (now). Buckets older
+    than their feature's window are pruned as the buckets roll over.
+    """
+    timestamp = timestamp or timezone.now()
+    bucket_start = get_usage_bucket(timestamp)
+    totals = {}
+    windows = {}
+    for subscription_id, feature_id, window, count in deltas:
+        totals[subscription_id, feature_id] = totals.get((subscription_id, feature_id), 0) + count
+        windows[feature_id] = window
+    
+    rows = [
+        {
+            'subscription_id': subscription_id,
+            'feature_id': feature_id,
+            'bucket_start': bucket_start,
+            'usage_count': count,
+            'updated_at': timestamp,
+        }
+        for (subscription_id, feature_id), count in totals.items()
+        if count > 0
+    ]
+    results = _bulk_increment_counters(UsageBucket, rows, USAGE_BUCKET_KEY)
+    _prune_expired_buckets(windows, timezone.now())
+    return results
+
+
+def get_rolling_usage(subscription, feature_id, window, timestamp=None):
+    """Usage within a rolling window, a range scan over at most window / USAGE_BUCKET_SECONDS buckets"""
+    from .metering import get_pending_usage
+    
+    usage = UsageBucket.objects.filter(
+        subscription=subscription,
+        feature_id=feature_id,
+        bucket_start__gte=get_window_start(window, timestamp)
+    ).aggregate(total=Sum('usage_count'))['total'] or 0
+    return usage + get_pending_usage(subscription, feature_id)
+
+
+def get_window_reset(subscription, feature_id, window, timestamp=None):
+    """When the oldest bucket still counted in a rolling window leaves it, freeing its usage"""
+    timestamp = timestamp or timezone.now()
+    oldest = UsageBucket.objects.filter(
+        subscription=subscription,
+        feature_id=feature_id,
+        bucket_start__gte=get_window_start(window, timestamp)
+    ).order_by('bucket_start').values_list('bucket_start', flat=True).first()
+    return (oldest or get_usage_bucket(timestamp)) + timedelta(seconds=window)
+
+
+def pick_usage_shard():
+    """Random counter shard for a usage write, spreading row locks of hot counters"""
+    shards = get_setting('USAGE_COUNTER_SHARDS')
+    return random.randrange(shards) if shards > 1 else 0
+
+
+def bulk_increment_usage(deltas, rollups=True, buckets=True, timestamp=None):
+    """
+    Atomically apply many usage increments and return [(record_id, usage_count)].
+    
+    deltas is an iterable of (subscription_id, plan_id, feature_id,
+    period_start, period_end, count) tuples with distinct (subscription,
+    feature, period) keys. On SQLite and PostgreSQL they are written with one
+    upsert per batch, plus one for the rollups when USAGE_ROLLUPS is enabled
+    (pass rollups=False when the caller rolls the usage up itself) and one
+    for the buckets of rolling-window quotas (buckets=False skips them).
+    Rollups and buckets are dated at timestamp, when the usage happened
+    (now by default). Each increment goes to a random counter shard, whose
+    count is returned.
+    """
+    deltas = list(deltas)
+    now = timezone.now()
+    rows = [
+        {
+            'subscription_id': subscription_id,
+            'feature_id': feature_id,
+            'period_start': period_start,
+            'period_end': period_end,
+            'shard': pick_usage_shard(),
+            'usage_count': count,
+            'created_at': now,
+            'updated_at': now,
+        }
+        for subscription_id, plan_id, feature_id, period_start, period_end, count in deltas
+    ]
+    if not rows:
+        return []
+    
+    bucket_deltas = []
+    if buckets:
+        windows = {}
+        for subscription_id, plan_id, feature_id, _, _, count in deltas:
+            if plan_id not in windows:
+                windows[plan_id] = get_rolling_windows(plan_id)
+            if feature_id in windows[plan_id]:
+                bucket_deltas.append((subscription_id, feature_id, windows[plan_id][feature_id], count))
+    rollups = rollups and is_rollup_enabled()
+    
+    if not (rollups or bucket_deltas):
+        return _bulk_increment_counters(UsageRecord, rows, USAGE_RECORD_KEY)
+    with transaction.atomic():
+        results = _bulk_increment_counters(UsageRecord, rows, USAGE_RECORD_KEY)
+        if rollups:
+            record_usage_rollups(
+                ((plan_id, feature_id, count) for _, plan_id, feature_id, _, _, count in deltas),
+                timestamp or now
+            )
+        if bucket_deltas:
+            record_usage_buckets(bucket_deltas, timestamp or now)
+    return results
+
+
+def _insert_new_keys(connection, rows):
+    """INSERT ... ON CONFLICT (key) DO NOTHING RETURNING key, one statement per batch"""
+    opts = UsageEventKey._meta
+    qn = connection.ops.quote_name
+    names = list(rows[0])
+    fields = [opts.get_field(name) for name in names]
+    table = qn(opts.db_table)
+    key = qn(opts.get_field('key').column)
+    placeholders = f"({', '.join(['%s'] * len(fields))})"
+    batch_size = max(connection.ops.bulk_batch_size(fields, rows), 1)
+    
+    claimed = set()
+    with connection.cursor() as cursor:
+        for offset in range(0, len(rows), batch_size):
+            batch = rows[offset:offset + batch_size]
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(qn(field.column) for field in fields)}) "
+                f"VALUES {', '.join([placeholders] * len(batch))} "
+                f"ON CONFLICT ({key}) DO NOTHING "
+                f"RETURNING {key}",
+                [
+                    field.get_db_prep_save(values[name], connection)
+                    for values in batch
+                    for name, field in zip(names, fields)
+                ]
+            )
+            claimed.update(row[0] for row in cursor.fetchall())
+    return claimed
+
+
+def claim_usage_event_keys(events):
+    """
+    Record the idempotency keys of usage events and return the keys that were
+    new. events is an iterable of (key, subscription_id, feature_id, count).
+    
+    Call inside the transaction applying the usage: a replayed key conflicts
+    on the unique index and is left out, so its usage is not counted again.
+    """
+    now = timezone.now()
+    rows = [
+        {
+            'key': key,
+            'subscription_id': subscription_id,
+            'feature_id': feature_id,
+            'usage_count': count,
+            'created_at': now,
+        }
+        for key, subscription_id, feature_id, count in events
+    ]
+    if not rows:
+        return set()
+    
+    connection = connections[router.db_for_write(UsageEventKey)]
+    if _usage_upsert_supported(connection):
+        return _insert_new_keys(connection, rows)
+    
+    claimed = set()
+    for values in rows:
+        try:
+            with transaction.atomic():
+                UsageEventKey.objects.create(**values)
+            claimed.add(values['key'])
+        except IntegrityError:
+            pass
+    return claimed
+
+
+def increment_usage(subscription, feature_id, count=1, period_start=None, period_end=None):
+    """
+    Atomically add count to a subscription's usage of a feature for a billing
+    period (the current one by default) and return (record_id, usage_count)
+    of the counter shard written to.
+    
+    Uses a single INSERT ... ON CONFLICT ... RETURNING where the database
+    supports it, so concurrent calls never lose increments.
+    """
+    return bulk_increment_usage([(
+        subscription.pk,
+        subscription.plan_id,
+        feature_id,
+        period_start or subscription.current_period_start,
+        period_end or subscription.current_period_end,
+        count,
+    )])[0]
+
+
+def track_feature_usage(subscription, feature_slug, count=1, idempotency_key=None):
+    """
+    Track usage of a feature for quota management.
+    
+    Returns a UsageResult, or None when the feature is not in the plan.
+    With USAGE_EVENT_LOG enabled the usage is appended as a UsageEvent, and
+    with USAGE_BUFFERING it is queued in the process buffer; in both cases
+    the result is pending and holds the pending count. Usage with an
+    idempotency_key is always written directly, and a replayed key returns
+    None without counting the usage again.
+    """
+    from .metering import append_usage_event, get_usage_buffer, is_buffering_enabled, is_event_log_enabled
+    
     try:
-        feature = subscription.plan.plan_features.get(
-            feature__slug=feature_slug,
-            is_included=True
-        ).feature
+        entitlement = get_plan_snapshot(subscription.plan_id).get_feature(feature_slug)
+        if entitlement is None:
+            return None
         
-        # Get current billing period
-        now = timezone.now()
-        period_start = subscription.current_period_start
-        period_end = subscription.current_period_end
-        
-        # Get or create usage record
-        usage_record, created = UsageRecord.objects.get_or_create(
-            subscription=subscription,
-            feature=feature,
-            period_start=period_start,
-            defaults={
-                'period_end': period_end,
-                'usage_count': 0
-            }
-        )
-        
-        usage_record.usage_count += count
-        usage_record.save()
-        
-        return usage_record
+        if idempotency_key is not None:
+            with transaction.atomic():
+                if not claim_usage_event_keys([(idempotency_key, subscription.pk, entitlement.feature_id, count)]):
+                    return None
+                record_id, usage_count = increment_usage(subscription, entitlement.feature_id, count)
+        elif is_event_log_enabled():
+            return UsageResult(append_usage_event(subscription, entitlement.feature_id, count).usage_count, pending=True)
+        elif is_buffering_enabled():
+            return UsageResult(get_usage_buffer().add(subscription, entitlement.feature_id, count), pending=True)
+        else:
+            record_id, usage_count = increment_usage(subscription, entitlement.feature_id, count)
+        return UsageResult(usage_count, record_id)
         
     except Exception:
         return None
 
 
+def get_current_usage(subscription, feature_id):
+    """Usage for the current period, including usage not yet written to UsageRecord"""
+    from .metering import get_pending_usage
+    
+    usage = UsageRecord.objects.filter(
+        subscription=subscription,
+        feature_id=feature_id,
+        period_start=subscription.current_period_start
+    ).aggregate(total=Sum('usage_count'))['total'] or 0
+    return usage + get_pending_usage(subscription, feature_id)
+
+
 def check_feature_quota(subscription, feature_slug):
     """Check if user has exceeded feature quota"""
     try:
-        plan_feature = subscription.plan.plan_features.get(
-            feature__slug=feature_slug,
-            is_included=True
-        )
+        entitlement = get_plan_snapshot(subscription.plan_id).get_feature(feature_slug)
+        if entitlement is None:
+            return False
+        
+        if entitlement.feature_type == 'tiered' and entitlement.tiers is not None:
+            usage = get_current_usage(subscription, entitlement.feature_id)
+            tier = entitlement.tiers.resolve(usage)
+            return tier is None or tier.limit is None or usage < tier.limit
         
-        if plan_feature.feature.feature_type != 'quota':
+        if entitlement.feature_type not in ('quota', 'gauge'):
             return True  # No quota limit
         
-        quota = plan_feature.effective_quota
-        if not quota:
+        if not entitlement.quota:
             return True  # Unlimited
         
-        # Get current usage
-        usage_record = UsageRecord.objects.filter(
-            subscription=subscription,
-            feature=plan_feature.feature,
-            period_start=subscription.current_period_start
-        ).first()
+        if entitlement.feature_type == 'gauge':
+            return get_gauge_value(subscription, entitlement.feature_id) < entitlement.quota
+        
+        if entitlement.window:
+            return get_rolling_usage(subscription, entitlement.feature_id, entitlement.window) < entitlement.quota
         
-        current_usage = usage_record.usage_count if usage_record else 0
-        return current_usage < quota
+        return get_current_usage(subscription, entitlement.feature_id) < entitlement.quota
         
     except Exception:
         return False
 
 
+def get_feature_tier(subscription, feature_slug, usage=None):
+    """
+    Tier of a tiered feature reached with usage (the current period's usage
+    by default), found by binary search over the plan snapshot's thresholds.
+    """
+    entitlement = get_plan_snapshot(subscription.plan_id).get_feature(feature_slug)
+    if entitlement is None or entitlement.tiers is None:
+        return None
+    if usage is None:
+        usage = get_current_usage(subscription, entitlement.feature_id)
+    return entitlement.tiers.resolve(usage)
+
+
+def _consume_counter_upsert(connection, model, values, unique_fields, limit):
+    """Insert or increment a counter row only while it stays within limit, returning the new count"""
+    opts = model._meta
+    qn = connection.ops.quote_name
+    fields = [opts.get_field(name) for name in values]
+    table = qn(opts.db_table)
+    usage_count = qn(opts.get_field('usage_count').column)
+    updated_at = qn(opts.get_field('updated_at').column)
+    conflict = [qn(opts.get_field(name).column) for name in unique_fields]
+    params = [field.get_db_prep_save(value, connection) for field, value in zip(fields, values.values())]
+    
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(qn(field.column) for field in fields)}) "
+            f"VALUES ({', '.join(['%s'] * len(fields))}) "
+            f"ON CONFLICT ({', '.join(conflict)}) "
+            f"DO UPDATE SET {usage_count} = {table}.{usage_count} + EXCLUDED.{usage_count}, "
+            f"{updated_at} = EXCLUDED.{updated_at} "
+            f"WHERE {table}.{usage_count} + EXCLUDED.{usage_count} <= %s "
+            f"RETURNING {usage_count}",
+            params + [limit]
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _consume_counter_update(model, values, unique_fields, limit):
+    """Portable fallback of _consume_counter_upsert() using a conditional F() update"""
+    count = values['usage_count']
+    records = model.objects.filter(**{name: values[name] for name in unique_fields})
+    with transaction.atomic():
+        while True:
+            if records.filter(usage_count__lte=limit - count).update(
+                usage_count=F('usage_count') + count, updated_at=values['updated_at']
+            ):
+                return records.values_list('usage_count', flat=True).get()
+            if records.exists():
+                return None
+            try:
+                with transaction.atomic():
+                    return model.objects.create(**values).usage_count
+            except IntegrityError:
+                continue
+
+
+def _consume_counter(model, values, unique_fields, limit):
+    connection = connections[router.db_for_write(model)]
+    if _usage_upsert_supported(connection):
+        return _consume_counter_upsert(connection, model, values, unique_fields, limit)
+    return _consume_counter_update(model, values, unique_fields, limit)
+
+
+def _consume_rolling_quota(subscription, entitlement, count):
+    """
+    consume_feature_quota() for a quota over a rolling window. Earlier
+    buckets no longer grow, so only the current bucket needs the
+    conditional upsert; the period's UsageRecord is incremented alongside.
+    """
+    from .metering import get_pending_usage
+    
+    quota, window = entitlement.quota, entitlement.window
+    now = timezone.now()
+    bucket_start = get_usage_bucket(now)
+    limit = quota - get_pending_usage(subscription, entitlement.feature_id) - (
+        UsageBucket.objects.filter(
+            subscription=subscription,
+            feature_id=entitlement.feature_id,
+            bucket_start__gte=get_window_start(window, now),
+            bucket_start__lt=bucket_start
+        ).aggregate(total=Sum('usage_count'))['total'] or 0
+    )
+    
+    usage = None
+    if count <= limit:
+        values = {
+            'subscription_id': subscription.pk,
+            'feature_id': entitlement.feature_id,
+            'bucket_start': bucket_start,
+            'usage_count': count,
+            'updated_at': now,
+        }
+        with transaction.atomic():
+            usage = _consume_counter(UsageBucket, values, USAGE_BUCKET_KEY, limit)
+            if usage is not None:
+                _bulk_increment_counters(UsageRecord, [{
+                    'subscription_id': subscription.pk,
+                    'feature_id': entitlement.feature_id,
+                    'period_start': subscription.current_period_start,
+                    'period_end': subscription.current_period_end,
+                    'shard': 0,
+                    'usage_count': count,
+                    'created_at': now,
+                    'updated_at': now,
+                }], USAGE_RECORD_KEY)
+                if is_rollup_enabled():
+                    record_usage_rollups([(subscription.plan_id, entitlement.feature_id, count)], now, shard=0)
+    
+    if usage is None:
+        return QuotaResult(False, quota, max(quota - get_rolling_usage(subscription, entitlement.feature_id, window), 0))
+    _prune_expired_buckets({entitlement.feature_id: window}, now)
+    return QuotaResult(True, quota, max(limit - usage, 0))
+
+
+def consume_feature_quota(subscription, feature_slug, count=1):
+    """
+    Reserve count units of a feature's quota for the current period.
+    
+    The usage counter is only incremented if it stays within the quota, with
+    one conditional upsert, so concurrent requests cannot overshoot it.
+    Features without a quota are tracked and always allowed, features
+    with a quota_window are limited over that rolling window instead of the
+    billing period, and tiered features are capped where their tiers stop.
+    Returns a QuotaResult; pair with release_feature_quota() to undo.
+    """
+    from .metering import get_pending_usage
+    
+    entitlement = get_plan_snapshot(subscription.plan_id).get_feature(feature_slug)
+    if entitlement is None:
+        return QuotaResult(False, 0, 0)
+    
+    if entitlement.feature_type == 'tiered' and entitlement.tiers is not None:
+        quota = entitlement.tiers.cap
+    elif entitlement.feature_type == 'quota':
+        quota = entitlement.quota
+    else:
+        quota = None
+    if not quota:
+        increment_usage(subscription, entitlement.feature_id, count)
+        return QuotaResult(True, None, None)
+    
+    if entitlement.window and entitlement.feature_type == 'quota':
+        return _consume_rolling_quota(subscription, entitlement, count)
+    
+    # Buffered or logged usage has not reached the usage record yet
+    limit = quota - get_pending_usage(subscription, entitlement.feature_id)
+    if get_setting('USAGE_COUNTER_SHARDS') > 1:
+        # Reservations are made on shard 0; other shards only hold tracked usage
+        limit -= UsageRecord.objects.filter(
+            subscription=subscription,
+            feature_id=entitlement.feature_id,
+            period_start=subscription.current_period_start,
+            shard__gt=0
+        ).aggregate(total=Sum('usage_count'))['total'] or 0
+    if count > limit:
+        return QuotaResult(False, quota, max(quota - get_current_usage(subscription, entitlement.feature_id), 0))
+    
+    now = timezone.now()
+    values = {
+        'subscription_id': subscription.pk,
+        'feature_id': entitlement.feature_id,
+        'period_start': subscription.current_period_start,
+        'period_end': subscription.current_period_end,
+        'shard': 0,
+        'usage_count': count,
+        'created_at': now,
+        'updated_at': now,
+    }
+    if is_rollup_enabled():
+        with transaction.atomic():
+            usage = _consume_counter(UsageRecord, values, USAGE_RECORD_KEY, limit)
+            if usage is not None:
+                record_usage_rollups([(subscription.plan_id, entitlement.feature_id, count)], now, shard=0)
+    else:
+        usage = _consume_counter(UsageRecord, values, USAGE_RECORD_KEY, limit)
+    
+    if usage is None:
+        return QuotaResult(False, quota, max(quota - get_current_usage(subscription, entitlement.feature_id), 0))
+    return QuotaResult(True, quota, max(limit - usage, 0))
+
+
+def release_feature_quota(subscription, feature_slug, count=1, bucket_start=None):
+    """
+    Give back quota reserved with consume_feature_quota(), e.g. when the work failed.
+    
+    For rolling-window features, bucket_start is the usage bucket the units
+    were reserved in; it defaults to the current one.
+    """
+    entitlement = get_plan_snapshot(subscription.plan_id).get_feature(feature_slug)
+    if entitlement is None:
+        return False
+    
+    now = timezone.now()
+    decrement = Case(
+        When(usage_count__gte=count, then=F('usage_count') - count),
+        default=Value(0)
+    )
+    released = UsageRecord.objects.filter(
+        subscription=subscription,
+        feature_id=entitlement.feature_id,
+        period_start=subscription.current_period_start,
+        shard=0
+    ).update(usage_count=decrement, updated_at=now)
+    if entitlement.window:
+        # Units go back to the bucket they were reserved in, the current one by default
+        UsageBucket.objects.filter(
+            subscription=subscription,
+            feature_id=entitlement.feature_id,
+            bucket_start=bucket_start or get_usage_bucket(now)
+        ).update(usage_count=decrement, updated_at=now)
+    if released and is_rollup_enabled():
+        _release_usage_rollups(subscription.plan_id, entitlement.feature_id, count)
+    return bool(released)
+
+
+def get_gauge_value(subscription, feature_id):
+    """Current value of a subscription's gauge, read from its single row"""
+    return UsageGauge.objects.filter(
+        subscription=subscription, feature_id=feature_id
+    ).values_list('usage_count', flat=True).first() or 0
+
+
+def acquire_feature_gauge(subscription, feature_slug, count=1):
+    """
+    Take count units of a gauge feature (e.g. seats) while it stays within the quota.
+    
+    The gauge is one row per subscription and feature, raised with the same
+    conditional upsert as consume_feature_quota(), so concurrent invites
+    cannot overshoot it. Units are held until release_feature_gauge().
+    """
+    entitlement = get_plan_snapshot(subscription.plan_id).get_feature(feature_slug)
+    if entitlement is None or entitlement.feature_type != 'gauge':
+        return QuotaResult(False, 0, 0)
+    
+    quota = entitlement.quota
+    values = {
+        'subscription_id': subscription.pk,
+        'feature_id': entitlement.feature_id,
+        'usage_count': count,
+        'updated_at': timezone.now(),
+    }
+    if not quota:
+        _bulk_increment_counters(UsageGauge, [values], USAGE_GAUGE_KEY)
+        return QuotaResult(True, None, None)
+    
+    usage = _consume_counter(UsageGauge, values, USAGE_GAUGE_KEY, quota) if count <= quota else None
+    if usage is None:
+        return QuotaResult(False, quota, max(quota - get_gauge_value(subscription, entitlement.feature_id), 0))
+    return QuotaResult(True, quota, quota - usage)
+
+
+def release_feature_gauge(subscription, feature_slug, count=1):
+    """Give back gauge units taken with acquire_feature_gauge(), e.g. when a member is removed"""
+    entitlement = get_plan_snapshot(subscription.plan_id).get_feature(feature_slug)
+    if entitlement is None:
+        return False
+    
+    return bool(UsageGauge.objects.filter(
+        subscription=subscription, feature_id=entitlement.feature_id
+    ).update(
+        usage_count=Case(
+            When(usage_count__gte=count, then=F('usage_count') - count),
+            default=Value(0)
+        ),
+        updated_at=timezone.now()
+    ))
+
+
+def set_feature_gauge(subscription, feature_slug, value):
+    """Overwrite a gauge, e.g. to reconcile it with a count of the underlying rows"""
+    entitlement = get_plan_snapshot(subscription.plan_id).get_feature(feature_slug)
+    if entitlement is None:
+        return None
+    gauge, _ = UsageGauge.objects.update_or_create(
+        subscription=subscription, feature_id=entitlement.feature_id, defaults={'usage_count': value}
+    )
+    return gauge
+
+
 def calculate_proration(old_plan, new_plan, days_remaining):
     """Calculate proration amount for plan changes"""
     if old_plan.billing_period != new_plan.billing_period:
@@ -86,4 +793,15 @@ def calculate_proration(old_plan, new_plan, days_remaining):
     unused_amount = old_daily_rate * days_remaining
     new_amount = new_daily_rate * days_remaining
     
-    return new_amount - unused_amount
\ No newline at end of file
+    return new_amount - unused_amount
+
+
+def get_subscriptions_with_feature(feature_slug):
+    """Get active subscriptions whose plan includes a feature, using the plan bitmasks"""
+    feature_bits = get_features_mask([feature_slug])
+    plan_ids = [
+        plan_id
+        for plan_id, feature_mask in SubscriptionPlan.objects.values_list('pk', 'feature_mask')
+        if int(feature_mask or '0', 16) & feature_bits
+    ]
+    return Subscription.objects.filter(plan_id__in=plan_ids, status__in=['active', 'trialing'])
@@ -2,4 +2,5 @@ from .subscription import SubscribeView, CustomerPortalView
 from .pricing import PricingView
 from .webhooks import StripeWebhookView
 from .api import SubscriptionAPIView
-from .analytics import AnalyticsAPIView
\ No newline at end of file
+from .analytics import AnalyticsAPIView
+from .usage import UsageIngestAPIView
@@ -2,9 +2,10 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.admin.views.decorators import staff_member_required
 from django.utils.decorators import method_decorator
 from django.views.generic import TemplateView, View
+from datetime import timedelta
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
-from ..models import SubscriptionPlan, Module, Feature, Subscription, Customer
+from ..models import SubscriptionPlan, Module, Feature, Subscription, Customer, SubscriptionMetricsSnapshot
 from ..analytics import SubscriptionAnalytics
 from ..permissions.mixins import AdminSubscriptionMixin
 
@@ -14,11 +15,17 @@ class SubscriptionDashboardView(AdminSubscriptionMixin, TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        mrr = SubscriptionAnalytics.get_mrr()
+        # Compare with the snapshot recorded a month ago rather than recomputing history
+        last_month = SubscriptionMetricsSnapshot.objects.filter(
+            date__lte=SubscriptionAnalytics.today() - timedelta(days=30), mrr__isnull=False
+        ).order_by('-date').values_list('mrr', flat=True).first()
         context.update({
             'total_subscriptions': Subscription.objects.filter(status__in=['active', 'trialing']).count(),
             'total_plans': SubscriptionPlan.objects.filter(is_active=True).count(),
             'total_customers': Customer.objects.count(),
-            'mrr': SubscriptionAnalytics.get_mrr(),
+            'mrr': mrr,
+            'mrr_change': (mrr - last_month) / last_month * 100 if last_month else None,
             'recent_subscriptions': Subscription.objects.order_by('-created_at')[:5],
             'breadcrumb_items': [
                 {"url": "/admin/", "label": _("Home")},
@@ -14,11 +14,36 @@ class AnalyticsAPIView(TemplateView):
         days = int(request.GET.get('days', 30))
         
         if metric == 'mrr':
-            data = {'value': float(SubscriptionAnalytics.get_mrr())}
-        elif metric == 'churn':
-            data = {'value': SubscriptionAnalytics.get_churn_rate(days)}
-        elif metric == 'conversion':
-            data = {'value': SubscriptionAnalytics.get_conversion_rate(days)}
+            mrr = SubscriptionAnalytics.get_mrr(breakdown=True)
+            data = {
+                'value': float(mrr['total']),
+                'by_plan': [dict(row, mrr=float(row['mrr'])) for row in mrr['by_plan']],
+                'by_billing_period': {period: float(value) for period, value in mrr['by_billing_period'].items()},
+            }
+        elif metric in ('churn', 'conversion'):
+            # Prefer the daily snapshots, computing live only when they don't cover the window
+            rates = SubscriptionAnalytics.get_snapshot_rates(days)
+            if rates is not None:
+                data = {'value': rates[metric]}
+            elif metric == 'churn':
+                data = {'value': SubscriptionAnalytics.get_churn_rate(days)}
+            else:
+                data = {'value': SubscriptionAnalytics.get_conversion_rate(days)}
+        elif metric == 'series':
+            data = {'series': [
+                dict(row, date=row['date'].isoformat(), mrr=None if row['mrr'] is None else float(row['mrr']))
+                for row in SubscriptionAnalytics.get_metrics_series(days)
+            ]}
+        elif metric == 'usage' and request.GET.get('granularity', 'day') in ('hour', 'day'):
+            series = SubscriptionAnalytics.get_usage_series(
+                request.GET.get('feature'),
+                granularity=request.GET.get('granularity', 'day'),
+                days=days
+            )
+            data = {'series': [
+                {'bucket': row['bucket_start'].isoformat(), 'usage': row['usage']}
+                for row in series
+            ]}
         else:
             data = {'error': 'Invalid metric'}
         
@@ -2,7 +2,9 @@ from django.http import JsonResponse
 from django.views.generic import View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from ..permissions.mixins import SubscriptionRequiredMixin
+from ..cache import get_plan_snapshot
 from ..models import SubscriptionPlan
+from ..utils import get_current_usage
 
 
 class SubscriptionAPIView(SubscriptionRequiredMixin, View):
@@ -28,7 +30,17 @@ class SubscriptionAPIView(SubscriptionRequiredMixin, View):
             'features': list(subscription.plan.plan_features.filter(
                 is_included=True,
                 feature__is_active=True
-            ).values_list('feature__slug', flat=True))
+            ).values_list('feature__slug', flat=True)),
+            'tiers': {
+                slug: {
+                    'levels': entitlement.tiers.as_table(),
+                    'current': getattr(
+                        entitlement.tiers.resolve(get_current_usage(subscription, entitlement.feature_id)), 'level', None
+                    ),
+                }
+                for slug, entitlement in get_plan_snapshot(subscription.plan_id).features.items()
+                if entitlement.tiers is not None
+            },
         }
         
         return JsonResponse(data)
@@ -47,10 +59,16 @@ class PricingPlansAPIView(View):
             features = []
             for plan_feature in plan.plan_features.filter(is_included=True, feature__is_active=True):
                 feature_text = plan_feature.feature.name
-                if plan_feature.feature.feature_type == 'quota' and plan_feature.effective_quota:
+                if plan_feature.feature.feature_type in ('quota', 'gauge') and plan_feature.effective_quota:
                     feature_text += f" ({plan_feature.effective_quota} {plan_feature.feature.quota_unit})"
                 features.append(feature_text)
             
+            tiers = {
+                slug: entitlement.tiers.as_table()
+                for slug, entitlement in get_plan_snapshot(plan).features.items()
+                if entitlement.tiers is not None
+            }
+            
             plans_data.append({
                 'slug': plan.slug,
                 'name': plan.name,
@@ -62,6 +80,7 @@ class PricingPlansAPIView(View):
                 'is_active': plan.is_active,
                 'sort_order': plan.sort_order,
                 'features': features,
+                'tiers': tiers,
                 'created_at': plan.created_at.isoformat() if plan.created_at else None,
             })
         
@@ -0,0 +1,59 @@
+import json
+from django.http import JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from django.views.generic import View
+from ..ingestion import ingest_usage_events
+from ..settings import get_setting
+
+
+def _has_api_key(request):
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not header.startswith('Bearer '):
+        return False
+    token = header[len('Bearer '):].strip()
+    return any(constant_time_compare(token, key) for key in get_setting('USAGE_API_KEYS'))
+
+
+def _csrf_failure(request):
+    """Session-authenticated requests still need a CSRF token"""
+    check = CsrfViewMiddleware(lambda request: None)
+    check.process_request(request)
+    return check.process_view(request, None, (), {})
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class UsageIngestAPIView(View):
+    """
+    Bulk usage ingestion for backend services.
+    
+    Accepts {"events": [...]} from staff sessions or with an
+    "Authorization: Bearer <key>" header matching USAGE_API_KEYS.
+    """
+    
+    def post(self, request, *args, **kwargs):
+        if not _has_api_key(request):
+            if not (request.user.is_authenticated and request.user.is_staff):
+                return JsonResponse({'error': 'Authentication required'}, status=401)
+            rejection = _csrf_failure(request)
+            if rejection:
+                return rejection
+        
+        try:
+            events = json.loads(request.body)['events']
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({'error': 'Expected a JSON object with an "events" list'}, status=400)
+        if not isinstance(events, list):
+            return JsonResponse({'error': 'Expected a JSON object with an "events" list'}, status=400)
+        if len(events) > get_setting('USAGE_API_MAX_EVENTS'):
+            return JsonResponse({'error': 'Too many events'}, status=413)
+        
+        results = ingest_usage_events(events)
+        return JsonResponse({
+            'accepted': sum(result['status'] == 'accepted' for result in results),
+            'duplicate': sum(result['status'] == 'duplicate' for result in results),
+            'rejected': sum(result['status'] == 'rejected' for result in results),
+            'results': results,
+        })